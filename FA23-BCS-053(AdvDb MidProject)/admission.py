@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+# Admission control for one worker process. Ingest is rate limited with token
+# buckets per receiver (charged per report) and per client address (charged
+# per request), and ingest and read requests draw from separate concurrency
+# pools, so a flooding receiver is turned away before it can take the threads
+# the map and API readers need. Event streams hold a thread for as long as
+# they stay open, so they take a slot in a third pool for their lifetime.
+
+settings = {
+    "receiver_rate": 50.0,      # reports per second per receiver_id
+    "receiver_burst": 500,
+    "client_rate": 20.0,        # ingest requests per second per client address
+    "client_burst": 100,
+    "max_batch_reports": 1000,  # per /api/flights/batch-ingest request
+    "ingest_concurrency": 4,    # per worker; keep below the thread count
+    "read_concurrency": 8,
+    "read_wait_seconds": 2.0,   # readers queue briefly instead of failing fast
+    "stream_concurrency": 4,    # event streams held open at once per worker
+}
+
+MAX_TRACKED_KEYS = 10000
+
+THROTTLED = metrics.counter(
+    "flightaware_throttled_requests_total",
+    "Requests rejected by admission control, by reason",
+    ("reason",),
+)
+POOL_IN_USE = metrics.gauge(
+    "flightaware_admission_pool_in_use",
+    "Requests currently holding a slot in each concurrency pool",
+    ("pool",),
+)
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self, cost=1):
+        # 0 when `cost` tokens exist now, otherwise seconds until they do;
+        # nothing is taken
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if cost <= self.tokens:
+            return 0.0
+        if cost > self.burst or self.rate <= 0:
+            # Can never fit; report a full refill so callers split the batch
+            return self.burst / self.rate if self.rate > 0 else 60.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost=1):
+        # Returns 0 when admitted, otherwise seconds until `cost` tokens exist
+        retry_after = self.wait_time(cost)
+        if not retry_after:
+            self.tokens -= cost
+        return retry_after
+
+
+class BucketTable:
+
+    def __init__(self, rate_setting, burst_setting):
+        self.rate_setting = rate_setting
+        self.burst_setting = burst_setting
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, key):
+        # Called with the lock held
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(settings[self.rate_setting], settings[self.burst_setting])
+            self._buckets[key] = bucket
+            # Least recently active keys go first; a forgotten key just
+            # starts again with a full bucket
+            while len(self._buckets) > MAX_TRACKED_KEYS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def take(self, key, cost=1):
+        with self._lock:
+            return self._bucket(key).take(cost)
+
+    def take_all(self, costs):
+        # Charges every key in {key: cost} only if all of them can pay now;
+        # otherwise charges none and returns (key, retry_after) for the first
+        # that cannot
+        with self._lock:
+            buckets = {key: self._bucket(key) for key in costs}
+            for key, cost in costs.items():
+                retry_after = buckets[key].wait_time(cost)
+                if retry_after:
+                    return key, retry_after
+            for key, cost in costs.items():
+                buckets[key].tokens -= cost
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+receivers = BucketTable("receiver_rate", "receiver_burst")
+clients = BucketTable("client_rate", "client_burst")
+# Receivers and client addresses that skip the rate limits, for load tests
+# and capture replays; the concurrency pools still apply to them
+unthrottled_receivers = set()
+unthrottled_clients = set()
+
+
+class Pool:
+
+    def __init__(self, name, size_setting):
+        self.name = name
+        self.size_setting = size_setting
+        self._semaphore = None
+        self._size = None
+        self._lock = threading.Lock()
+        self.in_use = 0
+        POOL_IN_USE.set_function(lambda: self.in_use, pool=name)
+
+    def _get_semaphore(self):
+        # Built on first use so settings can be changed after import
+        with self._lock:
+            if self._semaphore is None or self._size != settings[self.size_setting]:
+                self._size = settings[self.size_setting]
+                self._semaphore = threading.BoundedSemaphore(self._size)
+            return self._semaphore
+
+    def acquire(self, timeout=None):
+        semaphore = self._get_semaphore()
+        acquired = semaphore.acquire(timeout=timeout) if timeout else semaphore.acquire(blocking=False)
+        if not acquired:
+            return None
+        with self._lock:
+            self.in_use += 1
+        return semaphore
+
+    def release(self, semaphore):
+        with self._lock:
+            self.in_use -= 1
+        semaphore.release()
+
+
+pools = {
+    "ingest": Pool("ingest", "ingest_concurrency"),
+    "read": Pool("read", "read_concurrency"),
+    "stream": Pool("stream", "stream_concurrency"),
+}
+
+
+def receiver_counts(reports):
+    # Reports per rate-limited receiver
+    counts = {}
+    for report in reports:
+        receiver_id = report.get('receiver_id', 'UNKNOWN') if isinstance(report, dict) else 'UNKNOWN'
+        if receiver_id not in unthrottled_receivers:
+            counts[receiver_id] = counts.get(receiver_id, 0) + 1
+    return counts
+
+
+def oversized_receiver(reports):
+    # (receiver_id, count) for the first receiver with more reports than its
+    # bucket can ever hold, or None. Waiting cannot admit such a request, so
+    # callers reject it as too large rather than throttled
+    burst = settings["receiver_burst"]
+    for receiver_id, count in receiver_counts(reports).items():
+        if count > burst:
+            return receiver_id, count
+    return None
+
+
+def check_receivers(reports):
+    # Charges each receiver for its reports, all or none; returns
+    # (receiver_id, retry_after) for the first receiver over its rate, or
+    # None. A rejected request costs the other receivers nothing, since it
+    # is resent whole
+    limited = receivers.take_all(receiver_counts(reports))
+    if limited:
+        THROTTLED.inc(reason="receiver_rate")
+    return limited
+
+
+def check_client(address):
+    address = address or "unknown"
+    if address in unthrottled_clients:
+        return 0.0
+    retry_after = clients.take(address)
+    if retry_after:
+        THROTTLED.inc(reason="client_rate")
+    return retry_after
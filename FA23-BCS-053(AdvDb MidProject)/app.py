@@ -1,15 +1,74 @@
 from flask import jsonify
 from flask_pymongo import PyMongo
-from datetime import datetime, timedelta
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
 import math
-import requests
-from flask import Flask, request, redirect, render_template_string
+import os
+import queue
+import re
+import threading
+import time
+import click
+from flask import Flask, Response, g, request, redirect, render_template
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import admission
+import archive_tier
+import capture
+import change_feed
+import conflicts
+import dedup
+import export
+import geofence
+import metrics
+import profiling
+import rollups
+import snapshot
+import track_codec
+import track_simplify
+import wire_format
+from cache import LRUCache
+from track import Track, path_distance_km, to_micros
 
 
 app = Flask(__name__)
 app.config["MONGO_URI"] = "mongodb://localhost:27017/flightaware_db"
-mongo = PyMongo(app)
-
+app.config["ADMIN_TOKEN"] = os.environ.get("FLIGHTAWARE_ADMIN_TOKEN")
+app.config["MONGO_MAX_POOL_SIZE"] = int(os.environ.get("FLIGHTAWARE_MONGO_MAX_POOL_SIZE", 10))
+app.config["CHANGE_STREAMS"] = os.environ.get("FLIGHTAWARE_CHANGE_STREAMS") == "1"
+app.config["CAPTURE_PATH"] = os.environ.get("FLIGHTAWARE_CAPTURE_PATH")
+profiling.settings["sample_rate"] = float(os.environ.get("FLIGHTAWARE_PROFILE_SAMPLE_RATE", 0))
+for setting, env_name in (("receiver_rate", "FLIGHTAWARE_RECEIVER_RATE"),
+                          ("client_rate", "FLIGHTAWARE_CLIENT_RATE"),
+                          ("max_batch_reports", "FLIGHTAWARE_MAX_BATCH_REPORTS"),
+                          ("ingest_concurrency", "FLIGHTAWARE_INGEST_CONCURRENCY"),
+                          ("read_concurrency", "FLIGHTAWARE_READ_CONCURRENCY"),
+                          ("stream_concurrency", "FLIGHTAWARE_STREAM_CONCURRENCY")):
+    if os.environ.get(env_name):
+        admission.settings[setting] = type(admission.settings[setting])(os.environ[env_name])
+for names, env_name in ((admission.unthrottled_receivers, "FLIGHTAWARE_UNTHROTTLED_RECEIVERS"),
+                        (admission.unthrottled_clients, "FLIGHTAWARE_UNTHROTTLED_CLIENTS")):
+    names.update(filter(None, (name.strip() for name in os.environ.get(env_name, "").split(","))))
+
+# connect=False keeps the client from opening sockets or starting monitor
+# threads until first use, so it is safe to create before a server forks.
+mongo = PyMongo(
+    app,
+    connect=False,
+    maxPoolSize=app.config["MONGO_MAX_POOL_SIZE"],
+    event_listeners=[metrics.MongoCommandListener()]
+)
+
+
+
+def is_admin_request():
+    token = app.config.get("ADMIN_TOKEN")
+    return bool(token) and request.headers.get("X-Admin-Token") == token
 
 
 def serialize_doc(doc):
@@ -32,9 +91,22 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     return R * c
 
 
-def is_near_airport(lat, lon, airport_code, threshold_km=50):
-    db = mongo.db
-    airport = db.airports.find_one({"code": airport_code})
+# Airports rarely change; entries are dropped from the change feed when they do
+airport_cache = LRUCache("airports", max_entries=5000)
+
+
+def get_airport_cached(airport_code):
+    airport = airport_cache.get(airport_code)
+    if airport is None:
+        # Unknown codes are cached as {} so they do not hit Mongo every report
+        airport = mongo.db.airports.find_one({"code": airport_code}, {"_id": 0}) or {}
+        airport_cache.set(airport_code, airport)
+    return airport
+
+
+def is_near_airport(lat, lon, airport_code, threshold_km=50, airport=None):
+    if airport is None:
+        airport = get_airport_cached(airport_code)
 
     if not airport:
         return False
@@ -43,7 +115,7 @@ def is_near_airport(lat, lon, airport_code, threshold_km=50):
     return distance <= threshold_km
 
 
-def should_archive_flight(flight):
+def should_archive_flight(flight, dest_airport=None):
     status = flight.get('status')
     if status == 'completed':
         return True
@@ -60,7 +132,7 @@ def should_archive_flight(flight):
     dest = flight.get('destination_airport')
 
 
-    if altitude < 100 and speed < 50 and dest and is_near_airport(lat, lon, dest):
+    if altitude < 100 and speed < 50 and dest and is_near_airport(lat, lon, dest, airport=dest_airport):
         return True
 
 
@@ -76,6 +148,35 @@ def should_archive_flight(flight):
     return False
 
 
+def prepare_archived_flight(flight):
+    updates = flight.get('updates', [])
+    try:
+        track = Track.from_updates(updates)
+    except (ValueError, OverflowError):
+        # Points the codec cannot represent stay verbose
+        track = None
+
+    if track is not None:
+        total_distance = track.distance_km()
+    else:
+        total_distance = path_distance_km([u['lat'] for u in updates], [u['lon'] for u in updates])
+
+    flight['total_distance_km'] = round(total_distance, 2)
+    flight['status'] = 'completed'
+    flight['completed_at'] = utc_timestamp()
+    # Archived tracks are immutable, so store them in the compact columnar form
+    flight.pop('current_position', None)
+    flight.pop('current_altitude_m', None)
+    if track is not None and updates:
+        try:
+            flight['track'] = track.to_codec()
+            del flight['updates']
+        except (ValueError, OverflowError):
+            # NaN, infinite or out-of-range values cannot be quantised
+            pass
+    return flight
+
+
 def check_and_archive_flight(flight_id):
     db = mongo.db
     flight = db.flight_updates.find_one({"flight_id": flight_id})
@@ -84,28 +185,42 @@ def check_and_archive_flight(flight_id):
         return False
 
     if should_archive_flight(flight):
-        updates = flight.get('updates', [])
-        total_distance = 0
-        for i in range(1, len(updates)):
-            prev = updates[i - 1]
-            curr = updates[i]
-            total_distance += calculate_distance(
-                prev['lat'], prev['lon'],
-                curr['lat'], curr['lon']
-            )
-
-        flight['total_distance_km'] = round(total_distance, 2)
-        flight['status'] = 'completed'
-        flight['completed_at'] = datetime.utcnow().isoformat() + 'Z'
-
+        prepare_archived_flight(flight)
         db.flight_logs.insert_one(flight)
         db.flight_updates.delete_one({"flight_id": flight_id})
+        detector.remove(flight_id)
+        rollups.record_flight(db, flight)
         print(f"✅ Archived flight: {flight_id}")
         return True
 
     return False
 
 
+def find_archived_flight(flight_id, expand=True):
+    # Archived flights in Mongo, then the on-disk cold tier. With
+    # expand=False the track stays encoded for build_track_response
+    db = mongo.db
+    flight = db.flight_logs.find_one({"flight_id": flight_id})
+    if not flight and archive_tier.available():
+        pointer = db.flight_log_tier.find_one({"flight_id": flight_id})
+        if pointer:
+            flight = archive_tier.read_flight(pointer)
+
+    if flight and expand:
+        return track_codec.expand_flight(flight)
+    return flight
+
+
+def find_flight(flight_id, expand=True):
+    # Active flights first, then archived ones
+    flight = mongo.db.flight_updates.find_one({"flight_id": flight_id})
+    if flight:
+        return flight, "active"
+
+    flight = find_archived_flight(flight_id, expand)
+    return (flight, "archived") if flight else (None, None)
+
+
 def validate_coordinates(lat, lon):
     try:
         lat = float(lat)
@@ -115,6 +230,37 @@ def validate_coordinates(lat, lon):
         return False
 
 
+# Fixed-width UTC timestamps, so string order in Mongo is time order
+EVENT_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+MAX_FUTURE_SKEW = timedelta(minutes=5)
+MAX_VERTICAL_RATE = 20000
+
+
+def parse_event_time(value):
+    # ISO 8601 string or epoch seconds -> naive UTC datetime
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.utcfromtimestamp(value)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def format_event_time(value):
+    return value.strftime(EVENT_TIME_FORMAT)
+
+
+def utc_timestamp():
+    return format_event_time(datetime.utcnow())
+
+
+def normalize_report(data):
+    # Validated reports only; rewrites the client ts into the stored format
+    if data.get('ts') is not None:
+        data['ts'] = format_event_time(parse_event_time(data['ts']))
+    return data
+
+
 def validate_flight_data(data):
     errors = []
 
@@ -131,28 +277,343 @@ def validate_flight_data(data):
 
     try:
         altitude = float(data['altitude_m'])
-        if altitude < 0 or altitude > 20000:
+        # Chained comparisons also reject NaN, which the codec cannot store
+        if not 0 <= altitude <= 20000:
             errors.append("Invalid altitude (must be 0-20000 meters)")
     except:
         errors.append("Altitude must be a number")
 
     try:
         speed = float(data['spd_kts'])
-        if speed < 0 or speed > 1000:
+        if not 0 <= speed <= 1000:
             errors.append("Invalid speed (must be 0-1000 knots)")
     except:
         errors.append("Speed must be a number")
 
     try:
         heading = float(data['heading'])
-        if heading < 0 or heading > 360:
+        if not 0 <= heading <= 360:
             errors.append("Invalid heading (must be 0-360 degrees)")
     except:
         errors.append("Heading must be a number")
 
+    if data.get('vertical_rate') is not None:
+        try:
+            vertical_rate = float(data['vertical_rate'])
+            if not -MAX_VERTICAL_RATE <= vertical_rate <= MAX_VERTICAL_RATE:
+                errors.append(f"Invalid vertical_rate (must be within ±{MAX_VERTICAL_RATE} ft/min)")
+        except (TypeError, ValueError):
+            errors.append("vertical_rate must be a number")
+
+    if data.get('ts') is not None:
+        try:
+            if parse_event_time(data['ts']) > datetime.utcnow() + MAX_FUTURE_SKEW:
+                errors.append("Invalid ts (more than 5 minutes in the future)")
+        except (TypeError, ValueError, OverflowError, OSError):
+            errors.append("ts must be an ISO 8601 timestamp or epoch seconds")
+
     return len(errors) == 0, errors
 
 
+def build_update_entry(data, timestamp):
+    entry = {
+        "lat": float(data['lat']),
+        "lon": float(data['lon']),
+        "altitude_m": float(data['altitude_m']),
+        "spd_kts": float(data['spd_kts']),
+        "heading": float(data['heading']),
+        "vertical_rate": data.get('vertical_rate', 0),
+        # Event time from the receiver when given, otherwise time of arrival
+        "ts": data.get('ts') or timestamp,
+        "receiver_id": data.get('receiver_id', 'UNKNOWN'),
+        "coordinates": [float(data['lon']), float(data['lat'])]
+    }
+    key = dedup.event_key(data)
+    if key is not None:
+        entry["event_key"] = key
+    return entry
+
+
+def build_new_flight(data, timestamp, update_entry):
+    return {
+        "flight_id": data['flight_id'],
+        "callsign": data['callsign'],
+        "aircraft_type": data.get('aircraft_type', 'Unknown'),
+        "tail_number": data.get('tail_number', 'N/A'),
+        "first_seen": timestamp,
+        "last_seen": timestamp,
+        "status": data.get('status', 'active'),
+        "source_airport": data.get("source", "Unknown"),
+        "destination_airport": data.get("destination", "Unknown"),
+        "current_position": [float(data['lon']), float(data['lat'])],
+        "current_altitude_m": float(data['altitude_m']),
+        "updates": [update_entry]
+    }
+
+
+def is_latest_report(update_entry, existing_flight):
+    last_seen = existing_flight.get('last_seen')
+    if not last_seen:
+        return True
+    try:
+        return parse_event_time(update_entry['ts']) >= parse_event_time(last_seen)
+    except (TypeError, ValueError):
+        return True
+
+
+def build_flight_update(data, timestamp, update_entry, existing_flight):
+    # Late reports are slotted into place by event time; only the newest
+    # report moves the aircraft or changes its status
+    update = {
+        "$push": {"updates": {"$each": [update_entry], "$sort": {"ts": 1}}},
+        "$min": {"first_seen": update_entry['ts']},
+        "$max": {"last_seen": update_entry['ts']},
+        "$set": {
+            "source_airport": data.get("source", existing_flight.get("source_airport")),
+            "destination_airport": data.get("destination", existing_flight.get("destination_airport"))
+        }
+    }
+    if is_latest_report(update_entry, existing_flight):
+        update["$set"]["current_position"] = update_entry['coordinates']
+        update["$set"]["current_altitude_m"] = update_entry['altitude_m']
+        update["$set"]["status"] = data.get('status', existing_flight.get('status', 'active'))
+    return update
+
+
+def duplicate_ack(flight_id):
+    # Acknowledged so the sender stops retrying; nothing was written
+    return {
+        "success": True,
+        "duplicate": True,
+        "message": "Duplicate report ignored",
+        "flight_id": flight_id
+    }
+
+
+def build_bulk_flight_update(first_report, timestamp, entries):
+    on_insert = build_new_flight(first_report, timestamp, None)
+    for field in ("flight_id", "first_seen", "last_seen", "updates"):
+        del on_insert[field]
+    latest = max(entries, key=lambda entry: entry['ts'])
+    on_insert["current_position"] = latest['coordinates']
+    on_insert["current_altitude_m"] = latest['altitude_m']
+
+    return {
+        "$push": {"updates": {"$each": entries, "$sort": {"ts": 1}}},
+        "$min": {"first_seen": min(entry['ts'] for entry in entries)},
+        "$max": {"last_seen": latest['ts']},
+        "$setOnInsert": on_insert
+    }
+
+
+def build_position_update(flight_id, entries, fence_ids=None):
+    # Moves the aircraft only if no newer report is stored; matches whether it
+    # runs before or after the $max on last_seen in the same batch
+    latest = max(entries, key=lambda entry: entry['ts'])
+    fields = {"current_position": latest['coordinates'], "current_altitude_m": latest['altitude_m']}
+    if fence_ids is not None:
+        fields["geofences"] = fence_ids
+    return UpdateOne(
+        {"flight_id": flight_id, "last_seen": {"$lte": latest['ts']}},
+        {"$set": fields}
+    )
+
+
+# Each worker sees only the reports it ingests, so the detector is reloaded
+# from current positions in Mongo when it is older than CONFLICT_REFRESH_SECONDS
+detector = conflicts.ConflictDetector()
+CONFLICT_REFRESH_SECONDS = 10
+
+
+def current_detector():
+    refreshed_at = detector.refreshed_at
+    if refreshed_at is None or time.monotonic() - refreshed_at > CONFLICT_REFRESH_SECONDS:
+        cutoff = format_event_time(datetime.utcnow() - timedelta(seconds=detector.max_age_seconds))
+        docs = mongo.db.flight_updates.find(
+            {"last_seen": {"$gte": cutoff}, "current_position": {"$exists": True}},
+            {"_id": 0, "flight_id": 1, "callsign": 1, "current_position": 1, "current_altitude_m": 1, "last_seen": 1}
+        )
+        # Read before loading, so ingest is not blocked on the cursor
+        detector.load([
+            (doc['flight_id'], doc.get('callsign'), doc['current_position'][1], doc['current_position'][0],
+             doc.get('current_altitude_m') or 0, doc.get('last_seen'))
+            for doc in docs
+        ])
+    return detector
+
+
+def track_position(flight, entry):
+    detector.update(flight['flight_id'], flight.get('callsign'), entry['lat'], entry['lon'],
+                    entry['altitude_m'], entry['ts'])
+
+
+# Fences are reloaded from Mongo when another worker may have changed them:
+# on change-feed events if enabled, otherwise every FENCE_REFRESH_SECONDS
+fences = geofence.FenceIndex()
+FENCE_REFRESH_SECONDS = 30
+
+
+def current_fences():
+    max_age = None if app.config["CHANGE_STREAMS"] else FENCE_REFRESH_SECONDS
+    if fences.is_stale(max_age):
+        fences.load(mongo.db.geofences.find())
+    return fences
+
+
+def geofence_crossings(flight, entries, previous, index=None):
+    # Walks the new reports in time order; returns (fence ids the flight is in
+    # after the last one, enter/exit event documents)
+    index = current_fences() if index is None else index
+    inside = {fence_id for fence_id in previous if fence_id in index}
+    events = []
+    for entry in entries:
+        now_inside = index.containing(entry['lat'], entry['lon'])
+        entered, exited = geofence.transitions(inside, now_inside)
+        for event, fence_ids in (("exit", exited), ("enter", entered)):
+            for fence_id in sorted(fence_ids):
+                fence = index.get(fence_id)
+                events.append({
+                    "flight_id": flight['flight_id'],
+                    "callsign": flight.get('callsign'),
+                    "fence_id": fence_id,
+                    "fence_name": fence.name if fence else None,
+                    "kind": fence.kind if fence else None,
+                    "event": event,
+                    "ts": entry['ts'],
+                    "lat": entry['lat'],
+                    "lon": entry['lon'],
+                    "altitude_m": entry['altitude_m'],
+                })
+        inside = now_inside
+    return sorted(inside), events
+
+
+def record_geofence_events(events):
+    if not events:
+        return
+    # Published before the insert adds an ObjectId to each document
+    if not app.config["CHANGE_STREAMS"]:
+        for event in events:
+            change_feed.publish({"collection": "geofence_events", "operation": event["event"], **event})
+    mongo.db.geofence_events.insert_many(events, ordered=False)
+
+
+# Recently seen (flight_id, event key) pairs; the guarded updates below catch
+# what this worker's window misses (other workers, restarts, evictions)
+recent_reports = dedup.DedupWindow()
+
+
+def write_flight_reports(reports):
+    # Validated reports only; returns ({flight_id: error} for flights that
+    # failed, {indexes into reports that were duplicates})
+    db = mongo.db
+    timestamp = utc_timestamp()
+
+    grouped = {}
+    duplicates = set()
+    for index, report in enumerate(reports):
+        normalize_report(report)
+        flight_id = report['flight_id']
+        if recent_reports.check_and_add(flight_id, dedup.event_key(report)):
+            duplicates.add(index)
+            dedup.record("duplicate", "memory")
+            continue
+        if flight_id not in grouped:
+            grouped[flight_id] = (report, [], [])
+        grouped[flight_id][1].append(index)
+        grouped[flight_id][2].append(build_update_entry(report, timestamp))
+
+    # Stored fence membership, read only when there are fences to check
+    fence_states = None
+    if grouped and len(current_fences()):
+        fence_states = {
+            doc['flight_id']: doc
+            for doc in db.flight_updates.find(
+                {"flight_id": {"$in": list(grouped)}},
+                {"flight_id": 1, "last_seen": 1, "geofences": 1}
+            )
+        }
+
+    crossings = {}
+    if fence_states is not None:
+        for flight_id, (first, _, entries) in grouped.items():
+            stored = fence_states.get(flight_id, {})
+            last_seen = stored.get('last_seen')
+            newer = sorted((entry for entry in entries if not last_seen or entry['ts'] >= last_seen),
+                           key=lambda entry: entry['ts'])
+            if newer:
+                crossings[flight_id] = geofence_crossings(first, newer, stored.get('geofences', []))
+
+    def guarded_filter(flight_id, entries):
+        keys = [entry['event_key'] for entry in entries if 'event_key' in entry]
+        if not keys:
+            return {"flight_id": flight_id}
+        return {"flight_id": flight_id, "updates.event_key": {"$nin": keys}}
+
+    flight_ids = []
+    ops = []
+    for flight_id, (first, _, entries) in grouped.items():
+        ops.append(UpdateOne(guarded_filter(flight_id, entries),
+                             build_bulk_flight_update(first, timestamp, entries), upsert=True))
+        fence_ids = crossings[flight_id][0] if flight_id in crossings else None
+        ops.append(build_position_update(flight_id, entries, fence_ids))
+        flight_ids += [flight_id, flight_id]
+
+    failed = {}
+    retry_ids = []
+    if ops:
+        try:
+            db.flight_updates.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                flight_id = flight_ids[error["index"]]
+                # Either another writer inserted the flight first, or the guard
+                # did not match because one of the reports is already stored
+                if error.get("code") == 11000:
+                    retry_ids.append(flight_id)
+                else:
+                    failed[flight_id] = error.get("errmsg")
+
+    # Slow path, one guarded update per report to tell duplicates from new points
+    for flight_id in retry_ids:
+        first, indexes, entries = grouped[flight_id]
+        for index, entry in zip(indexes, entries):
+            try:
+                result = db.flight_updates.update_one(
+                    dedup.guard_filter(flight_id, entry.get('event_key')),
+                    build_bulk_flight_update(first, timestamp, [entry])
+                )
+            except Exception as e:
+                failed[flight_id] = str(e)
+                break
+            if result.matched_count == 0:
+                duplicates.add(index)
+                dedup.record("duplicate", "server")
+        if flight_id not in failed:
+            fence_ids = crossings[flight_id][0] if flight_id in crossings else None
+            db.flight_updates.bulk_write([build_position_update(flight_id, entries, fence_ids)])
+
+    for flight_id, (_, indexes, _) in grouped.items():
+        for index in indexes:
+            if flight_id in failed:
+                # Let a retry of the same report through
+                recent_reports.forget(flight_id, dedup.event_key(reports[index]))
+                dedup.record("failed")
+            elif index not in duplicates:
+                dedup.record("written")
+
+    for flight_id, (first, _, entries) in grouped.items():
+        if flight_id not in failed:
+            track_position(first, max(entries, key=lambda entry: entry['ts']))
+
+    record_geofence_events([
+        event
+        for flight_id, (_, events) in crossings.items() if flight_id not in failed
+        for event in events
+    ])
+    return failed, duplicates
+
+
 def to_geojson_point(lat, lon, properties=None):
     return {
         "type": "Point",
@@ -161,16 +622,139 @@ def to_geojson_point(lat, lon, properties=None):
     }
 
 
-def init_indexes():
-    db = mongo.db
+def nearby_query(lat, lon, radius_km):
+    # Index prefilter on current_position; filter_nearby keeps the exact haversine check
+    return {"current_position": {"$geoWithin": {"$centerSphere": [[lon, lat], min(radius_km / 6371, math.pi)]}}}
+
+
+def viewport_query(min_lat, min_lon, max_lat, max_lon):
+    def box(west, east):
+        return {"current_position": {"$geoWithin": {"$box": [[west, min_lat], [east, max_lat]]}}}
+
+    if min_lon <= max_lon:
+        return box(min_lon, max_lon)
+    # Viewport crosses the antimeridian
+    return {"$or": [box(min_lon, 180), box(-180, max_lon)]}
+
+
+def filter_nearby(flights, lat, lon, radius_km):
+    nearby = []
+    for flight in flights:
+        updates = flight.get('updates', [])
+        if updates:
+            last = updates[-1]
+            distance = calculate_distance(lat, lon, last['lat'], last['lon'])
+            if distance <= radius_km:
+                flight['distance_km'] = round(distance, 2)
+                nearby.append(flight)
+
+    nearby.sort(key=lambda x: x['distance_km'])
+    return nearby
+
+
+def build_track_response(flight, source, args, all_updates=None):
+    time_param = args.get('time')
+    full = args.get('full') == 'true'
+
+    if flight.get('track'):
+        # Encoded archived track: look up on the columns and only build
+        # per-point dicts when the whole track is returned
+        track = Track.from_codec(flight['track'])
+        updates = track.to_updates() if full and all_updates is None else []
+        count = len(track)
+        location = track.point(-1) if count else None
+        if time_param and count:
+            try:
+                location = track.point(track.nearest(to_micros(parse_event_time(time_param))))
+            except (TypeError, ValueError):
+                pass
+    else:
+        updates = flight.get('updates', [])
+        count = len(updates)
+        location = updates[-1] if updates else None
+        if time_param and updates:
+            try:
+                requested_time = parse_event_time(time_param)
+                # Tracks are kept sorted by event time, so only O(log n) points are parsed
+                index = bisect_left(updates, requested_time, key=lambda x: parse_event_time(x['ts']))
+                candidates = updates[max(0, index - 1):index + 1]
+                location = min(candidates, key=lambda x: abs(parse_event_time(x['ts']) - requested_time))
+            except:
+                pass
+
+    use_geojson = args.get('format') == 'geojson'
+
+    if use_geojson and location:
+        current_location = to_geojson_point(
+            location['lat'],
+            location['lon'],
+            {
+                "altitude_m": location.get('altitude_m'),
+                "spd_kts": location.get('spd_kts'),
+                "heading": location.get('heading'),
+                "timestamp": location.get('ts')
+            }
+        )
+    else:
+        current_location = location
+
+    response = {
+        "flight_id": flight.get('flight_id'),
+        "callsign": flight.get('callsign'),
+        "aircraft_type": flight.get('aircraft_type'),
+        "tail_number": flight.get('tail_number'),
+        "status": flight.get('status'),
+        "source": source,
+        "source_airport": flight.get('source_airport'),
+        "destination_airport": flight.get('destination_airport'),
+        "first_seen": flight.get('first_seen'),
+        "last_seen": flight.get('last_seen'),
+        "total_updates": count,
+        "total_distance_km": flight.get('total_distance_km'),
+        "current_location": current_location,
+        "all_updates": (all_updates if all_updates is not None else updates) if full else None
+    }
+
+    return response
+
+
+def init_indexes(db=None):
+    db = mongo.db if db is None else db
 
     db.flight_updates.create_index([("flight_id", 1)], unique=True)
     db.flight_updates.create_index([("status", 1)])
-    db.flight_updates.create_index([("last_seen", -1)])
+    db.flight_updates.create_index(ACTIVE_PAGE_SORT)
     db.flight_updates.create_index([("callsign", 1)])
+    db.flight_updates.create_index([("tail_number", 1)])
 
     db.flight_logs.create_index([("flight_id", 1)])
-    db.flight_logs.create_index([("completed_at", -1)])
+    db.flight_logs.create_index(ARCHIVED_PAGE_SORT)
+
+    # Flights airborne at an instant T: airborne_query bounds first_seen to
+    # the day before T, and last_seen >= T is checked from the same keys.
+    # (last_seen, first_seen) serves the recent-activity and export scans
+    for collection in (db.flight_updates, db.flight_logs):
+        collection.create_index([("first_seen", 1), ("last_seen", 1)])
+        collection.create_index([("last_seen", 1), ("first_seen", 1)])
+
+    # Airport boards: equality on airport and status, then the time sort
+    for field in ("source_airport", "destination_airport"):
+        db.flight_updates.create_index([(field, 1), ("status", 1), ("last_seen", -1)])
+        db.flight_logs.create_index([(field, 1), ("status", 1), ("completed_at", -1)])
+    db.flight_log_tier.create_index([("flight_id", 1)])
+
+    # Exports filtered by aircraft type
+    db.flight_logs.create_index([("aircraft_type", 1), ("last_seen", 1)])
+
+    # Prefix search; flight_id is already indexed on every collection
+    for collection in (db.flight_logs, db.flight_log_tier):
+        collection.create_index([("callsign", 1)])
+        collection.create_index([("tail_number", 1)])
+
+    for collection, _ in rollups.GRANULARITIES.values():
+        db[collection].create_index([("source_airport", 1), ("destination_airport", 1), ("bucket", 1)])
+        db[collection].create_index([("bucket", 1)])
+        db[collection].create_index([("aircraft_type", 1), ("bucket", 1)])
 
     db.airports.create_index([("code", 1)], unique=True)
     db.airports.create_index([("name", 1)])
@@ -178,15 +762,315 @@ def init_indexes():
     db.aircraft.create_index([("tail_number", 1)], unique=True)
     db.aircraft.create_index([("airline", 1)])
 
+    db.geofences.create_index([("name", 1)], unique=True)
+    db.geofence_events.create_index([("flight_id", 1), ("ts", 1)])
+    db.geofence_events.create_index([("fence_id", 1), ("ts", 1)])
+    # Latest events without a flight or fence filter
+    db.geofence_events.create_index([("ts", -1)])
+
     db.flight_updates.create_index([("updates.coordinates", "2dsphere")])
 
+    # Latest [lon, lat] per active flight, for viewport and radius queries
+    db.flight_updates.update_many(
+        {"current_position": {"$exists": False}, "updates.0": {"$exists": True}},
+        [{"$set": {"current_position": {"$arrayElemAt": ["$updates.coordinates", -1]}}}]
+    )
+    db.flight_updates.update_many(
+        {"current_altitude_m": {"$exists": False}, "updates.0": {"$exists": True}},
+        [{"$set": {"current_altitude_m": {"$arrayElemAt": ["$updates.altitude_m", -1]}}}]
+    )
+    db.flight_updates.create_index([("current_position", "2d")])
+
     print("✅ Indexes created successfully")
 
-with app.app_context():
+
+@app.cli.command("init-indexes")
+def init_indexes_command():
+    init_indexes()
+
+
+@app.cli.command("tier-archive")
+@click.option("--retention-days", default=30, show_default=True, help="Keep this many days of flight_logs in Mongo")
+def tier_archive_command(retention_days):
+    if not archive_tier.available():
+        print("❌ pyarrow is required for tiering")
+        return
+    cutoff = format_event_time(datetime.utcnow() - timedelta(days=retention_days))
+    moved = archive_tier.tier_flights(mongo.db, cutoff)
+    print(f"✅ Moved {moved} archived flights older than {cutoff} to {archive_tier.TIER_DIR}")
+
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    tier_tables = ()
+    if archive_tier.available():
+        columns = ["first_seen", "last_seen", "source_airport", "destination_airport", "aircraft_type", "total_distance_km"]
+        tier_tables = archive_tier.scan(columns)
+    tiered = rollups.rebuild(mongo.db, tier_tables)
+    print(f"✅ Rollups rebuilt from flight_logs and {tiered} tiered flights")
+
+
+@app.cli.command("seed-airport-fences")
+@click.option("--radius-km", default=50.0, show_default=True, help="Radius of each approach corridor")
+def seed_airport_fences_command(radius_km):
+    # One circular approach fence per airport, replacing earlier seeds
+    db = mongo.db
+    ops = []
+    for airport in db.airports.find({}, {"code": 1, "lat": 1, "lon": 1}):
+        fence = geofence.parse_fence({
+            "name": f"{airport['code']} approach",
+            "type": "circle",
+            "kind": "approach",
+            "center": [airport['lon'], airport['lat']],
+            "radius_km": radius_km,
+        })
+        fence["airport"] = airport['code']
+        ops.append(UpdateOne({"name": fence["name"]}, {"$set": fence}, upsert=True))
+    if ops:
+        db.geofences.bulk_write(ops, ordered=False)
+    print(f"✅ Seeded {len(ops)} airport approach fences ({radius_km:g} km)")
+
+
+@app.cli.command("watch-changes")
+def watch_changes_command():
+    # Foreground listener for checking a replica-set setup; Ctrl+C to stop
+    change_feed.on_change(lambda event: print(f"🔔 {json.dumps(event, default=str)}"))
+    feed = change_feed.ChangeFeed(mongo.db, name="cli")
     try:
-        init_indexes()
+        feed.run()
+    except KeyboardInterrupt:
+        feed.stop()
+
+
+@app.cli.command("compress-archive")
+def compress_archive_command():
+    # Re-encodes flight_logs archived before the columnar track format existed
+    db = mongo.db
+    converted = skipped = 0
+    for flight in db.flight_logs.find({"updates": {"$exists": True}, "track": {"$exists": False}}):
+        try:
+            encoded = Track.from_updates(flight.get('updates', [])).to_codec()
+        except (ValueError, OverflowError):
+            skipped += 1
+            continue
+        db.flight_logs.update_one(
+            {"_id": flight["_id"]},
+            {"$set": {"track": encoded}, "$unset": {"updates": "", "current_position": "", "current_altitude_m": ""}}
+        )
+        converted += 1
+    print(f"✅ Compressed {converted} archived tracks ({skipped} left verbose)")
+
+
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+
+ingest_capture = capture.CaptureWriter(app.config["CAPTURE_PATH"]) if app.config["CAPTURE_PATH"] else None
+CAPTURE_KINDS = {"ingest_flight_data": capture.KIND_SINGLE, "batch_ingest": capture.KIND_BATCH}
+CAPTURE_ERRORS = metrics.counter(
+    "flightaware_capture_write_errors_total",
+    "Ingest requests whose capture record could not be written",
+)
+
+
+def write_capture(write, *args):
+    # A capture failure (a full disk, say) is logged and counted; the ingest
+    # itself goes ahead
+    try:
+        write(*args)
+    except OSError as e:
+        CAPTURE_ERRORS.inc()
+        print(f"⚠️ Could not write ingest capture: {e}")
+
+
+@app.before_request
+def capture_ingest():
+    # Runs ahead of admission control, so throttled traffic is recorded too
+    kind = CAPTURE_KINDS.get(request.endpoint)
+    if ingest_capture is not None and kind is not None:
+        write_capture(ingest_capture.write, kind, request.get_data(cache=True))
+
+
+INGEST_ENDPOINTS = {"ingest_flight_data", "batch_ingest", "binary_ingest"}
+# Scrapes, admin calls and long-lived streams never wait behind other traffic
+ADMISSION_EXEMPT = {"metrics_endpoint", "profiling_settings", "get_request_profile", "stream_changes"}
+
+
+def throttled_response(message, retry_after, status=429, **details):
+    seconds = max(1, math.ceil(retry_after))
+    response = jsonify({"error": message, "retry_after": seconds, **details})
+    response.status_code = status
+    response.headers["Retry-After"] = str(seconds)
+    return response
+
+
+def has_unique_flight_index(index_info):
+    # The dedup guards upsert on a filter that can miss an existing flight;
+    # only this index turns that miss into error 11000 instead of a second
+    # document for the same flight_id
+    return any(
+        index.get("key") == [("flight_id", 1)] and index.get("unique")
+        for index in index_info.values()
+    )
+
+
+MISSING_FLIGHT_INDEX = "flight_updates has no unique flight_id index; run `flask --app app init-indexes`"
+_flight_index_checked = False
+
+
+@app.before_request
+def require_flight_index():
+    # Checked once per worker; ingest is refused until the index exists
+    global _flight_index_checked
+    if _flight_index_checked or request.endpoint not in INGEST_ENDPOINTS:
+        return None
+    if not has_unique_flight_index(mongo.db.flight_updates.index_information()):
+        app.logger.error(MISSING_FLIGHT_INDEX)
+        return jsonify({"error": MISSING_FLIGHT_INDEX}), 503
+    _flight_index_checked = True
+
+
+@app.before_request
+def admit_request():
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in ADMISSION_EXEMPT or not request.path.startswith("/api/"):
+        return None
+
+    if endpoint in INGEST_ENDPOINTS:
+        retry_after = admission.check_client(request.remote_addr)
+        if retry_after:
+            return throttled_response("Too many ingest requests from this client", retry_after)
+        pool = admission.pools["ingest"]
+        # Ingest fails fast so it can never hold more than its share of threads
+        slot = pool.acquire()
+    else:
+        pool = admission.pools["read"]
+        slot = pool.acquire(timeout=admission.settings["read_wait_seconds"])
+
+    if slot is None:
+        admission.THROTTLED.inc(reason=f"{pool.name}_pool")
+        return throttled_response("Server is at capacity for this kind of request", 1)
+    g.admission_slot = (pool, slot)
+
+
+@app.teardown_request
+def release_admission_slot(error=None):
+    admitted = g.pop("admission_slot", None)
+    if admitted:
+        pool, slot = admitted
+        pool.release(slot)
+
+
+def acquire_stream():
+    # A slot in the stream pool, or None when this worker has enough open
+    # streams. Teardown runs before a streamed body is sent, so the slot is
+    # held by the response instead; see event_stream
+    slot = admission.pools["stream"].acquire()
+    if slot is None:
+        admission.THROTTLED.inc(reason="stream_pool")
+    return slot
+
+
+def event_stream(events, slot):
+    response = Response(events, mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+    # close() is called when the stream ends or the client goes away, even
+    # if the body was never iterated
+    response.call_on_close(lambda: admission.pools["stream"].release(slot))
+    return response
+
+
+_change_feed = None
+_change_feed_lock = threading.Lock()
+
+
+@app.before_request
+def start_change_feed():
+    # Started lazily so it runs once per worker, after any fork. A worker's
+    # feed is unnamed: a new process starts with empty caches and no stream
+    # subscribers, so it has nothing to catch up on and starts from now
+    global _change_feed
+    if _change_feed is None and app.config["CHANGE_STREAMS"]:
+        with _change_feed_lock:
+            if _change_feed is None:
+                _change_feed = change_feed.ChangeFeed(mongo.db)
+                _change_feed.start()
+
+
+@app.before_request
+def start_request_profile():
+    explicit = request.headers.get("X-Profile") == "1" or request.args.get("profile") == "1"
+    if explicit and is_admin_request():
+        profiling.start("requested")
+    elif profiling.should_sample():
+        profiling.start("sampled")
+
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.finish_request(request.method, route, response.status_code)
+
+    profile_id = profiling.stop(request.method, request.full_path, route, response.status_code)
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/admin/profiling", methods=["GET", "POST"])
+def profiling_settings():
+    if not is_admin_request():
+        return jsonify({"error": "Admin token required"}), 403
+
+    try:
+        if request.method == "POST":
+            data = request.get_json() or {}
+            if "sample_rate" in data:
+                rate = float(data["sample_rate"])
+                if rate < 0 or rate > 1:
+                    return jsonify({"error": "sample_rate must be between 0 and 1"}), 400
+                profiling.settings["sample_rate"] = rate
+            if "max_profiles" in data:
+                profiling.settings["max_profiles"] = max(1, int(data["max_profiles"]))
+
+        return jsonify({
+            "settings": profiling.settings,
+            "profiles": profiling.list_profiles()
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/admin/profiles/<profile_id>", methods=["GET"])
+def get_request_profile(profile_id):
+    if not is_admin_request():
+        return jsonify({"error": "Admin token required"}), 403
+
+    entry = profiling.get_profile(profile_id)
+    if not entry:
+        return jsonify({"error": f"Profile {profile_id} not found"}), 404
+
+    if request.args.get("format") == "pstats":
+        return Response(
+            profiling.render_pstats(entry),
+            mimetype="application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename={profile_id}.pstats"}
+        )
+
+    try:
+        text = profiling.render_text(
+            entry,
+            sort=request.args.get("sort"),
+            limit=request.args.get("limit", type=int)
+        )
+        return Response(text, mimetype="text/plain")
     except Exception as e:
-        print(f"⚠️ Index initialization warning: {e}")
+        return jsonify({"error": str(e)}), 400
 
 
 @app.route("/api/ingest", methods=["POST"])
@@ -194,65 +1078,75 @@ def ingest_flight_data():
     try:
         data = request.get_json()
 
-        is_valid, errors = validate_flight_data(data)
+        with metrics.timed("ingest", "validate"):
+            is_valid, errors = validate_flight_data(data)
         if not is_valid:
             return jsonify({"error": "Validation failed", "details": errors}), 400
 
-        flight_id = data['flight_id']
-        timestamp = datetime.utcnow().isoformat() + 'Z'
-
-        update_entry = {
-            "lat": float(data['lat']),
-            "lon": float(data['lon']),
-            "altitude_m": float(data['altitude_m']),
-            "spd_kts": float(data['spd_kts']),
-            "heading": float(data['heading']),
-            "vertical_rate": data.get('vertical_rate', 0),
-            "ts": timestamp,
-            "receiver_id": data.get('receiver_id', 'UNKNOWN'),
-            "coordinates": [float(data['lon']), float(data['lat'])]
-        }
+        limited = admission.check_receivers([data])
+        if limited:
+            return throttled_response(f"Receiver {limited[0]} is over its report rate", limited[1])
 
-        db = mongo.db
-        existing_flight = db.flight_updates.find_one({"flight_id": flight_id})
-
-        if existing_flight:
-            db.flight_updates.update_one(
-                {"flight_id": flight_id},
-                {
-                    "$push": {"updates": update_entry},
-                    "$set": {
-                        "last_seen": timestamp,
-                        "status": data.get('status', existing_flight.get('status', 'active')),
-                        "source_airport": data.get("source", existing_flight.get("source_airport")),
-                        "destination_airport": data.get("destination", existing_flight.get("destination_airport"))
-                    }
-                }
-            )
-            message = "Flight data updated"
-        else:
-            new_flight = {
-                "flight_id": flight_id,
-                "callsign": data['callsign'],
-                "aircraft_type": data.get('aircraft_type', 'Unknown'),
-                "tail_number": data.get('tail_number', 'N/A'),
-                "first_seen": timestamp,
-                "last_seen": timestamp,
-                "status": data.get('status', 'active'),
-                "source_airport": data.get("source", "Unknown"),
-                "destination_airport": data.get("destination", "Unknown"),
-                "updates": [update_entry]
-            }
-            db.flight_updates.insert_one(new_flight)
-            message = "New flight tracked"
+        normalize_report(data)
+        flight_id = data['flight_id']
+        key = dedup.event_key(data)
+        if recent_reports.check_and_add(flight_id, key):
+            dedup.record("duplicate", "memory")
+            return jsonify(duplicate_ack(flight_id)), 200
 
-        check_and_archive_flight(flight_id)
+        try:
+            timestamp = utc_timestamp()
+            update_entry = build_update_entry(data, timestamp)
+
+            db = mongo.db
+            with metrics.timed("ingest", "lookup"):
+                existing_flight = db.flight_updates.find_one({"flight_id": flight_id})
+
+            message = None
+            fence_events = []
+            if not existing_flight:
+                new_flight = build_new_flight(data, update_entry['ts'], update_entry)
+                with metrics.timed("ingest", "geofence"):
+                    new_flight['geofences'], fence_events = geofence_crossings(data, [update_entry], [])
+                try:
+                    with metrics.timed("ingest", "insert"):
+                        db.flight_updates.insert_one(new_flight)
+                    message = "New flight tracked"
+                except DuplicateKeyError:
+                    # Another receiver created the flight first
+                    existing_flight = db.flight_updates.find_one({"flight_id": flight_id})
+
+            if message is None:
+                update = build_flight_update(data, timestamp, update_entry, existing_flight)
+                fence_events = []
+                if is_latest_report(update_entry, existing_flight):
+                    with metrics.timed("ingest", "geofence"):
+                        update["$set"]["geofences"], fence_events = geofence_crossings(
+                            data, [update_entry], existing_flight.get('geofences', [])
+                        )
+                with metrics.timed("ingest", "push"):
+                    result = db.flight_updates.update_one(dedup.guard_filter(flight_id, key), update)
+                if result.matched_count == 0:
+                    dedup.record("duplicate", "server")
+                    return jsonify(duplicate_ack(flight_id)), 200
+                message = "Flight data updated"
+        except Exception:
+            recent_reports.forget(flight_id, key)
+            dedup.record("failed")
+            raise
+
+        dedup.record("written")
+        track_position(data, update_entry)
+        record_geofence_events(fence_events)
+        with metrics.timed("ingest", "archive_check"):
+            check_and_archive_flight(flight_id)
 
         return jsonify({
             "success": True,
             "message": message,
             "flight_id": flight_id,
-            "timestamp": timestamp
+            "timestamp": update_entry['ts'],
+            "received_at": timestamp
         }), 201
 
     except Exception as e:
@@ -269,65 +1163,60 @@ def batch_ingest():
         if not updates:
             return jsonify({"error": "No updates provided"}), 400
 
+        max_reports = admission.settings["max_batch_reports"]
+        if len(updates) > max_reports:
+            admission.THROTTLED.inc(reason="batch_size")
+            return jsonify({
+                "error": f"Batch too large: {len(updates)} updates, at most {max_reports} per request",
+                "max_batch_reports": max_reports
+            }), 413
+
+        oversized = admission.oversized_receiver(updates)
+        if oversized:
+            burst = admission.settings["receiver_burst"]
+            admission.THROTTLED.inc(reason="receiver_burst")
+            return jsonify({
+                "error": f"Batch carries {oversized[1]} updates from receiver {oversized[0]}, "
+                         f"at most {burst} per receiver per request; split the batch",
+                "max_receiver_reports": burst
+            }), 413
+
+        limited = admission.check_receivers(updates)
+        if limited:
+            return throttled_response(f"Receiver {limited[0]} is over its report rate", limited[1])
+
         results = {
             "success": [],
+            "duplicates": [],
             "failed": []
         }
 
+        valid = []
         for update in updates:
             is_valid, errors = validate_flight_data(update)
             if is_valid:
-                try:
-                    flight_id = update['flight_id']
-                    timestamp = datetime.utcnow().isoformat() + 'Z'
-
-                    update_entry = {
-                        "lat": float(update['lat']),
-                        "lon": float(update['lon']),
-                        "altitude_m": float(update['altitude_m']),
-                        "spd_kts": float(update['spd_kts']),
-                        "heading": float(update['heading']),
-                        "vertical_rate": update.get('vertical_rate', 0),
-                        "ts": timestamp,
-                        "receiver_id": update.get('receiver_id', 'UNKNOWN'),
-                        "coordinates": [float(update['lon']), float(update['lat'])]
-                    }
-
-                    db = mongo.db
-                    existing = db.flight_updates.find_one({"flight_id": flight_id})
-
-                    if existing:
-                        db.flight_updates.update_one(
-                            {"flight_id": flight_id},
-                            {"$push": {"updates": update_entry}, "$set": {"last_seen": timestamp}}
-                        )
-                    else:
-                        new_flight = {
-                            "flight_id": flight_id,
-                            "callsign": update['callsign'],
-                            "aircraft_type": update.get('aircraft_type', 'Unknown'),
-                            "tail_number": update.get('tail_number', 'N/A'),
-                            "first_seen": timestamp,
-                            "last_seen": timestamp,
-                            "status": update.get('status', 'active'),
-                            "source_airport": update.get("source", "Unknown"),
-                            "destination_airport": update.get("destination", "Unknown"),
-                            "updates": [update_entry]
-                        }
-                        db.flight_updates.insert_one(new_flight)
-
-                    results["success"].append(flight_id)
-                except Exception as e:
-                    results["failed"].append({"flight_id": update.get('flight_id'), "error": str(e)})
+                valid.append(update)
             else:
                 results["failed"].append({
                     "flight_id": update.get('flight_id'),
                     "errors": errors
                 })
 
+        # One unordered bulk write for the whole batch, one op per flight
+        failed, duplicates = write_flight_reports(valid) if valid else ({}, set())
+        for index, update in enumerate(valid):
+            flight_id = update['flight_id']
+            if flight_id in failed:
+                results["failed"].append({"flight_id": flight_id, "error": failed[flight_id]})
+            elif index in duplicates:
+                results["duplicates"].append(flight_id)
+            else:
+                results["success"].append(flight_id)
+
         return jsonify({
             "total": len(updates),
             "successful": len(results["success"]),
+            "duplicates": len(results["duplicates"]),
             "failed": len(results["failed"]),
             "details": results
         }), 200
@@ -336,99 +1225,357 @@ def batch_ingest():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/track/<flight_id>", methods=["GET"])
-def track_flight_api(flight_id):
+BINARY_INGEST_CHUNK = 500
+MAX_REPORTED_FAILURES = 100
+
+metrics.CACHE_ENTRIES.set_function(wire_format.session_count, cache="wire_sessions")
+
+
+@app.route("/api/ingest/binary", methods=["POST"])
+def binary_ingest():
+    if not wire_format.available():
+        return jsonify({"error": "MessagePack support is not installed on this server"}), 501
+    if request.mimetype not in wire_format.CONTENT_TYPES:
+        return jsonify({"error": "Content-Type must be application/msgpack"}), 415
+
+    session_id = request.headers.get("X-Session-Id")
+    flights = wire_format.session_flights(session_id) if session_id else {}
+    receiver_id = request.headers.get("X-Receiver-Id", "UNKNOWN")
+
+    summary = {"total": 0, "successful": 0, "duplicates": 0, "failed": 0}
+    failures = []
+    chunk = []
+    captured = []
+
+    def capture_reports():
+        if captured:
+            write_capture(ingest_capture.write_reports, captured)
+            captured.clear()
+
+    def record_failure(failure):
+        summary["failed"] += 1
+        if len(failures) < MAX_REPORTED_FAILURES:
+            failures.append(failure)
+
+    def flush():
+        # Returns seconds to wait when the receiver is over its rate; the
+        # chunk is then left unwritten
+        capture_reports()
+        limited = admission.check_receivers(chunk)
+        if limited:
+            return limited[1]
+        failed, duplicates = write_flight_reports(chunk)
+        for index, report in enumerate(chunk):
+            if report['flight_id'] in failed:
+                record_failure({"flight_id": report['flight_id'], "error": failed[report['flight_id']]})
+            elif index in duplicates:
+                summary["duplicates"] += 1
+            else:
+                summary["successful"] += 1
+        chunk.clear()
+        return 0
 
     try:
-        db = mongo.db
+        # Positions are decoded straight off the request stream and written in
+        # bounded chunks, so memory does not grow with the request size
+        for report, error in wire_format.decode_frames(request.stream, flights, receiver_id):
+            if error:
+                record_failure(error)
+                continue
+            if ingest_capture is not None:
+                captured.append(dict(report))
+
+            summary["total"] += 1
+            is_valid, errors = validate_flight_data(report)
+            if not is_valid:
+                record_failure({"flight_id": report.get('flight_id'), "errors": errors})
+                continue
+
+            chunk.append(report)
+            # A chunk must fit the receiver's bucket or it could never be admitted
+            if len(chunk) >= min(BINARY_INGEST_CHUNK, admission.settings["receiver_burst"]):
+                retry_after = flush()
+                if retry_after:
+                    break
 
-        flight = db.flight_updates.find_one({"flight_id": flight_id})
-        source = "active"
+        else:
+            retry_after = flush() if chunk else 0
+
+        if retry_after:
+            # The throttled chunk and the rest of the stream were not written;
+            # the receiver resends them and their ts (or seq) keeps the resend idempotent
+            return throttled_response(
+                f"Receiver {receiver_id} is over its report rate", retry_after,
+                **summary, unwritten=len(chunk), details=failures
+            )
 
-        if not flight:
-            flight = db.flight_logs.find_one({"flight_id": flight_id})
-            source = "archived"
+        return jsonify({**summary, "details": failures}), 200
 
-        if not flight:
-            return jsonify({"error": f"Flight {flight_id} not found"}), 404
+    except ValueError as e:
+        if chunk:
+            flush()
+        return jsonify({**summary, "details": failures, "error": f"Malformed MessagePack stream: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        capture_reports()
 
-        time_param = request.args.get('time')
-        updates = flight.get('updates', [])
 
-        if time_param and updates:
+# Archived tracks never change, so their simplified versions are cached.
+# Entries are lists of update dicts, sized at the ~680 bytes per point that
+# track._benchmark measures for that shape
+SIMPLIFIED_POINT_BYTES = 700
+simplified_tracks = LRUCache(
+    "simplified_tracks",
+    max_entries=2000,
+    max_bytes=int(os.environ.get("FLIGHTAWARE_SIMPLIFIED_CACHE_MB", 64)) * 1024 * 1024,
+    size_of=lambda points: len(points) * SIMPLIFIED_POINT_BYTES
+)
+
+
+def simplification_params(args):
+    if args.get('tolerance') is not None:
+        tolerance = float(args.get('tolerance'))
+    elif args.get('zoom') is not None:
+        tolerance = track_simplify.tolerance_for_zoom(int(args.get('zoom')))
+    else:
+        return None
+
+    max_points = int(args.get('max_points', track_simplify.DEFAULT_MAX_POINTS))
+    return max(0.0, tolerance), max(2, min(10000, max_points))
+
+
+def simplified_track(flight, source, tolerance, max_points):
+    updates = flight.get('updates', [])
+    if source != "archived":
+        return track_simplify.simplify_updates(updates, tolerance, max_points)
+
+    key = (flight['flight_id'], round(tolerance, 9), max_points)
+    simplified = simplified_tracks.get(key)
+    if simplified is None:
+        simplified = track_simplify.simplify_updates(updates, tolerance, max_points)
+        simplified_tracks.set(key, simplified)
+    return simplified
+
+
+@change_feed.on_change
+def refresh_reference_data(event):
+    if event["collection"] == "geofences":
+        fences.mark_stale()
+    elif event["collection"] == "airports":
+        airport_cache.clear()
+
+
+@change_feed.on_change
+def invalidate_track_caches(event):
+    if event["collection"] != "flight_logs":
+        return
+    if event["flight_id"]:
+        simplified_tracks.invalidate(lambda key: key[0] == event["flight_id"])
+        archived_responses.invalidate(lambda key: key[0] == event["flight_id"])
+    else:
+        # Deletes only carry the _id, e.g. when tiering moves flights to disk
+        simplified_tracks.clear()
+        archived_responses.clear()
+
+
+@app.route("/api/stream/changes", methods=["GET"])
+def stream_changes():
+    # Exempt from the read pool, but each open stream holds a thread, so it
+    # takes a slot in the stream pool for as long as the client stays
+    collections = set(filter(None, request.args.get('collections', '').split(',')))
+    slot = acquire_stream()
+    if slot is None:
+        return throttled_response("Too many open streams on this server", 5)
+    subscriber = change_feed.subscribe()
+
+    def generate():
+        yield ": connected\n\n"
+        while True:
             try:
-                requested_time = datetime.fromisoformat(time_param.replace('Z', '+00:00'))
-                closest_update = min(
-                    updates,
-                    key=lambda x: abs(datetime.fromisoformat(x['ts'].replace('Z', '+00:00')) - requested_time)
-                )
-                location = closest_update
-            except:
-                location = updates[-1] if updates else None
-        else:
-            location = updates[-1] if updates else None
-
-        use_geojson = request.args.get('format') == 'geojson'
-
-        if use_geojson and location:
-            current_location = to_geojson_point(
-                location['lat'],
-                location['lon'],
-                {
-                    "altitude_m": location.get('altitude_m'),
-                    "spd_kts": location.get('spd_kts'),
-                    "heading": location.get('heading'),
-                    "timestamp": location.get('ts')
-                }
-            )
-        else:
-            current_location = location
-
-        response = {
-            "flight_id": flight.get('flight_id'),
-            "callsign": flight.get('callsign'),
-            "aircraft_type": flight.get('aircraft_type'),
-            "tail_number": flight.get('tail_number'),
-            "status": flight.get('status'),
-            "source": source,
-            "source_airport": flight.get('source_airport'),
-            "destination_airport": flight.get('destination_airport'),
-            "first_seen": flight.get('first_seen'),
-            "last_seen": flight.get('last_seen'),
-            "total_updates": len(updates),
-            "total_distance_km": flight.get('total_distance_km'),
-            "current_location": current_location,
-            "all_updates": updates if request.args.get('full') == 'true' else None
+                event = subscriber.get(timeout=15)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if collections and event["collection"] not in collections:
+                continue
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+
+    response = event_stream(generate(), slot)
+    response.call_on_close(lambda: change_feed.unsubscribe(subscriber))
+    return response
+
+
+# Serialized /api/track bodies for archived flights, keyed (flight_id, etag)
+archived_responses = LRUCache(
+    "archived_track_responses",
+    max_entries=20000,
+    max_bytes=int(os.environ.get("FLIGHTAWARE_TRACK_CACHE_MB", 64)) * 1024 * 1024
+)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Parameters that do not change the response body
+ETAG_IGNORED_ARGS = {"profile"}
+
+
+def archived_version(flight_id):
+    # completed_at of an archived flight, None when there is no archived copy
+    db = mongo.db
+    doc = db.flight_logs.find_one({"flight_id": flight_id}, {"_id": 0, "completed_at": 1})
+    if not doc and archive_tier.available():
+        doc = db.flight_log_tier.find_one({"flight_id": flight_id}, {"_id": 0, "completed_at": 1})
+    return (doc.get("completed_at") or "archived") if doc else None
+
+
+def archived_etag(flight_id, version, args):
+    params = sorted((key, value) for key, value in args.items(multi=True) if key not in ETAG_IGNORED_ARGS)
+    digest = hashlib.sha256(json.dumps([flight_id, version, params]).encode()).hexdigest()
+    return digest[:32]
+
+
+def track_payload(flight, source, args):
+    # (status, payload) for a loaded flight; with full=true an archived
+    # flight must already be expanded
+    try:
+        params = simplification_params(args)
+    except ValueError:
+        return 400, {"error": "tolerance, zoom and max_points must be numbers"}
+
+    if params and args.get('full') == 'true':
+        tolerance, max_points = params
+        simplified = simplified_track(flight, source, tolerance, max_points)
+        response = build_track_response(flight, source, args, all_updates=simplified)
+        response["simplification"] = {
+            "tolerance_deg": tolerance,
+            "max_points": max_points,
+            "returned_points": len(simplified)
         }
+        return 200, response
+
+    return 200, build_track_response(flight, source, args)
+
+
+def archived_track_body(flight_id):
+    # (status, payload) for /api/track on an archived flight
+    flight = find_archived_flight(flight_id, expand=request.args.get('full') == 'true')
+    if not flight:
+        return 404, {"error": f"Flight {flight_id} not found"}
+    return track_payload(flight, "archived", request.args)
+
+
+@app.route("/api/track/<flight_id>", methods=["GET"])
+def track_flight_api(flight_id):
 
-        return jsonify(response), 200
+    try:
+        # Active flights, the common poll, cost one lookup; only a miss goes
+        # on to the archived version
+        flight = mongo.db.flight_updates.find_one({"flight_id": flight_id})
+        version = None if flight else archived_version(flight_id)
+        if version is None:
+            if flight:
+                status, payload = track_payload(flight, "active", request.args)
+            else:
+                status, payload = 404, {"error": f"Flight {flight_id} not found"}
+            response = jsonify(payload)
+            response.status_code = status
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        # Archived flights never change: answer conditional requests without
+        # loading the track, and keep rendered bodies in memory
+        etag = archived_etag(flight_id, version, request.args)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            body = archived_responses.get((flight_id, etag))
+            if body is None:
+                status, payload = archived_track_body(flight_id)
+                if status != 200:
+                    return jsonify(payload), status
+                body = app.json.dumps(payload).encode()
+                archived_responses.set((flight_id, etag), body)
+            response = Response(body, mimetype="application/json")
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# Pages are newest first on indexed fields, so a page walks the index
+# instead of scanning the collection. flight_id breaks ties so keyset pages
+# (page_after) neither repeat nor drop flights that share a timestamp
+ACTIVE_PAGE_SORT = [("last_seen", -1), ("flight_id", -1)]
+ARCHIVED_PAGE_SORT = [("completed_at", -1), ("flight_id", -1)]
+
+
+def page_after(sort, cursor):
+    # Filter for the rows after cursor = (sort value, flight_id) in a page
+    # sort. The leading field is bounded, so the scan starts at the cursor's
+    # place in the index however deep the page is
+    if cursor is None:
+        return {}
+    field = sort[0][0]
+    value, flight_id = cursor
+    return {field: {"$lte": value}, "$nor": [{field: value, "flight_id": {"$gte": flight_id}}]}
+
+
+# Offsets are still accepted for old clients, but only this deep; past it
+# the skipped index keys cost more than the page itself
+MAX_LIST_OFFSET = 1000
+
+
+def request_cursor(args, prefix=""):
+    before, before_id = args.get(f"{prefix}before"), args.get(f"{prefix}before_id")
+    return (before, before_id) if before and before_id else None
+
+
+def next_page_cursor(flights, sort, limit):
+    # flights holds up to limit + 1 rows; the extra row only shows there is
+    # another page, which starts after the last row of this one
+    field = sort[0][0]
+    if len(flights) <= limit or flights[limit - 1].get(field) is None:
+        return None
+    return {"before": flights[limit - 1][field], "before_id": flights[limit - 1]['flight_id']}
+
+
+def flight_page(collection, sort, cursor, offset, limit):
+    flights = list(collection.find(page_after(sort, cursor), {'_id': 0}).sort(sort).skip(offset).limit(limit + 1))
+    return flights[:limit], next_page_cursor(flights, sort, limit)
+
+
 @app.route("/api/flights", methods=["GET"])
 def list_flights():
-
+    # Pages are keyset cursors: pass next_cursor back as before/before_id
+    # (prefixed active_ or archived_ when status=all)
     try:
         db = mongo.db
         status_filter = request.args.get('status', 'all')
-        limit = int(request.args.get('limit', 100))
-        offset = int(request.args.get('offset', 0))
+        limit = max(1, request.args.get('limit', 100, type=int))
+        offset = request.args.get('offset', 0, type=int)
+        if not 0 <= offset <= MAX_LIST_OFFSET:
+            return jsonify({"error": f"offset must be between 0 and {MAX_LIST_OFFSET}; page on with before/before_id"}), 400
 
         if status_filter == 'active':
-            flights = list(db.flight_updates.find({}, {'_id': 0}).skip(offset).limit(limit))
-            return jsonify({"flights": flights, "count": len(flights)}), 200
+            flights, next_cursor = flight_page(db.flight_updates, ACTIVE_PAGE_SORT, request_cursor(request.args), offset, limit)
+            return jsonify({"flights": flights, "count": len(flights), "next_cursor": next_cursor}), 200
         elif status_filter == 'completed':
-            flights = list(db.flight_logs.find({}, {'_id': 0}).skip(offset).limit(limit))
-            return jsonify({"flights": flights, "count": len(flights)}), 200
+            flights, next_cursor = flight_page(db.flight_logs, ARCHIVED_PAGE_SORT, request_cursor(request.args), offset, limit)
+            flights = [track_codec.expand_flight(f) for f in flights]
+            return jsonify({"flights": flights, "count": len(flights), "next_cursor": next_cursor}), 200
         else:
-            active = list(db.flight_updates.find({}, {'_id': 0}).skip(offset).limit(limit))
-            archived = list(db.flight_logs.find({}, {'_id': 0}).skip(offset).limit(limit))
+            active, active_next = flight_page(
+                db.flight_updates, ACTIVE_PAGE_SORT, request_cursor(request.args, "active_"), offset, limit)
+            archived, archived_next = flight_page(
+                db.flight_logs, ARCHIVED_PAGE_SORT, request_cursor(request.args, "archived_"), offset, limit)
+            archived = [track_codec.expand_flight(f) for f in archived]
             return jsonify({
                 "active_flights": active,
                 "archived_flights": archived,
-                "total": len(active) + len(archived)
+                "total": len(active) + len(archived),
+                "active_next_cursor": active_next,
+                "archived_next_cursor": archived_next
             }), 200
 
     except Exception as e:
@@ -445,6 +1592,229 @@ def active_flights():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/conflicts", methods=["GET"])
+def conflict_pairs():
+    try:
+        horizontal_km = float(request.args.get('horizontal_km', detector.horizontal_km))
+        vertical_m = float(request.args.get('vertical_m', detector.vertical_m))
+        if horizontal_km <= 0 or vertical_m <= 0:
+            return jsonify({"error": "Thresholds must be positive"}), 400
+        if horizontal_km > detector.horizontal_km or vertical_m > detector.vertical_m:
+            return jsonify({
+                "error": f"Thresholds can only be tightened below {detector.horizontal_km} km / {detector.vertical_m} m"
+            }), 400
+
+        active = current_detector()
+        pairs = active.conflicts(horizontal_km, vertical_m)
+        return jsonify({
+            "conflicts": pairs,
+            "count": len(pairs),
+            "aircraft": len(active),
+            "thresholds": {"horizontal_km": horizontal_km, "vertical_m": vertical_m},
+            "refreshed_seconds_ago": round(time.monotonic() - active.refreshed_at, 1)
+        }), 200
+    except ValueError:
+        return jsonify({"error": "Invalid threshold parameters"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+SNAPSHOT_PROJECTION = {"_id": 0, **{name: 1 for name in snapshot.METADATA}}
+MAX_SNAPSHOT_FLIGHTS = 10000
+MAX_REPLAY_SECONDS = 6 * 3600
+MAX_REPLAY_FRAMES = 5000
+# Wall-clock length of one replay stream, span / speed
+MAX_REPLAY_WALL_SECONDS = 15 * 60
+# Longer than any scheduled flight (the longest are under 19 h). A flight
+# document spanning more than this is left out of snapshots and replays
+MAX_FLIGHT_DURATION = timedelta(hours=24)
+
+
+def airborne_query(start, end):
+    # Flights whose [first_seen, last_seen] overlaps [start, end]. The lower
+    # bound on first_seen lets the (first_seen, last_seen) index read only
+    # flights that started in the day before `start`, however old it is
+    earliest = format_event_time(parse_event_time(start) - MAX_FLIGHT_DURATION)
+    return {"last_seen": {"$gte": start}, "first_seen": {"$gte": earliest, "$lte": end}}
+
+
+def capped_flights(cursor, state):
+    # Up to MAX_SNAPSHOT_FLIGHTS (flight, state) pairs, and whether more matched
+    flights = [(flight, state) for flight in cursor.limit(MAX_SNAPSHOT_FLIGHTS + 1)]
+    return flights[:MAX_SNAPSHOT_FLIGHTS], len(flights) > MAX_SNAPSHOT_FLIGHTS
+
+
+def snapshot_flights(at):
+    # Yields one flight past MAX_SNAPSHOT_FLIGHTS per collection, so the
+    # caller can tell the result was cut short
+    db = mongo.db
+    # Active tracks are trimmed in Mongo to the reports either side of `at`
+    around = {"$concatArrays": [
+        {"$slice": [{"$filter": {"input": "$updates", "cond": {"$lte": ["$$this.ts", at]}}}, -1]},
+        {"$slice": [{"$filter": {"input": "$updates", "cond": {"$gt": ["$$this.ts", at]}}}, 1]},
+    ]}
+    active = db.flight_updates.aggregate([
+        {"$match": airborne_query(at, at)},
+        {"$limit": MAX_SNAPSHOT_FLIGHTS + 1},
+        {"$project": {**SNAPSHOT_PROJECTION, "updates": around}},
+    ])
+    for flight in active:
+        yield flight, "active"
+
+    # Archived tracks are encoded, so only the overlapping ones are decoded here
+    archived = db.flight_logs.find(
+        airborne_query(at, at), {**SNAPSHOT_PROJECTION, "track": 1, "updates": 1}
+    ).limit(MAX_SNAPSHOT_FLIGHTS + 1)
+    for flight in archived:
+        yield flight, "archived"
+
+
+@app.route("/api/snapshot", methods=["GET"])
+def fleet_snapshot():
+    try:
+        if not request.args.get('time'):
+            return jsonify({"error": "time is required"}), 400
+        at = format_event_time(parse_event_time(request.args.get('time')))
+        at_micros = to_micros(at)
+
+        positions = []
+        seen = {"active": 0, "archived": 0}
+        truncated = False
+        for flight, state in snapshot_flights(at):
+            seen[state] += 1
+            if seen[state] > MAX_SNAPSHOT_FLIGHTS:
+                truncated = True
+                continue
+            position = snapshot.flight_position(flight, state, at_micros)
+            if position:
+                positions.append(position)
+
+        return jsonify({"time": at, "flights": positions, "count": len(positions), "truncated": truncated}), 200
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid time: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/replay", methods=["GET"])
+def replay_stream():
+    try:
+        start = parse_event_time(request.args.get('from'))
+        end = parse_event_time(request.args.get('to'))
+        step = float(request.args.get('step', 10))
+        speed = float(request.args.get('speed', 10))
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({"error": "from and to are required timestamps; step and speed must be numbers"}), 400
+
+    span = (end - start).total_seconds()
+    if span <= 0 or span > MAX_REPLAY_SECONDS:
+        return jsonify({"error": f"to must be after from and at most {MAX_REPLAY_SECONDS // 3600} h later"}), 400
+    if step <= 0 or span / step > MAX_REPLAY_FRAMES:
+        return jsonify({"error": f"step must be positive and give at most {MAX_REPLAY_FRAMES} frames"}), 400
+    if not 0 < speed <= 1000:
+        return jsonify({"error": "speed must be between 0 and 1000"}), 400
+    if span / speed > MAX_REPLAY_WALL_SECONDS:
+        return jsonify({
+            "error": f"at this speed the replay would run over {MAX_REPLAY_WALL_SECONDS // 60} min; "
+                     f"use a speed of at least {math.ceil(span / MAX_REPLAY_WALL_SECONDS)}"
+        }), 400
+
+    slot = acquire_stream()
+    if slot is None:
+        return throttled_response("Too many open streams on this server", 5)
+    try:
+        db = mongo.db
+        query = airborne_query(format_event_time(start), format_event_time(end))
+        active, active_truncated = capped_flights(
+            db.flight_updates.find(query, {**SNAPSHOT_PROJECTION, "updates": 1}), "active")
+        archived, archived_truncated = capped_flights(
+            db.flight_logs.find(query, {**SNAPSHOT_PROJECTION, "track": 1, "updates": 1}), "archived")
+        # Decoded once up front; each frame is then a bisect per flight
+        prepared = snapshot.prepare(active + archived)
+    except Exception:
+        admission.pools["stream"].release(slot)
+        raise
+    truncated = active_truncated or archived_truncated
+
+    start_micros = to_micros(start)
+    frames = int(span // step) + 1
+
+    def generate():
+        for n in range(frames):
+            at = start_micros + int(n * step * 1e6)
+            positions = snapshot.frame(prepared, at)
+            payload = {"time": format_event_time(track_codec.EPOCH + timedelta(microseconds=at)), "frame": n, "frames": frames,
+                       "flights": positions, "truncated": truncated}
+            yield f"data: {json.dumps(payload)}\n\n"
+            if n < frames - 1:
+                time.sleep(step / speed)
+        yield "event: end\ndata: {}\n\n"
+
+    return event_stream(generate(), slot)
+
+
+EXPORT_BATCH_SIZE = 200
+EXPORT_STATUSES = ("completed", "active", "all")
+
+
+def export_query(start, end, airport, aircraft_type):
+    query = {}
+    if start:
+        query["last_seen"] = {"$gte": start}
+    if end:
+        query["first_seen"] = {"$lte": end}
+    if airport:
+        query["$or"] = [{"source_airport": airport}, {"destination_airport": airport}]
+    if aircraft_type:
+        query["aircraft_type"] = aircraft_type
+    return query
+
+
+def export_flights(status, start, end, airport, aircraft_type):
+    # Server-side cursors fetch EXPORT_BATCH_SIZE flights per round trip, so
+    # at most one batch is in memory while the response streams
+    db = mongo.db
+    query = export_query(start, end, airport, aircraft_type)
+    if status in ("active", "all"):
+        yield from db.flight_updates.find(query, {'_id': 0}, batch_size=EXPORT_BATCH_SIZE)
+    if status in ("completed", "all"):
+        yield from db.flight_logs.find(query, {'_id': 0}, batch_size=EXPORT_BATCH_SIZE)
+        if archive_tier.available():
+            yield from archive_tier.iter_flights(start, end, airport, aircraft_type, batch_size=EXPORT_BATCH_SIZE)
+
+
+@app.route("/api/export", methods=["GET"])
+def export_history():
+    fmt = request.args.get('format', 'ndjson')
+    status = request.args.get('status', 'completed')
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(export.FORMATS)}"}), 400
+    if status not in EXPORT_STATUSES:
+        return jsonify({"error": f"status must be one of {', '.join(EXPORT_STATUSES)}"}), 400
+
+    try:
+        start = format_event_time(parse_event_time(request.args['from'])) if request.args.get('from') else None
+        end = format_event_time(parse_event_time(request.args['to'])) if request.args.get('to') else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "from and to must be timestamps"}), 400
+    if start and end and start > end:
+        return jsonify({"error": "from must not be after to"}), 400
+
+    airport = (request.args.get('airport') or "").upper() or None
+    aircraft_type = request.args.get('aircraft_type') or None
+    gzip = request.args.get('gzip') == 'true'
+
+    flights = export_flights(status, start, end, airport, aircraft_type)
+    body = export.stream(flights, fmt, start, end, gzip=gzip)
+
+    filename = f"flights-{status}.{'json' if fmt == 'geojson' else fmt}" + (".gz" if gzip else "")
+    return Response(
+        body,
+        mimetype="application/gzip" if gzip else export.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}", "Cache-Control": "no-store"}
+    )
+
+
 @app.route("/api/flights/nearby", methods=["GET"])
 def nearby_flights():
 
@@ -454,19 +1824,8 @@ def nearby_flights():
         radius_km = float(request.args.get('radius_km', 100))
 
         db = mongo.db
-        flights = list(db.flight_updates.find({}, {'_id': 0}))
-
-        nearby = []
-        for flight in flights:
-            updates = flight.get('updates', [])
-            if updates:
-                last = updates[-1]
-                distance = calculate_distance(lat, lon, last['lat'], last['lon'])
-                if distance <= radius_km:
-                    flight['distance_km'] = round(distance, 2)
-                    nearby.append(flight)
-
-        nearby.sort(key=lambda x: x['distance_km'])
+        flights = list(db.flight_updates.find(nearby_query(lat, lon, radius_km), {'_id': 0}))
+        nearby = filter_nearby(flights, lat, lon, radius_km)
 
         return jsonify({
             "location": {"lat": lat, "lon": lon},
@@ -479,15 +1838,95 @@ def nearby_flights():
         return jsonify({"error": str(e)}), 500
 
 
+VIEWPORT_CLUSTER_THRESHOLD = 500
+CLUSTER_CELL_PIXELS = 64
+
+
+@app.route("/api/flights/in-bounds", methods=["GET"])
+def flights_in_bounds():
+    try:
+        min_lat = float(request.args.get('min_lat'))
+        min_lon = float(request.args.get('min_lon'))
+        max_lat = float(request.args.get('max_lat'))
+        max_lon = float(request.args.get('max_lon'))
+        zoom = request.args.get('zoom', type=int)
+        threshold = int(request.args.get('cluster_threshold', VIEWPORT_CLUSTER_THRESHOLD))
+    except (TypeError, ValueError):
+        return jsonify({"error": "min_lat, min_lon, max_lat and max_lon are required numbers"}), 400
+
+    if not (validate_coordinates(min_lat, min_lon) and validate_coordinates(max_lat, max_lon)) or min_lat > max_lat:
+        return jsonify({"error": "Invalid bounding box"}), 400
+
+    try:
+        db = mongo.db
+        query = viewport_query(min_lat, min_lon, max_lat, max_lon)
+        bounds = {"min_lat": min_lat, "min_lon": min_lon, "max_lat": max_lat, "max_lon": max_lon}
+
+        # Counting stops at threshold + 1, so this never walks the whole viewport
+        in_view = db.flight_updates.count_documents(query, limit=threshold + 1)
+
+        if in_view <= threshold:
+            flights = []
+            projection = {
+                "_id": 0, "flight_id": 1, "callsign": 1, "aircraft_type": 1, "status": 1,
+                "source_airport": 1, "destination_airport": 1, "last_seen": 1, "updates": {"$slice": -1}
+            }
+            for flight in db.flight_updates.find(query, projection):
+                last = flight.pop('updates', [None])
+                flight['position'] = last[0] if last else None
+                flights.append(flight)
+
+            return jsonify({"mode": "flights", "bounds": bounds, "flights": flights, "count": len(flights)}), 200
+
+        if zoom is not None:
+            cell = track_simplify.tolerance_for_zoom(zoom, pixels=CLUSTER_CELL_PIXELS)
+        else:
+            width = (max_lon - min_lon) % 360 or 360
+            cell = max(width, max_lat - min_lat) / 16
+
+        pipeline = [
+            {"$match": query},
+            {"$project": {
+                "lon": {"$arrayElemAt": ["$current_position", 0]},
+                "lat": {"$arrayElemAt": ["$current_position", 1]}
+            }},
+            {"$group": {
+                "_id": {
+                    "x": {"$floor": {"$divide": ["$lon", cell]}},
+                    "y": {"$floor": {"$divide": ["$lat", cell]}}
+                },
+                "count": {"$sum": 1},
+                "lat": {"$avg": "$lat"},
+                "lon": {"$avg": "$lon"}
+            }}
+        ]
+        clusters = [
+            {"lat": round(c['lat'], 5), "lon": round(c['lon'], 5), "count": c['count']}
+            for c in db.flight_updates.aggregate(pipeline)
+        ]
+
+        return jsonify({
+            "mode": "clusters",
+            "bounds": bounds,
+            "cell_size_deg": cell,
+            "clusters": clusters,
+            "count": sum(c['count'] for c in clusters)
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/api/statistics", methods=["GET"])
 def statistics():
     try:
         db = mongo.db
 
-        total_active = db.flight_updates.count_documents({})
-        total_completed = db.flight_logs.count_documents({})
+        # Collection metadata; count_documents({}) would scan every document
+        total_active = db.flight_updates.estimated_document_count()
+        total_completed = db.flight_logs.estimated_document_count()
 
-        completed = list(db.flight_logs.find({}, {'_id': 0}))
+        completed = list(db.flight_logs.find({}, {'_id': 0, 'first_seen': 1, 'last_seen': 1, 'total_distance_km': 1}))
         durations = []
         total_dist = 0
         for flight in completed:
@@ -500,13 +1939,27 @@ def statistics():
             except:
                 pass
 
-        avg_duration = sum(durations) / len(durations) if durations else 0
-        avg_distance = total_dist / len(completed) if completed else 0
+        duration_sum = sum(durations)
+        duration_count = len(durations)
+        distance_count = len(completed)
+
+        # Flights moved to the cold tier are read from their memory-mapped columns
+        total_tiered = 0
+        if archive_tier.available():
+            tier = archive_tier.summary()
+            total_tiered = tier["flights"]
+            duration_sum += tier["duration_sum_hours"]
+            duration_count += tier["duration_count"]
+            total_dist += tier["distance_sum_km"]
+            distance_count += tier["flights"]
+
+        avg_duration = duration_sum / duration_count if duration_count else 0
+        avg_distance = total_dist / distance_count if distance_count else 0
 
         return jsonify({
-            "total_flights": total_active + total_completed,
+            "total_flights": total_active + total_completed + total_tiered,
             "active_flights": total_active,
-            "completed_flights": total_completed,
+            "completed_flights": total_completed + total_tiered,
             "average_flight_duration_hours": round(avg_duration, 2),
             "average_flight_distance_km": round(avg_distance, 2)
         }), 200
@@ -515,6 +1968,35 @@ def statistics():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/statistics/routes", methods=["GET"])
+def route_statistics():
+    granularity = request.args.get('granularity', 'daily')
+    if granularity not in rollups.GRANULARITIES:
+        return jsonify({"error": "granularity must be 'hourly' or 'daily'"}), 400
+
+    try:
+        per_bucket = request.args.get('per_bucket') == 'true'
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        routes = rollups.route_stats(mongo.db, request.args, granularity, per_bucket, limit)
+        return jsonify({"granularity": granularity, "routes": routes, "count": len(routes)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/statistics/airports", methods=["GET"])
+def airport_statistics():
+    granularity = request.args.get('granularity', 'daily')
+    if granularity not in rollups.GRANULARITIES:
+        return jsonify({"error": "granularity must be 'hourly' or 'daily'"}), 400
+
+    try:
+        limit = min(int(request.args.get('limit', 20)), 500)
+        airports = rollups.airport_stats(mongo.db, request.args, granularity, limit)
+        return jsonify({"granularity": granularity, "airports": airports, "count": len(airports)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/api/archive/<flight_id>", methods=["POST"])
 def manual_archive(flight_id):
     try:
@@ -533,6 +2015,100 @@ def manual_archive(flight_id):
         return jsonify({"error": str(e)}), 500
 
 
+def serialize_fence(doc):
+    doc = serialize_doc(doc)
+    doc["id"] = doc.pop("_id")
+    return doc
+
+
+def fence_object_id(fence_id):
+    try:
+        return ObjectId(fence_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+@app.route("/api/geofences", methods=["GET", "POST"])
+def geofences_collection():
+    try:
+        db = mongo.db
+        if request.method == "GET":
+            query = {}
+            if request.args.get('kind'):
+                query["kind"] = request.args.get('kind')
+            fence_docs = [serialize_fence(doc) for doc in db.geofences.find(query).sort("name", 1)]
+            return jsonify({"geofences": fence_docs, "count": len(fence_docs)}), 200
+
+        try:
+            fence = geofence.parse_fence(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        fence["created_at"] = utc_timestamp()
+        try:
+            db.geofences.insert_one(fence)
+        except DuplicateKeyError:
+            return jsonify({"error": f"A geofence named {fence['name']} already exists"}), 409
+
+        fences.add(geofence.Fence.from_doc(fence))
+        return jsonify(serialize_fence(fence)), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/geofences/<fence_id>", methods=["GET", "PUT", "DELETE"])
+def geofence_item(fence_id):
+    try:
+        db = mongo.db
+        object_id = fence_object_id(fence_id)
+        existing = db.geofences.find_one({"_id": object_id}) if object_id else None
+        if not existing:
+            return jsonify({"error": f"Geofence {fence_id} not found"}), 404
+
+        if request.method == "GET":
+            return jsonify(serialize_fence(existing)), 200
+
+        if request.method == "DELETE":
+            db.geofences.delete_one({"_id": object_id})
+            fences.remove(fence_id)
+            return jsonify({"success": True, "message": f"Geofence {fence_id} deleted"}), 200
+
+        try:
+            fence = geofence.parse_fence(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        fence["created_at"] = existing.get("created_at")
+        fence["updated_at"] = utc_timestamp()
+        try:
+            db.geofences.replace_one({"_id": object_id}, fence)
+        except DuplicateKeyError:
+            return jsonify({"error": f"A geofence named {fence['name']} already exists"}), 409
+
+        fence["_id"] = object_id
+        fences.add(geofence.Fence.from_doc(fence))
+        return jsonify(serialize_fence(fence)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/geofences/events", methods=["GET"])
+def geofence_events():
+    try:
+        query = {}
+        for param in ("flight_id", "fence_id", "event"):
+            if request.args.get(param):
+                query[param] = request.args.get(param)
+        if request.args.get('since'):
+            query["ts"] = {"$gte": format_event_time(parse_event_time(request.args.get('since')))}
+        limit = max(1, min(1000, int(request.args.get('limit', 100))))
+
+        events = list(mongo.db.geofence_events.find(query, {"_id": 0}).sort("ts", -1).limit(limit))
+        return jsonify({"events": events, "count": len(events)}), 200
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/api/airports", methods=["GET"])
 def list_airports():
     try:
@@ -559,6 +2135,135 @@ def get_airport(code):
 
 
 
+BOARD_FIELDS = {
+    "_id": 0, "flight_id": 1, "callsign": 1, "aircraft_type": 1, "tail_number": 1,
+    "source_airport": 1, "destination_airport": 1, "status": 1,
+    "first_seen": 1, "last_seen": 1, "completed_at": 1,
+    "current_position": 1, "current_altitude_m": 1,
+}
+BOARD_STATUSES = ["active", "completed"]
+
+# Boards are polled by many screens at once; a few seconds of staleness is fine
+board_cache = LRUCache("airport_boards", max_entries=2000, ttl_seconds=5)
+
+
+def airport_board(code, field):
+    code = code.upper()
+    hours = max(1, min(168, int(request.args.get('hours', 24))))
+    limit = max(1, min(200, int(request.args.get('limit', 50))))
+
+    key = (field, code, hours, limit)
+    board = board_cache.get(key)
+    if board is not None:
+        return board
+
+    db = mongo.db
+    since = format_event_time(datetime.utcnow() - timedelta(hours=hours))
+    in_progress = list(
+        db.flight_updates.find({field: code, "status": {"$in": BOARD_STATUSES}}, BOARD_FIELDS)
+        .sort("last_seen", -1).limit(limit)
+    )
+    completed = list(
+        db.flight_logs.find({field: code, "status": "completed", "completed_at": {"$gte": since}}, BOARD_FIELDS)
+        .sort("completed_at", -1).limit(limit)
+    )
+
+    board = {
+        "airport": code,
+        "hours": hours,
+        "in_progress": in_progress,
+        "completed": completed,
+        "count": len(in_progress) + len(completed),
+        "generated_at": utc_timestamp(),
+    }
+    board_cache.set(key, board)
+    return board
+
+
+SEARCH_FIELDS = ("flight_id", "callsign", "tail_number")
+SEARCH_PROJECTION = {
+    "_id": 0, "flight_id": 1, "callsign": 1, "tail_number": 1, "aircraft_type": 1,
+    "source_airport": 1, "destination_airport": 1, "status": 1, "last_seen": 1, "completed_at": 1,
+}
+# Active flights rank first, then archived ones still in Mongo, then the cold tier
+SEARCH_SOURCES = (("flight_updates", "active"), ("flight_logs", "archived"), ("flight_log_tier", "archived"))
+
+search_cache = LRUCache("search", max_entries=5000, ttl_seconds=5)
+
+
+def search_flights(prefix, limit):
+    # An anchored, case-sensitive regex is a range scan on each field's index
+    pattern = {"$regex": "^" + re.escape(prefix)}
+    query = {"$or": [{field: pattern} for field in SEARCH_FIELDS]}
+
+    db = mongo.db
+    results = []
+    seen = set()
+    for collection, state in SEARCH_SOURCES:
+        if len(results) >= limit:
+            break
+        docs = db[collection].find(query, SEARCH_PROJECTION).limit(limit - len(results))
+        matches = []
+        for doc in docs:
+            if doc['flight_id'] in seen:
+                continue
+            seen.add(doc['flight_id'])
+            doc['state'] = state
+            doc['matched'] = next(
+                (field for field in SEARCH_FIELDS if str(doc.get(field) or "").startswith(prefix)), None
+            )
+            matches.append(doc)
+        # Exact hits first, then the most recently seen
+        matches.sort(key=lambda doc: doc.get('last_seen') or doc.get('completed_at') or "", reverse=True)
+        matches.sort(key=lambda doc: prefix not in (doc.get('flight_id'), doc.get('callsign'), doc.get('tail_number')))
+        results.extend(matches)
+    return results
+
+
+@app.route("/api/search", methods=["GET"])
+def search():
+    try:
+        prefix = (request.args.get('q') or "").strip().upper()
+        if len(prefix) < 2 or len(prefix) > 40:
+            return jsonify({"error": "q must be 2-40 characters"}), 400
+        limit = max(1, min(50, int(request.args.get('limit', 10))))
+
+        key = (prefix, limit)
+        results = search_cache.get(key)
+        if results is None:
+            results = search_flights(prefix, limit)
+            search_cache.set(key, results)
+        return jsonify({"query": prefix, "results": results, "count": len(results)}), 200
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/airports/<code>/arrivals", methods=["GET"])
+def airport_arrivals(code):
+    try:
+        if not get_airport_cached(code.upper()):
+            return jsonify({"error": f"Airport {code} not found"}), 404
+        return jsonify({"board": "arrivals", **airport_board(code, "destination_airport")}), 200
+    except ValueError:
+        return jsonify({"error": "hours and limit must be integers"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/airports/<code>/departures", methods=["GET"])
+def airport_departures(code):
+    try:
+        if not get_airport_cached(code.upper()):
+            return jsonify({"error": f"Airport {code} not found"}), 404
+        return jsonify({"board": "departures", **airport_board(code, "source_airport")}), 200
+    except ValueError:
+        return jsonify({"error": "hours and limit must be integers"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/api/aircraft", methods=["GET"])
 def list_aircraft():
 
@@ -586,76 +2291,17 @@ def get_aircraft(tail_number):
 
 #WEB INTERFACE
 
+# Page templates live in templates/. They are compiled once per worker here
+# and then served from Jinja's cache; outside debug mode the files are not
+# checked again
+PAGE_TEMPLATES = ("home.html", "flight.html", "flight_not_found.html", "map.html", "all_flights.html")
+for name in PAGE_TEMPLATES:
+    app.jinja_env.get_template(name)
+
+
 @app.route("/")
 def home():
-    return '''                          
-    <html>
-    <head>
-        <title>FlightAware Tracker</title>
-        <style>
-            body { 
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                text-align: center;
-                padding: 50px;
-                margin: 0;
-            }
-            .container {
-                background: white;
-                padding: 40px;
-                border-radius: 15px;
-                box-shadow: 0 10px 40px rgba(0,0,0,0.2);
-                max-width: 500px;
-                margin: auto;
-            }
-            h2 { color: #667eea; margin-bottom: 10px; }
-            p { color: #666; margin-bottom: 30px; }
-            input {
-                padding: 12px; 
-                width: 80%; 
-                border-radius: 8px; 
-                border: 2px solid #ddd;
-                font-size: 16px;
-                margin-bottom: 15px;
-            }
-            button {
-                padding: 12px 30px;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                border: none;
-                color: white;
-                border-radius: 8px;
-                cursor: pointer;
-                font-size: 16px;
-                font-weight: bold;
-            }
-            button:hover { transform: translateY(-2px); box-shadow: 0 5px 20px rgba(102,126,234,0.4); }
-            .links { margin-top: 30px; }
-            .links a { 
-                color: #667eea; 
-                text-decoration: none; 
-                margin: 0 15px;
-                font-weight: 500;
-            }
-            .links a:hover { text-decoration: underline; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h2>✈️ FlightAware Tracker</h2>
-            <p>Track any flight in real-time</p>
-            <form action="/track" method="get">
-                <input type="text" name="flight_id" placeholder="Enter Flight ID (e.g. PK301-2025-10-21)" required>
-                <br>
-                <button type="submit">Track Flight</button>
-            </form>
-            <div class="links">
-                <a href="/all-flights">✈️ All Flights</a>
-                <a href="/api/statistics">📊 Statistics</a>
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
+    return render_template("home.html")
 
 
 @app.route("/track", methods=["GET"])
@@ -665,272 +2311,91 @@ def track_flight_web():
         return redirect("/")
 
     flight_id = flight_id.strip().upper()
-    api_url = f"http://127.0.0.1:5000/api/track/{flight_id}?full=true"
-    response = requests.get(api_url)
-
-    if response.status_code != 200:
-        return f"""
-        <html><head><title>Not Found</title></head>
-        <body style="font-family: Arial; text-align: center; padding: 50px;">
-            <h3>❌ No record found for flight <b>{flight_id}</b></h3>
-            <a href="/" style="color: #667eea;">← Go Back</a>
-        </body>
-        </html>
-        """
-
-    flight = response.json()
-    updates = flight.get("all_updates", [])
-    first_seen = flight.get("first_seen", "N/A")
-    last_seen = flight.get("last_seen", "N/A")
-    status = flight.get("status", "N/A")
-    source_airport = flight.get("source_airport", "N/A")
-    destination_airport = flight.get("destination_airport", "N/A")
-    callsign = flight.get("callsign", "N/A")
-    aircraft_type = flight.get("aircraft_type", "N/A")
-    tail_number = flight.get("tail_number", "N/A")
-
-    html_template = """
-    <html>
-    <head>
-        <title>Flight Info - {{ flight_id }}</title>
-        <style>
-            body { font-family: 'Segoe UI', sans-serif; background-color: #f0f2f5; padding: 40px; }
-            .card { background: white; border-radius: 15px; padding: 30px; box-shadow: 0 4px 20px rgba(0,0,0,0.1); max-width: 700px; margin: auto; }
-            h2 { color: #667eea; margin-bottom: 20px; }
-            .info { text-align: left; margin-top: 15px; }
-            .info p { margin: 10px 0; color: #333; }
-            .latest { background: linear-gradient(135deg, #e3f2fd 0%, #bbdefb 100%); padding: 20px; border-radius: 10px; margin-top: 20px; }
-            .latest h3 { color: #1976d2; margin-top: 0; }
-            button { padding: 12px 30px; background: linear-gradient(135deg, #28a745 0%, #20c997 100%); border: none; color: white; border-radius: 8px; cursor: pointer; margin-top: 20px; font-size: 16px; font-weight: bold; }
-            button:hover { transform: translateY(-2px); box-shadow: 0 5px 15px rgba(40,167,69,0.4); }
-            a { text-decoration: none; color: #667eea; font-weight: 500; }
-            a:hover { text-decoration: underline; }
-            .badge { display: inline-block; padding: 5px 12px; border-radius: 12px; font-size: 12px; font-weight: bold; margin-left: 10px; }
-            .badge.active { background: #d4edda; color: #155724; }
-            .badge.completed { background: #cce5ff; color: #004085; }
-        </style>
-    </head>
-    <body>
-        <div class="card">
-            <h2>✈️ Flight Information</h2>
-            <div class="info">
-                <p><b>Flight ID:</b> {{ flight_id }}</p>
-                <p><b>Callsign:</b> {{ callsign }}</p>
-                <p><b>Aircraft Type:</b> {{ aircraft_type }}</p>
-                <p><b>Tail Number:</b> {{ tail_number }}</p>
-                <p><b>Status:</b> {{ status }} 
-                    <span class="badge {{ status.lower() }}">{{ status.upper() }}</span>
-                </p>
-                <p><b>Source Airport:</b> {{ source_airport }}</p>
-                <p><b>Destination Airport:</b> {{ destination_airport }}</p>
-                <p><b>First Seen:</b> {{ first_seen }}</p>
-                <p><b>Last Seen:</b> {{ last_seen }}</p>
-                <p><b>Total Updates:</b> {{ updates|length }}</p>
-            </div>
-
-            {% if updates %}
-            <div class="latest">
-                <h3>📍 Latest Position</h3>
-                <p><b>Latitude:</b> {{ updates[-1].lat }}°</p>
-                <p><b>Longitude:</b> {{ updates[-1].lon }}°</p>
-                <p><b>Altitude:</b> {{ updates[-1].altitude_m }} m</p>
-                <p><b>Speed:</b> {{ updates[-1].spd_kts }} knots</p>
-                <p><b>Heading:</b> {{ updates[-1].heading }}°</p>
-                <p><b>Receiver:</b> {{ updates[-1].receiver_id or 'N/A' }}</p>
-                <p><b>Time:</b> {{ updates[-1].ts }}</p>
-            </div>
-            {% endif %}
-
-            <form action="/map/{{ flight_id }}" method="get">
-                <button type="submit">🗺️ VIEW ON MAP</button>
-            </form>
-            <p style="margin-top: 20px;">
-                <a href="/">← Track another flight</a> | 
-                <a href="/api/track/{{ flight_id }}" target="_blank">View JSON</a>
-            </p>
-        </div>
-    </body>
-    </html>
-    """
-
-    return render_template_string(html_template,
-                                  flight_id=flight_id,
-                                  callsign=callsign,
-                                  aircraft_type=aircraft_type,
-                                  tail_number=tail_number,
-                                  status=status,
-                                  source_airport=source_airport,
-                                  destination_airport=destination_airport,
-                                  first_seen=first_seen,
-                                  last_seen=last_seen,
-                                  updates=updates)
-
+    # Summary and latest position only; the map page loads the track itself
+    flight, source = find_flight(flight_id, expand=False)
+    if not flight:
+        return render_template("flight_not_found.html", message="No record found for flight", flight_id=flight_id), 404
 
+    return render_template("flight.html", flight=build_track_response(flight, source, {}))
 
 
 @app.route("/map/<flight_id>")
 def show_map(flight_id):
-    db = mongo.db
-    flight = db.flight_updates.find_one({"flight_id": flight_id}) or db.flight_logs.find_one({"flight_id": flight_id})
+    flight, source = find_flight(flight_id, expand=False)
     if not flight:
-        return f"<h3>❌ No record found for flight {flight_id}</h3>"
-
-    updates = flight.get("updates", [])
-    if not updates:
-        return f"<h3>❌ No updates available for flight {flight_id}</h3>"
-
-    start_lat = updates[0]['lat']
-    start_lon = updates[0]['lon']
-    callsign = flight.get('callsign', 'N/A')
-    source_airport = flight.get('source_airport', 'N/A')
-    dest_airport = flight.get('destination_airport', 'N/A')
-
-    return f"""
-    <html>
-    <head>
-        <title>Flight Path - {flight_id}</title>
-        <link rel="stylesheet" href="https://unpkg.com/leaflet/dist/leaflet.css" />
-        <script src="https://unpkg.com/leaflet/dist/leaflet.js"></script>
-        <style>
-            body {{ margin: 0; padding: 0; font-family: 'Segoe UI', sans-serif; }}
-            h3 {{ text-align: center; color: #333; margin: 10px 0; }}
-            #map {{ width: 100%; height: 90vh; }}
-            a {{ text-decoration: none; color: #667eea; font-weight: 500; }}
-            a:hover {{ text-decoration: underline; }}
-        </style>
-    </head>
-    <body>
-        <h3>🗺️ Flight Path for {flight_id} ({callsign}) 🗺️</h3>
-        <p style="text-align: center;">
-            Source: {source_airport} | Destination: {dest_airport} <br>
-            <a href="/track?flight_id={flight_id}">← Back to Flight Info</a>
-        </p>
-        <div id="map"></div>
-
-        <script>
-        let map = L.map('map').setView([{start_lat}, {start_lon}], 6);
-        L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{ maxZoom: 19 }}).addTo(map);
-
-        let flightPath = L.polyline([], {{color: 'blue', weight: 4}}).addTo(map);
-        let markers = [];
-
-        async function fetchUpdates() {{
-            let res = await fetch('/api/track/{flight_id}?full=true');
-            let data = await res.json();
-            if (!data.all_updates) return;
-
-            flightPath.setLatLngs([]);
-            markers.forEach(m => map.removeLayer(m));
-            markers = [];
-
-            let updates = data.all_updates;
-            let minAlt = Math.min(...updates.map(u => u.altitude_m));
-            let maxAlt = Math.max(...updates.map(u => u.altitude_m));
-
-            for (let i = 0; i < updates.length; i++) {{
-                let u = updates[i];
-                let tsVal = u.ts ? new Date(u.ts).toLocaleString() : "N/A";
-
-                if (i > 0) {{
-                    let ratio = (u.altitude_m - minAlt) / (maxAlt - minAlt + 0.001);
-                    let color = ratio < 0.5 
-                        ? 'rgb(' + Math.floor(255*ratio*2) + ',255,0)'
-                        : 'rgb(255,' + Math.floor(255*(1-(ratio-0.5)*2)) + ',0)';
-                    L.polyline([[updates[i-1].lat, updates[i-1].lon],[u.lat,u.lon]], {{color: color, weight:4}}).addTo(map);
-                }}
-
-                let markerColor = i == 0 ? 'green' : (i == updates.length-1 ? 'red' : 'blue');
-                let marker = L.circleMarker([u.lat,u.lon], {{
-                    radius: 5,
-                    color: markerColor,
-                    fillColor: markerColor,
-                    fillOpacity: 0.8
-                }}).bindPopup(
-                    "<b>Time:</b> " + tsVal +
-                    "<br><b>Alt:</b> " + u.altitude_m + " m" +
-                    "<br><b>Speed:</b> " + u.spd_kts + " kt" +
-                    "<br><b>Receiver:</b> " + (u.receiver_id || "N/A")
-                );
-                marker.addTo(map);
-                markers.push(marker);
-
-                flightPath.addLatLng([u.lat,u.lon]);
-            }}
-        }}
-
-        setInterval(fetchUpdates, 5000);
-        fetchUpdates();
-        </script>
-    </body>
-    </html>
-    """
+        return render_template("flight_not_found.html", message="No record found for flight", flight_id=flight_id), 404
+
+    # Only the first point is needed to centre the map
+    if flight.get('track'):
+        track = Track.from_codec(flight['track'])
+        start = track.point(0) if len(track) else None
+    else:
+        updates = flight.get("updates") or []
+        start = updates[0] if updates else None
+    if not start:
+        return render_template("flight_not_found.html", message="No updates available for flight", flight_id=flight_id), 404
+
+    page = render_template("map.html",
+                           flight_id=flight_id,
+                           source=source,
+                           start=start,
+                           callsign=flight.get('callsign'),
+                           source_airport=flight.get('source_airport'),
+                           destination_airport=flight.get('destination_airport'))
+
+    response = Response(page, mimetype="text/html")
+    if source == "archived":
+        # Strong ETag over the page itself, so a revalidation is a 304
+        response.add_etag()
+        response.headers["Cache-Control"] = "public, max-age=3600"
+        return response.make_conditional(request)
+    return response
+
+
+ALL_FLIGHTS_PAGE_SIZE = 25
+MAX_ALL_FLIGHTS_PAGE_SIZE = 100
+# Listing rows never carry updates or encoded tracks
+LISTING_PROJECTION = {**SEARCH_PROJECTION, "total_distance_km": 1}
 
 
 @app.route("/all-flights")
 def all_flights_web():
-    # Call the API instead of querying MongoDB directly
-    api_url = "http://127.0.0.1:5000/api/flights"
-    response = requests.get(api_url)
-    data = response.json()
-
-    active = data.get("active_flights", [])
-    archived = data.get("archived_flights", [])
-
-    html_template = """
-    <html>
-    <head>
-        <title>All Flights</title>
-        <style>
-            body { font-family: Arial; padding: 40px; background: #f0f2f5; }
-            .container { max-width: 1000px; margin: auto; }
-            h2 { color: #667eea; }
-            table { width: 100%; background: white; border-radius: 10px; overflow: hidden; margin: 20px 0; }
-            th { background: #667eea; color: white; padding: 15px; text-align: left; }
-            td { padding: 12px 15px; border-bottom: 1px solid #eee; }
-            tr:hover { background: #f8f9fa; }
-            a { color: #667eea; text-decoration: none; font-weight: bold; }
-            a:hover { text-decoration: underline; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h2>✈️ Active Flights</h2>
-            <table>
-                <tr><th>Flight ID</th><th>Callsign</th><th>Aircraft</th><th>Status</th><th>Last Seen</th><th>Actions</th></tr>
-                {% for f in active %}
-                <tr>
-                    <td>{{ f.flight_id }}</td>
-                    <td>{{ f.callsign }}</td>
-                    <td>{{ f.aircraft_type }}</td>
-                    <td>{{ f.status }}</td>
-                    <td>{{ f.last_seen }}</td>
-                    <td><a href="/track?flight_id={{ f.flight_id }}">Track</a></td>
-                </tr>
-                {% endfor %}
-            </table>
-
-            <h2>📦 Archived Flights</h2>
-            <table>
-                <tr><th>Flight ID</th><th>Callsign</th><th>Aircraft</th><th>Status</th><th>Last Seen</th><th>Actions</th></tr>
-                {% for f in archived %}
-                <tr>
-                    <td>{{ f.flight_id }}</td>
-                    <td>{{ f.callsign }}</td>
-                    <td>{{ f.aircraft_type }}</td>
-                    <td>{{ f.status }}</td>
-                    <td>{{ f.last_seen }}</td>
-                    <td><a href="/track?flight_id={{ f.flight_id }}">View</a></td>
-                </tr>
-                {% endfor %}
-            </table>
-            <p><a href="/">← Back to Home</a></p>
-        </div>
-    </body>
-    </html>
-    """
-
-    return render_template_string(html_template, active=active, archived=archived)
+    # One page of one collection, newest first on the indexed page sorts.
+    # Pages are keyset cursors (before, before_id), not offsets, so page 1000
+    # costs the same as page 1. Details for a row are fetched from /api/track
+    # when it is expanded
+    status = request.args.get('status', 'active')
+    if status not in ('active', 'completed'):
+        status = 'active'
+    limit = min(max(1, request.args.get('limit', ALL_FLIGHTS_PAGE_SIZE, type=int)), MAX_ALL_FLIGHTS_PAGE_SIZE)
+    before, before_id = request.args.get('before'), request.args.get('before_id')
+    cursor = (before, before_id) if before and before_id else None
+
+    db = mongo.db
+    if status == 'active':
+        collection, sort = db.flight_updates, ACTIVE_PAGE_SORT
+    else:
+        collection, sort = db.flight_logs, ARCHIVED_PAGE_SORT
+
+    # One extra row tells whether there is a next page without counting
+    flights = list(collection.find(page_after(sort, cursor), LISTING_PROJECTION).sort(sort).limit(limit + 1))
+
+    return render_template("all_flights.html",
+                           flights=flights[:limit],
+                           status=status,
+                           limit=limit,
+                           cursor=cursor,
+                           next_cursor=next_page_cursor(flights, sort, limit),
+                           active_total=db.flight_updates.estimated_document_count(),
+                           archived_total=db.flight_logs.estimated_document_count())
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    # Development server only; see DEPLOYMENT.md for running under gunicorn
+    with app.app_context():
+        try:
+            init_indexes()
+        except Exception as e:
+            print(f"⚠️ Index initialization warning: {e}")
+
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1")
@@ -0,0 +1,223 @@
+import json
+import os
+import uuid
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+
+# Cold tier for flight_logs. Flights older than the retention window are
+# written to Arrow IPC files partitioned by completion day and route:
+#
+#   <TIER_DIR>/date=2025-01-01/route=LHE-DXB/part-<id>.arrow
+#
+# Tracks keep their compact columnar encoding as a binary column. Files are
+# opened through memory maps, so analytics only touch the columns they read.
+# A small pointer document per flight in Mongo (flight_log_tier) maps a
+# flight_id to its file and row for /api/track lookups.
+
+TIER_DIR = os.environ.get("FLIGHTAWARE_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive_tier"))
+BATCH_SIZE = 1000
+
+METADATA_FIELDS = (
+    "flight_id", "callsign", "aircraft_type", "tail_number", "status",
+    "source_airport", "destination_airport", "first_seen", "last_seen", "completed_at",
+)
+
+
+def available():
+    return pa is not None
+
+
+def _schema():
+    fields = [pa.field(name, pa.string()) for name in METADATA_FIELDS]
+    fields += [
+        pa.field("total_distance_km", pa.float64()),
+        pa.field("duration_hours", pa.float64()),
+        pa.field("track_encoding", pa.string()),
+        pa.field("track_count", pa.int64()),
+        pa.field("track_receivers", pa.list_(pa.string())),
+        pa.field("track_data", pa.binary()),
+        # Only for the rare tracks that could not be encoded
+        pa.field("updates_json", pa.string()),
+    ]
+    return pa.schema(fields)
+
+
+def _duration_hours(flight):
+    try:
+        first = datetime.fromisoformat(flight['first_seen'].replace('Z', '+00:00'))
+        last = datetime.fromisoformat(flight['last_seen'].replace('Z', '+00:00'))
+        return (last - first).total_seconds() / 3600
+    except Exception:
+        return None
+
+
+def _partition(flight):
+    day = (flight.get('completed_at') or "unknown")[:10]
+    route = f"{flight.get('source_airport') or 'UNK'}-{flight.get('destination_airport') or 'UNK'}"
+    return os.path.join(TIER_DIR, f"date={day}", f"route={route.replace(os.sep, '_')}")
+
+
+def _row(flight):
+    row = {name: flight.get(name) for name in METADATA_FIELDS}
+    row["total_distance_km"] = flight.get('total_distance_km')
+    row["duration_hours"] = _duration_hours(flight)
+    track = flight.get('track')
+    if track:
+        row.update({
+            "track_encoding": track["encoding"],
+            "track_count": track["count"],
+            "track_receivers": track["receivers"],
+            "track_data": bytes(track["data"]),
+            "updates_json": None,
+        })
+    else:
+        row.update({
+            "track_encoding": None,
+            "track_count": len(flight.get('updates', [])),
+            "track_receivers": None,
+            "track_data": None,
+            "updates_json": json.dumps(flight.get('updates', []), default=str),
+        })
+    return row
+
+
+def _write_partition(directory, flights):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{uuid.uuid4().hex[:12]}.arrow")
+    table = pa.Table.from_pylist([_row(flight) for flight in flights], schema=_schema())
+
+    # Write to a temporary name first so readers never see a partial file
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+
+def tier_flights(db, cutoff_iso):
+    moved = 0
+    while True:
+        flights = list(
+            db.flight_logs.find({"completed_at": {"$lt": cutoff_iso}}).sort("completed_at", 1).limit(BATCH_SIZE)
+        )
+        if not flights:
+            break
+
+        partitions = {}
+        for flight in flights:
+            partitions.setdefault(_partition(flight), []).append(flight)
+
+        for directory, group in partitions.items():
+            path = _write_partition(directory, group)
+            relative = os.path.relpath(path, TIER_DIR)
+            db.flight_log_tier.insert_many([
+                {
+                    "flight_id": flight['flight_id'],
+                    "callsign": flight.get('callsign'),
+                    "tail_number": flight.get('tail_number'),
+                    "source_airport": flight.get('source_airport'),
+                    "destination_airport": flight.get('destination_airport'),
+                    "completed_at": flight.get('completed_at'),
+                    "path": relative,
+                    "row": row,
+                }
+                for row, flight in enumerate(group)
+            ])
+            db.flight_logs.delete_many({"_id": {"$in": [flight['_id'] for flight in group]}})
+            moved += len(group)
+
+    return moved
+
+
+def _open(relative_path):
+    source = pa.memory_map(os.path.join(TIER_DIR, relative_path), "r")
+    return ipc.open_file(source).read_all()
+
+
+def read_flight(pointer):
+    # Returns the archived flight document, track still encoded
+    table = _open(pointer["path"]).slice(pointer["row"], 1)
+    return _flight(table.to_pylist()[0])
+
+
+def _flight(row):
+    flight = {name: row[name] for name in METADATA_FIELDS}
+    flight["total_distance_km"] = row["total_distance_km"]
+    if row["track_data"] is not None:
+        flight["track"] = {
+            "encoding": row["track_encoding"],
+            "count": row["track_count"],
+            "receivers": row["track_receivers"],
+            "data": row["track_data"],
+        }
+    else:
+        flight["updates"] = json.loads(row["updates_json"] or "[]")
+    return flight
+
+
+def iter_files():
+    if not os.path.isdir(TIER_DIR):
+        return
+    for root, _, files in os.walk(TIER_DIR):
+        for name in sorted(files):
+            if name.endswith(".arrow"):
+                yield os.path.relpath(os.path.join(root, name), TIER_DIR)
+
+
+def scan(columns):
+    # Yields one memory-mapped table per file with just the requested columns
+    for relative_path in iter_files():
+        yield _open(relative_path).select(columns)
+
+
+def iter_flights(start=None, end=None, airport=None, aircraft_type=None, batch_size=BATCH_SIZE):
+    # Tiered flights matching the export filters, one record batch in memory
+    # at a time; time bounds keep flights overlapping [start, end]
+    for relative_path in iter_files():
+        for batch in _open(relative_path).to_batches(max_chunksize=batch_size):
+            conditions = []
+            if start:
+                conditions.append(pc.greater_equal(batch.column("last_seen"), start))
+            if end:
+                conditions.append(pc.less_equal(batch.column("first_seen"), end))
+            if airport:
+                conditions.append(pc.or_(
+                    pc.equal(batch.column("source_airport"), airport),
+                    pc.equal(batch.column("destination_airport"), airport),
+                ))
+            if aircraft_type:
+                conditions.append(pc.equal(batch.column("aircraft_type"), aircraft_type))
+            if conditions:
+                mask = conditions[0]
+                for condition in conditions[1:]:
+                    mask = pc.and_(mask, condition)
+                batch = batch.filter(mask)
+            for row in batch.to_pylist():
+                yield _flight(row)
+
+
+def summary():
+    flights = 0
+    duration_sum = 0.0
+    duration_count = 0
+    distance_sum = 0.0
+    for table in scan(["duration_hours", "total_distance_km"]):
+        flights += table.num_rows
+        durations = table.column("duration_hours")
+        duration_sum += pc.sum(durations).as_py() or 0.0
+        duration_count += table.num_rows - durations.null_count
+        distance_sum += pc.sum(table.column("total_distance_km")).as_py() or 0.0
+    return {
+        "flights": flights,
+        "duration_sum_hours": duration_sum,
+        "duration_count": duration_count,
+        "distance_sum_km": distance_sum,
+    }
@@ -0,0 +1,384 @@
+import asyncio
+import math
+import os
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
+from quart import Quart, Response, g, jsonify, request
+
+import admission
+import archive_tier
+import dedup
+import metrics
+import rollups
+import track_codec
+from app import (
+    ACTIVE_PAGE_SORT,
+    ARCHIVED_PAGE_SORT,
+    CAPTURE_KINDS,
+    FENCE_REFRESH_SECONDS,
+    IMMUTABLE_CACHE_CONTROL,
+    MAX_LIST_OFFSET,
+    MISSING_FLIGHT_INDEX,
+    archived_etag,
+    archived_responses,
+    build_flight_update,
+    build_new_flight,
+    build_update_entry,
+    detector,
+    duplicate_ack,
+    fences,
+    filter_nearby,
+    geofence_crossings,
+    has_unique_flight_index,
+    ingest_capture,
+    is_latest_report,
+    nearby_query,
+    next_page_cursor,
+    normalize_report,
+    page_after,
+    prepare_archived_flight,
+    recent_reports,
+    request_cursor,
+    should_archive_flight,
+    track_payload,
+    track_position,
+    utc_timestamp,
+    validate_flight_data,
+    write_capture,
+)
+
+
+# Async serving mode for the I/O-bound endpoints. Handlers and response
+# bodies match app.py; only the driver and the event loop differ. Track
+# decoding, cold-tier reads, archival encoding and simplification block, so
+# they run in the loop's default executor.
+app = Quart(__name__)
+app.config["MONGO_URI"] = os.environ.get("FLIGHTAWARE_MONGO_URI", "mongodb://localhost:27017/flightaware_db")
+app.config["MONGO_MAX_POOL_SIZE"] = int(os.environ.get("FLIGHTAWARE_MONGO_MAX_POOL_SIZE", 100))
+
+client = None
+db = None
+
+
+@app.before_serving
+async def open_mongo():
+    global client, db
+    # Created inside the serving loop so the client binds to it, once per worker
+    client = AsyncIOMotorClient(
+        app.config["MONGO_URI"],
+        maxPoolSize=app.config["MONGO_MAX_POOL_SIZE"],
+        event_listeners=[metrics.MongoCommandListener()]
+    )
+    db = client.get_default_database()
+
+
+@app.before_serving
+async def require_flight_index():
+    # Ingest here relies on DuplicateKeyError from the unique index; refuse
+    # to start rather than store duplicate flights
+    if not has_unique_flight_index(await db.flight_updates.index_information()):
+        raise RuntimeError(MISSING_FLIGHT_INDEX)
+
+
+@app.after_serving
+async def close_mongo():
+    if client is not None:
+        client.close()
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+async def record_request_latency(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUEST_LATENCY.observe(
+        time.perf_counter() - g.request_started,
+        method=request.method, route=route, status=response.status_code
+    )
+    return response
+
+
+@app.before_request
+async def capture_ingest():
+    # Same capture file format as app.py; ahead of admission, as there
+    kind = CAPTURE_KINDS.get(request.endpoint)
+    if ingest_capture is not None and kind is not None:
+        await run_blocking(write_capture, ingest_capture.write, kind, await request.get_data())
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def current_fences():
+    # No change feed runs here, so fences are reloaded on age alone
+    if fences.is_stale(FENCE_REFRESH_SECONDS):
+        fences.load(await db.geofences.find().to_list(None))
+    return fences
+
+
+async def record_geofence_events(events):
+    # Change-feed subscribers live in the sync workers, so nothing is published
+    if events:
+        await db.geofence_events.insert_many(events, ordered=False)
+
+
+async def check_and_archive_flight(flight_id):
+    flight = await db.flight_updates.find_one({"flight_id": flight_id})
+
+    if not flight:
+        return False
+
+    # Only landing flights need the destination airport, as in app.py
+    dest_airport = {}
+    updates = flight.get('updates', [])
+    dest = flight.get('destination_airport')
+    if dest and updates and updates[-1].get('altitude_m', 0) < 100 and updates[-1].get('spd_kts', 0) < 50:
+        dest_airport = await db.airports.find_one({"code": dest}) or {}
+
+    if should_archive_flight(flight, dest_airport=dest_airport):
+        await run_blocking(prepare_archived_flight, flight)
+        await db.flight_logs.insert_one(flight)
+        await db.flight_updates.delete_one({"flight_id": flight_id})
+        detector.remove(flight_id)
+        for collection, op in rollups.rollup_updates(flight):
+            await db[collection].bulk_write([op])
+        print(f"✅ Archived flight: {flight_id}")
+        return True
+
+    return False
+
+
+def throttled_response(message, retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    return jsonify({"error": message, "retry_after": seconds}), 429, {"Retry-After": str(seconds)}
+
+
+@app.route("/api/ingest", methods=["POST"])
+async def ingest_flight_data():
+    try:
+        # Same token buckets as app.py; one event loop needs no thread pools
+        retry_after = admission.check_client(request.remote_addr)
+        if retry_after:
+            return throttled_response("Too many ingest requests from this client", retry_after)
+
+        data = await request.get_json()
+
+        is_valid, errors = validate_flight_data(data)
+        if not is_valid:
+            return jsonify({"error": "Validation failed", "details": errors}), 400
+
+        limited = admission.check_receivers([data])
+        if limited:
+            return throttled_response(f"Receiver {limited[0]} is over its report rate", limited[1])
+
+        normalize_report(data)
+        flight_id = data['flight_id']
+        key = dedup.event_key(data)
+        if recent_reports.check_and_add(flight_id, key):
+            dedup.record("duplicate", "memory")
+            return jsonify(duplicate_ack(flight_id)), 200
+
+        try:
+            timestamp = utc_timestamp()
+            update_entry = build_update_entry(data, timestamp)
+
+            existing_flight = await db.flight_updates.find_one({"flight_id": flight_id})
+            fence_index = await current_fences()
+
+            message = None
+            fence_events = []
+            if not existing_flight:
+                new_flight = build_new_flight(data, update_entry['ts'], update_entry)
+                new_flight['geofences'], fence_events = geofence_crossings(data, [update_entry], [], fence_index)
+                try:
+                    await db.flight_updates.insert_one(new_flight)
+                    message = "New flight tracked"
+                except DuplicateKeyError:
+                    existing_flight = await db.flight_updates.find_one({"flight_id": flight_id})
+
+            if message is None:
+                update = build_flight_update(data, timestamp, update_entry, existing_flight)
+                fence_events = []
+                if is_latest_report(update_entry, existing_flight):
+                    update["$set"]["geofences"], fence_events = geofence_crossings(
+                        data, [update_entry], existing_flight.get('geofences', []), fence_index
+                    )
+                result = await db.flight_updates.update_one(dedup.guard_filter(flight_id, key), update)
+                if result.matched_count == 0:
+                    dedup.record("duplicate", "server")
+                    return jsonify(duplicate_ack(flight_id)), 200
+                message = "Flight data updated"
+        except Exception:
+            recent_reports.forget(flight_id, key)
+            dedup.record("failed")
+            raise
+
+        dedup.record("written")
+        track_position(data, update_entry)
+        await record_geofence_events(fence_events)
+        await check_and_archive_flight(flight_id)
+
+        return jsonify({
+            "success": True,
+            "message": message,
+            "flight_id": flight_id,
+            "timestamp": update_entry['ts'],
+            "received_at": timestamp
+        }), 201
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+async def archived_version(flight_id):
+    # Same lookups as app.archived_version
+    doc = await db.flight_logs.find_one({"flight_id": flight_id}, {"_id": 0, "completed_at": 1})
+    if not doc and archive_tier.available():
+        doc = await db.flight_log_tier.find_one({"flight_id": flight_id}, {"_id": 0, "completed_at": 1})
+    return (doc.get("completed_at") or "archived") if doc else None
+
+
+async def find_archived_flight(flight_id, expand=True):
+    flight = await db.flight_logs.find_one({"flight_id": flight_id})
+    if not flight and archive_tier.available():
+        pointer = await db.flight_log_tier.find_one({"flight_id": flight_id})
+        if pointer:
+            flight = await run_blocking(archive_tier.read_flight, pointer)
+
+    if flight and expand:
+        flight = await run_blocking(track_codec.expand_flight, flight)
+    return flight
+
+
+async def archived_track_body(flight_id):
+    flight = await find_archived_flight(flight_id, expand=request.args.get('full') == 'true')
+    if not flight:
+        return 404, {"error": f"Flight {flight_id} not found"}
+    return await run_blocking(track_payload, flight, "archived", request.args)
+
+
+@app.route("/api/track/<flight_id>", methods=["GET"])
+async def track_flight_api(flight_id):
+    try:
+        # As in app.py: one lookup for an active flight
+        flight = await db.flight_updates.find_one({"flight_id": flight_id})
+        version = None if flight else await archived_version(flight_id)
+        if version is None:
+            if flight:
+                status, payload = await run_blocking(track_payload, flight, "active", request.args)
+            else:
+                status, payload = 404, {"error": f"Flight {flight_id} not found"}
+            response = jsonify(payload)
+            response.status_code = status
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        # Same ETags and body cache as app.py, so either mode answers a
+        # revalidation with 304
+        etag = archived_etag(flight_id, version, request.args)
+        if request.if_none_match.contains(etag):
+            response = Response(b"", status=304)
+        else:
+            body = archived_responses.get((flight_id, etag))
+            if body is None:
+                status, payload = await archived_track_body(flight_id)
+                if status != 200:
+                    return jsonify(payload), status
+                body = app.json.dumps(payload).encode()
+                archived_responses.set((flight_id, etag), body)
+            response = Response(body, mimetype="application/json")
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def expand_flights(flights):
+    return [track_codec.expand_flight(f) for f in flights]
+
+
+async def flight_page(collection, sort, cursor, offset, limit):
+    flights = await collection.find(page_after(sort, cursor), {'_id': 0}).sort(sort).skip(offset).limit(limit + 1).to_list(None)
+    return flights[:limit], next_page_cursor(flights, sort, limit)
+
+
+@app.route("/api/flights", methods=["GET"])
+async def list_flights():
+    try:
+        status_filter = request.args.get('status', 'all')
+        limit = max(1, request.args.get('limit', 100, type=int))
+        offset = request.args.get('offset', 0, type=int)
+        if not 0 <= offset <= MAX_LIST_OFFSET:
+            return jsonify({"error": f"offset must be between 0 and {MAX_LIST_OFFSET}; page on with before/before_id"}), 400
+
+        if status_filter == 'active':
+            flights, next_cursor = await flight_page(db.flight_updates, ACTIVE_PAGE_SORT, request_cursor(request.args), offset, limit)
+            return jsonify({"flights": flights, "count": len(flights), "next_cursor": next_cursor}), 200
+        elif status_filter == 'completed':
+            flights, next_cursor = await flight_page(db.flight_logs, ARCHIVED_PAGE_SORT, request_cursor(request.args), offset, limit)
+            flights = await run_blocking(expand_flights, flights)
+            return jsonify({"flights": flights, "count": len(flights), "next_cursor": next_cursor}), 200
+        else:
+            active, active_next = await flight_page(
+                db.flight_updates, ACTIVE_PAGE_SORT, request_cursor(request.args, "active_"), offset, limit)
+            archived, archived_next = await flight_page(
+                db.flight_logs, ARCHIVED_PAGE_SORT, request_cursor(request.args, "archived_"), offset, limit)
+            archived = await run_blocking(expand_flights, archived)
+            return jsonify({
+                "active_flights": active,
+                "archived_flights": archived,
+                "total": len(active) + len(archived),
+                "active_next_cursor": active_next,
+                "archived_next_cursor": archived_next
+            }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/flights/active", methods=["GET"])
+async def active_flights():
+    try:
+        flights = await db.flight_updates.find({}, {'_id': 0}).to_list(None)
+        return jsonify({"active_flights": flights, "count": len(flights)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/flights/nearby", methods=["GET"])
+async def nearby_flights():
+    try:
+        lat = float(request.args.get('lat'))
+        lon = float(request.args.get('lon'))
+        radius_km = float(request.args.get('radius_km', 100))
+
+        flights = await db.flight_updates.find(nearby_query(lat, lon, radius_km), {'_id': 0}).to_list(None)
+        nearby = filter_nearby(flights, lat, lon, radius_km)
+
+        return jsonify({
+            "location": {"lat": lat, "lon": lon},
+            "radius_km": radius_km,
+            "flights": nearby,
+            "count": len(nearby)
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+if __name__ == "__main__":
+    app.run(port=int(os.environ.get("PORT", 5001)))
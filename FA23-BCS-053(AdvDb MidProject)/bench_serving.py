@@ -0,0 +1,133 @@
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+AIRPORTS = {
+    "LHE": (31.5216, 74.4036),
+    "ISB": (33.6217, 73.0551),
+    "KHI": (24.9060, 67.1600),
+    "DXB": (25.2532, 55.3657),
+}
+
+
+def make_report(flight_id, receiver_id):
+    lat, lon = random.choice(list(AIRPORTS.values()))
+    return {
+        "flight_id": flight_id,
+        "callsign": flight_id.split("-")[0],
+        "lat": round(lat + random.uniform(-2, 2), 4),
+        "lon": round(lon + random.uniform(-2, 2), 4),
+        "altitude_m": random.randint(8000, 12000),
+        "spd_kts": random.randint(400, 550),
+        "heading": round(random.uniform(0, 359), 1),
+        "vertical_rate": 0,
+        "receiver_id": receiver_id,
+        "source": "LHE",
+        "destination": "DXB",
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(base_url, requests_total, concurrency, read_ratio, flights, receivers):
+    flight_ids = [f"BENCH{n:04d}-2025-01-01" for n in range(flights)]
+    # Each flight is heard by one receiver, as with real ground stations
+    receiver_ids = {flight_id: f"R-BENCH-{n % receivers + 1:03d}" for n, flight_id in enumerate(flight_ids)}
+    latencies = {"ingest": [], "track": [], "nearby": [], "list": []}
+    # 429s are fast refusals, not served requests; they are counted apart
+    # and kept out of the throughput and latency figures
+    throttled = {kind: 0 for kind in latencies}
+    errors = [0]
+    lock = threading.Lock()
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def one(i):
+        flight_id = flight_ids[i % len(flight_ids)]
+        roll = random.random()
+        if roll >= read_ratio:
+            kind = "ingest"
+            call = lambda: session().post(f"{base_url}/api/ingest", json=make_report(flight_id, receiver_ids[flight_id]),
+                                          timeout=30)
+        elif roll < read_ratio * 0.5:
+            kind = "track"
+            call = lambda: session().get(f"{base_url}/api/track/{flight_id}", timeout=30)
+        elif roll < read_ratio * 0.8:
+            kind = "nearby"
+            call = lambda: session().get(f"{base_url}/api/flights/nearby",
+                                         params={"lat": 31.5, "lon": 74.4, "radius_km": 300}, timeout=30)
+        else:
+            kind = "list"
+            call = lambda: session().get(f"{base_url}/api/flights", params={"status": "active", "limit": 20}, timeout=30)
+
+        started = time.perf_counter()
+        try:
+            status = call().status_code
+        except requests.exceptions.RequestException:
+            status = None
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            if status == 429:
+                throttled[kind] += 1
+            elif status is None or status >= 500:
+                errors[0] += 1
+            else:
+                latencies[kind].append(elapsed)
+
+    # Seed every flight once so reads hit real documents
+    for flight_id in flight_ids:
+        requests.post(f"{base_url}/api/ingest", json=make_report(flight_id, receiver_ids[flight_id]), timeout=30)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests_total)))
+    wall = time.perf_counter() - started
+
+    print("=" * 60)
+    print(f"📊 {base_url}  concurrency={concurrency}  requests={requests_total}")
+    print("=" * 60)
+    served = sum(len(values) for values in latencies.values())
+    print(f"   Throughput: {served / wall:.1f} req/s served  ({wall:.2f}s wall, "
+          f"{sum(throttled.values())} throttled, {errors[0]} errors)")
+    for kind, values in latencies.items():
+        if values or throttled[kind]:
+            print(f"   {kind:<7} n={len(values):<6} p50={percentile(values, 50) * 1000:7.1f}ms "
+                  f"p99={percentile(values, 99) * 1000:7.1f}ms  429s={throttled[kind]}")
+    if any(throttled.values()):
+        print("   ⚠️ Admission control refused requests; see DEPLOYMENT.md to lift the limits for a benchmark")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync (gunicorn) and async (hypercorn) serving modes")
+    parser.add_argument("base_urls", nargs="+", help="e.g. http://127.0.0.1:5000 http://127.0.0.1:5001")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--read-ratio", type=float, default=0.7)
+    parser.add_argument("--flights", type=int, default=200)
+    parser.add_argument("--receivers", type=int, default=20, help="receiver_ids the flights are spread over")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for base_url in args.base_urls:
+        random.seed(args.seed)
+        run(base_url.rstrip("/"), args.requests, args.concurrency, args.read_ratio, args.flights, args.receivers)
+
+
+if __name__ == "__main__":
+    main()
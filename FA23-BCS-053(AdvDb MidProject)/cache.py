@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class LRUCache:
+
+    def __init__(self, name, max_entries=1000, ttl_seconds=None, max_bytes=None, size_of=len):
+        self.name = name
+        self.max_entries = max_entries
+        # Entries older than ttl_seconds are treated as missing
+        self.ttl_seconds = ttl_seconds
+        # With max_bytes, eviction also keeps the total size_of(value) under
+        # the limit; the default suits bytes/str values
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.CACHE_ENTRIES.set_function(self.__len__, cache=name)
+        if max_bytes:
+            metrics.CACHE_BYTES.set_function(lambda: self.bytes, cache=name)
+
+    def __len__(self):
+        return len(self._data)
+
+    def _drop(self, key):
+        _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        value = None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires, _ = entry
+                if expires is not None and time.monotonic() > expires:
+                    self._drop(key)
+                    value = None
+                else:
+                    self._data.move_to_end(key)
+        metrics.record_cache(self.name, value is not None)
+        return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        size = self.size_of(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, expires, size)
+            self.bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+
+    def invalidate(self, match):
+        # match(key) -> True for keys to drop
+        with self._lock:
+            for key in [key for key in self._data if match(key)]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
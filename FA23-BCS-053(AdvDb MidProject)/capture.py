@@ -0,0 +1,101 @@
+import heapq
+import json
+import os
+import struct
+import threading
+import time
+
+
+# Append-only capture of ingest traffic for replay_feed.py. Each record is a
+# fixed header followed by the payload:
+#
+#   <d  arrival time, epoch seconds
+#   B   kind (KIND_SINGLE, KIND_BATCH or KIND_REPORTS)
+#   I   payload length
+#
+# Single and batch payloads are the request bodies as received. Binary ingest
+# is streamed, so its reports are captured after decoding, as a JSON list.
+# Each worker process appends to its own file, <path>.<pid>, so a record that
+# needs more than one write() can never be split by another worker's record.
+# A write that fails part way is cut back off the file before the error is
+# raised, leaving only whole records behind. read_all merges the per-worker
+# files back into arrival order.
+
+HEADER = struct.Struct("<dBI")
+KIND_SINGLE = 0
+KIND_BATCH = 1
+KIND_REPORTS = 2
+KINDS = {KIND_SINGLE: "single", KIND_BATCH: "batch", KIND_REPORTS: "reports"}
+MAX_PAYLOAD_BYTES = 0xFFFFFFFF
+
+
+class CaptureWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _descriptor(self):
+        # Reopened after a fork so each worker writes its own file
+        if self._fd is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._fd = os.open(f"{self.path}.{self._pid}", os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def write(self, kind, payload, at=None):
+        if len(payload) > MAX_PAYLOAD_BYTES:
+            return
+        record = memoryview(HEADER.pack(time.time() if at is None else at, kind, len(payload)) + payload)
+        with self._lock:
+            fd = self._descriptor()
+            start = os.lseek(fd, 0, os.SEEK_END)
+            try:
+                # No other process writes this file, so a short write is
+                # simply continued
+                while record:
+                    record = record[os.write(fd, record):]
+            except OSError:
+                os.ftruncate(fd, start)
+                raise
+
+    def write_reports(self, reports, at=None):
+        self.write(KIND_REPORTS, json.dumps(reports, default=str).encode(), at)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = None
+
+
+def read(path):
+    # Yields (arrival time, kind, payload bytes); a torn final record from a
+    # crash mid-write is ignored
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            at, kind, length = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield at, kind, payload
+
+
+def read_all(paths):
+    # Records from several per-worker files in arrival order
+    return heapq.merge(*(read(path) for path in paths), key=lambda record: record[0])
+
+
+def reports(kind, payload):
+    # The individual position reports carried by one captured record
+    data = json.loads(payload)
+    if kind == KIND_SINGLE:
+        return [data] if isinstance(data, dict) else []
+    if kind == KIND_BATCH:
+        updates = data.get('updates') if isinstance(data, dict) else None
+        return [report for report in updates or [] if isinstance(report, dict)]
+    return [report for report in data if isinstance(report, dict)]
@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+import metrics
+
+
+# One ordered source of change events for every worker: a change stream over
+# the collections that caches and live feeds depend on. Requires Mongo to run
+# as a replica set (a single-node one is enough, see DEPLOYMENT.md).
+
+WATCHED_COLLECTIONS = ("flight_updates", "flight_logs", "airports", "geofences", "geofence_events")
+STATE_COLLECTION = "change_stream_state"
+HISTORY_LOST_CODES = (260, 280, 286)
+
+EVENTS = metrics.counter(
+    "flightaware_change_events_total",
+    "Change stream events dispatched by collection and operation",
+    ("collection", "operation"),
+)
+DROPPED = metrics.counter(
+    "flightaware_live_events_dropped_total",
+    "Live events dropped because a subscriber queue was full",
+)
+
+_handlers = []
+_subscribers = set()
+_lock = threading.Lock()
+
+
+def on_change(handler):
+    # handler(event) is called on the listener thread for every event
+    with _lock:
+        _handlers.append(handler)
+    return handler
+
+
+def subscribe(max_queue=1000):
+    subscriber = queue.Queue(maxsize=max_queue)
+    with _lock:
+        _subscribers.add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber):
+    with _lock:
+        _subscribers.discard(subscriber)
+
+
+def pending_events():
+    with _lock:
+        return sum(subscriber.qsize() for subscriber in _subscribers)
+
+
+metrics.QUEUE_DEPTH.set_function(pending_events, queue="live_subscribers")
+
+
+def publish(event):
+    with _lock:
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(event)
+        except queue.Full:
+            DROPPED.inc()
+
+
+def _normalize(change):
+    document = change.get("fullDocument") or {}
+    return {
+        "collection": change["ns"]["coll"],
+        "operation": change["operationType"],
+        "document_key": str(change.get("documentKey", {}).get("_id")),
+        "flight_id": document.get("flight_id"),
+        "code": document.get("code"),
+        "status": document.get("status"),
+        "fence_id": document.get("fence_id"),
+        "event": document.get("event"),
+        "cluster_time": change["clusterTime"].time if change.get("clusterTime") else None,
+    }
+
+
+class ChangeFeed(threading.Thread):
+    # A named consumer stores its resume token in STATE_COLLECTION at most
+    # every checkpoint_seconds (and whenever the stream goes idle), so a
+    # restart may dispatch the last few seconds of events again. With no name
+    # the token is only kept in memory, for reconnects within this process.
+
+    def __init__(self, db, name=None, checkpoint_seconds=5.0):
+        super().__init__(name=f"change-feed-{name or 'local'}", daemon=True)
+        self.db = db
+        self.consumer = name
+        self.checkpoint_seconds = checkpoint_seconds
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _load_token(self):
+        if self.consumer is None:
+            return None
+        state = self.db[STATE_COLLECTION].find_one({"_id": self.consumer})
+        return state.get("token") if state else None
+
+    def _save_token(self, token):
+        if self.consumer is None:
+            return
+        self.db[STATE_COLLECTION].update_one(
+            {"_id": self.consumer},
+            {"$set": {"token": token, "updated_at": datetime.utcnow().isoformat() + 'Z'}},
+            upsert=True
+        )
+
+    def _pipeline(self):
+        return [
+            {"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}},
+            # Keep events small: tracks and field diffs are never needed downstream
+            {"$project": {"fullDocument.updates": 0, "fullDocument.track": 0, "updateDescription": 0}},
+        ]
+
+    def run(self):
+        token = self._load_token()
+        while not self._stop_event.is_set():
+            try:
+                with self.db.watch(self._pipeline(), full_document="updateLookup",
+                                   start_after=token, max_await_time_ms=1000) as stream:
+                    unsaved = False
+                    saved_at = time.monotonic()
+                    while not self._stop_event.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            event = _normalize(change)
+                            EVENTS.inc(collection=event["collection"], operation=event["operation"])
+                            for handler in list(_handlers):
+                                try:
+                                    handler(event)
+                                except Exception as e:
+                                    print(f"⚠️ Change handler failed: {e}")
+                            publish(event)
+                            unsaved = True
+
+                        # Taken after dispatch: a restart resumes after a
+                        # handled event, never skipping one
+                        token = stream.resume_token
+                        if unsaved and (change is None or time.monotonic() - saved_at >= self.checkpoint_seconds):
+                            self._save_token(token)
+                            unsaved = False
+                            saved_at = time.monotonic()
+                    if unsaved:
+                        self._save_token(token)
+
+            except OperationFailure as e:
+                if e.code in HISTORY_LOST_CODES:
+                    print(f"⚠️ Change stream resume point lost ({e.code}); restarting from now")
+                    token = None
+                    self._save_token(None)
+                else:
+                    print(f"⚠️ Change stream error: {e}")
+                    time.sleep(1)
+            except PyMongoError as e:
+                print(f"⚠️ Change stream error: {e}")
+                time.sleep(1)
@@ -0,0 +1,223 @@
+import math
+import threading
+import time
+
+
+# Separation conflicts across the active fleet. Aircraft are placed on a 3D
+# spatial hash of their earth-centred (ECEF) surface position with a cell
+# edge equal to the horizontal threshold, so any pair closer than the
+# threshold sits in the same or an adjacent cell. Altitude is compared after
+# the cell lookup. Working in ECEF avoids the longitude squeeze near the
+# poles and the seam at the antimeridian.
+#
+# Each report moves one aircraft and recomputes only that aircraft's pairs,
+# so the current conflict list is always ready to read.
+
+EARTH_RADIUS_KM = 6371
+HORIZONTAL_KM = 9.26   # 5 NM
+VERTICAL_M = 300       # ~1000 ft
+MIN_ALTITUDE_M = 150   # below this the aircraft is on or near the runway
+MAX_AGE_SECONDS = 300  # positions older than this no longer count
+
+
+def ecef(lat, lon):
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    cos_lat = math.cos(lat_rad)
+    return (
+        EARTH_RADIUS_KM * cos_lat * math.cos(lon_rad),
+        EARTH_RADIUS_KM * cos_lat * math.sin(lon_rad),
+        EARTH_RADIUS_KM * math.sin(lat_rad),
+    )
+
+
+def surface_distance_km(a, b):
+    # Great-circle distance from the chord between two ECEF surface points
+    chord = math.dist(a, b)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / (2 * EARTH_RADIUS_KM)))
+
+
+class Aircraft:
+    __slots__ = ("flight_id", "callsign", "lat", "lon", "altitude_m", "ts", "xyz", "cell", "seen")
+
+    def __init__(self, flight_id, callsign, lat, lon, altitude_m, ts, xyz, cell):
+        self.flight_id = flight_id
+        self.callsign = callsign
+        self.lat = lat
+        self.lon = lon
+        self.altitude_m = altitude_m
+        self.ts = ts
+        self.xyz = xyz
+        self.cell = cell
+        self.seen = time.monotonic()
+
+
+class ConflictDetector:
+
+    def __init__(self, horizontal_km=HORIZONTAL_KM, vertical_m=VERTICAL_M,
+                 min_altitude_m=MIN_ALTITUDE_M, max_age_seconds=MAX_AGE_SECONDS):
+        self.horizontal_km = horizontal_km
+        self.vertical_m = vertical_m
+        self.min_altitude_m = min_altitude_m
+        self.max_age_seconds = max_age_seconds
+        self._aircraft = {}
+        self._cells = {}
+        self._pairs = {}  # (flight_id, flight_id) sorted -> (horizontal_km, vertical_m)
+        self._lock = threading.Lock()
+        self.refreshed_at = None
+
+    def __len__(self):
+        return len(self._aircraft)
+
+    def _cell(self, xyz):
+        size = self.horizontal_km
+        return (math.floor(xyz[0] / size), math.floor(xyz[1] / size), math.floor(xyz[2] / size))
+
+    def _neighbours(self, aircraft):
+        cx, cy, cz = aircraft.cell
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for other in self._cells.get((cx + dx, cy + dy, cz + dz), ()):
+                        if other is not aircraft:
+                            yield other
+
+    def _separation(self, a, b):
+        vertical = abs(a.altitude_m - b.altitude_m)
+        if vertical >= self.vertical_m:
+            return None
+        horizontal = surface_distance_km(a.xyz, b.xyz)
+        if horizontal >= self.horizontal_km:
+            return None
+        return horizontal, vertical
+
+    def _drop_pairs(self, flight_id, partners):
+        for partner in partners:
+            self._pairs.pop(tuple(sorted((flight_id, partner))), None)
+
+    def _unlink(self, aircraft):
+        cell = self._cells.get(aircraft.cell)
+        if cell is not None:
+            cell.discard(aircraft)
+            if not cell:
+                del self._cells[aircraft.cell]
+        self._drop_pairs(aircraft.flight_id, [other.flight_id for other in self._neighbours(aircraft)])
+
+    def _link(self, aircraft):
+        self._aircraft[aircraft.flight_id] = aircraft
+        if aircraft.altitude_m < self.min_altitude_m:
+            return
+        self._cells.setdefault(aircraft.cell, set()).add(aircraft)
+        for other in self._neighbours(aircraft):
+            separation = self._separation(aircraft, other)
+            if separation:
+                self._pairs[tuple(sorted((aircraft.flight_id, other.flight_id)))] = separation
+
+    def _make(self, flight_id, callsign, lat, lon, altitude_m, ts):
+        xyz = ecef(lat, lon)
+        return Aircraft(flight_id, callsign, lat, lon, float(altitude_m or 0), ts, xyz, self._cell(xyz))
+
+    def update(self, flight_id, callsign, lat, lon, altitude_m, ts=None):
+        # Moves one aircraft; reports older than the stored one are ignored
+        with self._lock:
+            current = self._aircraft.get(flight_id)
+            if current is not None:
+                if ts and current.ts and ts < current.ts:
+                    return
+                self._unlink(current)
+                del self._aircraft[flight_id]
+            self._link(self._make(flight_id, callsign, lat, lon, altitude_m, ts))
+
+    def remove(self, flight_id):
+        with self._lock:
+            current = self._aircraft.pop(flight_id, None)
+            if current is not None:
+                self._unlink(current)
+
+    def load(self, positions):
+        # positions: iterable of (flight_id, callsign, lat, lon, altitude_m, ts)
+        with self._lock:
+            self._aircraft, self._cells, self._pairs = {}, {}, {}
+            for position in positions:
+                self._link(self._make(*position))
+            self.refreshed_at = time.monotonic()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.max_age_seconds
+        for aircraft in [a for a in self._aircraft.values() if a.seen < cutoff]:
+            self._unlink(aircraft)
+            del self._aircraft[aircraft.flight_id]
+
+    def conflicts(self, horizontal_km=None, vertical_m=None):
+        # Pairs within the configured thresholds, or tighter ones if given
+        horizontal_km = min(horizontal_km or self.horizontal_km, self.horizontal_km)
+        vertical_m = min(vertical_m or self.vertical_m, self.vertical_m)
+        with self._lock:
+            self._expire()
+            pairs = [
+                (first, second, horizontal, vertical)
+                for (first, second), (horizontal, vertical) in self._pairs.items()
+                if horizontal < horizontal_km and vertical < vertical_m
+            ]
+            aircraft = self._aircraft
+
+            results = []
+            for first, second, horizontal, vertical in sorted(pairs, key=lambda pair: pair[2]):
+                a, b = aircraft[first], aircraft[second]
+                results.append({
+                    "flights": [first, second],
+                    "callsigns": [a.callsign, b.callsign],
+                    "horizontal_km": round(horizontal, 3),
+                    "vertical_m": round(vertical, 1),
+                    "positions": [
+                        {"lat": a.lat, "lon": a.lon, "altitude_m": a.altitude_m, "ts": a.ts},
+                        {"lat": b.lat, "lon": b.lon, "altitude_m": b.altitude_m, "ts": b.ts},
+                    ],
+                })
+        return results
+
+
+def _benchmark(sizes=(1000, 10000, 50000)):
+    import random
+
+    random.seed(11)
+    print("=" * 60)
+    print("🛩️  CONFLICT DETECTION (5 NM / 300 m)")
+    print("=" * 60)
+    for size in sizes:
+        # A dense airspace roughly the size of Europe
+        positions = [
+            (f"F{n}", f"CS{n}", random.uniform(35, 60), random.uniform(-10, 30),
+             random.choice(range(3000, 12500, 300)) + random.uniform(-50, 50), None)
+            for n in range(size)
+        ]
+        detector = ConflictDetector()
+
+        started = time.perf_counter()
+        detector.load(positions)
+        load = time.perf_counter() - started
+
+        started = time.perf_counter()
+        found = len(detector.conflicts())
+        query = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for flight_id, callsign, lat, lon, altitude, ts in positions[:2000]:
+            detector.update(flight_id, callsign, lat + 0.01, lon + 0.01, altitude, ts)
+        update = (time.perf_counter() - started) / min(size, 2000)
+
+        # Naive pairwise check, timed on a slice and scaled to n²/2 pairs
+        sample = [detector._make(*position) for position in positions[:300]]
+        started = time.perf_counter()
+        for i in range(len(sample)):
+            for j in range(i + 1, len(sample)):
+                detector._separation(sample[i], sample[j])
+        per_pair = (time.perf_counter() - started) / (len(sample) * (len(sample) - 1) / 2)
+        naive = per_pair * size * (size - 1) / 2
+
+        print(f"   {size:>6,} aircraft: load {load * 1000:7.0f} ms, query {query * 1000:5.1f} ms, "
+              f"update {update * 1e6:5.1f} µs/report, naive rescan ~{naive * 1000:8.0f} ms, {found} conflicts")
+
+
+if __name__ == "__main__":
+    _benchmark()
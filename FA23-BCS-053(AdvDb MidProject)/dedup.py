@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+# Duplicate suppression for position reports. Several receivers hear the same
+# aircraft and the simulator retries on timeouts, so the same report can
+# arrive more than once. A report is identified by flight_id plus its event
+# timestamp, which every receiver hearing the same position reports alike.
+# Sequence numbers are counted per receiver, so they only identify a report
+# without a timestamp, scoped to its receiver_id. Reports with neither are
+# never treated as duplicates.
+
+REPORTS = metrics.counter(
+    "flightaware_ingest_reports_total",
+    "Position reports by outcome",
+    ("outcome",),
+)
+DUPLICATES = metrics.counter(
+    "flightaware_ingest_duplicates_total",
+    "Duplicate reports suppressed, by the layer that caught them",
+    ("layer",),
+)
+
+
+def event_key(data):
+    if data.get('ts'):
+        return f"ts:{data['ts']}"
+    if data.get('seq') is not None:
+        return f"seq:{data.get('receiver_id', 'UNKNOWN')}:{data['seq']}"
+    return None
+
+
+class DedupWindow:
+
+    def __init__(self, max_entries=200000, ttl_seconds=900):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.CACHE_ENTRIES.set_function(self.__len__, cache="dedup_window")
+
+    def __len__(self):
+        return len(self._seen)
+
+    def check_and_add(self, flight_id, key):
+        # True when (flight_id, key) was already seen inside the window
+        if key is None:
+            return False
+        now = time.monotonic()
+        entry = (flight_id, key)
+        with self._lock:
+            seen_at = self._seen.get(entry)
+            if seen_at is not None and now - seen_at <= self.ttl_seconds:
+                return True
+            self._seen[entry] = now
+            self._seen.move_to_end(entry)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            # Drop expired entries from the old end while we hold the lock
+            while self._seen:
+                oldest, oldest_at = next(iter(self._seen.items()))
+                if now - oldest_at <= self.ttl_seconds:
+                    break
+                del self._seen[oldest]
+        return False
+
+    def forget(self, flight_id, key):
+        # Used when a write fails, so a retry of the same report is not dropped
+        if key is None:
+            return
+        with self._lock:
+            self._seen.pop((flight_id, key), None)
+
+
+def guard_filter(flight_id, key):
+    # Server-side guard: only matches if this report is not in the track yet
+    if key is None:
+        return {"flight_id": flight_id}
+    return {"flight_id": flight_id, "updates.event_key": {"$ne": key}}
+
+
+def record(outcome, layer=None):
+    REPORTS.inc(outcome=outcome)
+    if layer:
+        DUPLICATES.inc(layer=layer)
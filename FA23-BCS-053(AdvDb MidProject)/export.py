@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+import zlib
+from bisect import bisect_left, bisect_right
+
+import metrics
+from track import Track, format_micros, to_micros
+
+
+# Streaming export of flight history. Every writer takes an iterator of
+# flight documents and yields text chunks, so only the flight being written
+# is held in memory however many flights the export covers. Tracks are read
+# through Track columns and clipped to the requested time range.
+#
+# A flight whose track cannot be decoded is logged, counted and named at the
+# end of the stream. Headers have already been sent by then, so the count is
+# carried in the body.
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "geojson": "application/geo+json",
+}
+METADATA = (
+    "flight_id", "callsign", "aircraft_type", "tail_number", "status",
+    "source_airport", "destination_airport", "first_seen", "last_seen", "completed_at",
+)
+CSV_METADATA = ("flight_id", "callsign", "aircraft_type", "tail_number", "source_airport", "destination_airport")
+POSITION_FIELDS = ("ts", "lat", "lon", "altitude_m", "spd_kts", "heading", "vertical_rate", "receiver_id")
+CHUNK_BYTES = 64 * 1024
+MAX_SKIPPED_IDS = 100
+
+SKIPPED_FLIGHTS = metrics.counter(
+    "flightaware_export_skipped_flights_total",
+    "Flights left out of exports because their track could not be decoded",
+    ("format",),
+)
+
+
+def _window(track, start_micros, end_micros):
+    # Index range of the points inside [start, end]; the columns are sorted by ts
+    lo = bisect_left(track.ts, start_micros) if start_micros is not None else 0
+    hi = bisect_right(track.ts, end_micros) if end_micros is not None else len(track)
+    return range(lo, hi)
+
+
+class Skipped:
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.count = 0
+        self.flight_ids = []
+
+    def add(self, flight, error):
+        self.count += 1
+        if len(self.flight_ids) < MAX_SKIPPED_IDS:
+            self.flight_ids.append(flight.get('flight_id'))
+        SKIPPED_FLIGHTS.inc(format=self.fmt)
+        print(f"⚠️ Export skipped flight {flight.get('flight_id')}: {error}")
+
+    def summary(self):
+        return {"skipped_flights": self.count, "skipped_flight_ids": self.flight_ids}
+
+
+def _positions(flight, start_micros, end_micros, skipped):
+    try:
+        track = Track.from_flight(flight)
+    except (ValueError, OverflowError, KeyError, IndexError, zlib.error) as e:
+        # Unknown encoding, or a stored payload that is corrupt or truncated
+        skipped.add(flight, e)
+        return None, range(0)
+    return track, _window(track, start_micros, end_micros)
+
+
+def ndjson(flights, start_micros=None, end_micros=None):
+    # One flight per line with its points in the stored update shape, then an
+    # {"export_summary": ...} line if any flight was skipped
+    skipped = Skipped("ndjson")
+    for flight in flights:
+        track, window = _positions(flight, start_micros, end_micros, skipped)
+        if track is None:
+            continue
+        record = {name: flight.get(name) for name in METADATA}
+        record["updates"] = [track.point(i) for i in window]
+        yield json.dumps(record, default=str) + "\n"
+    if skipped.count:
+        yield json.dumps({"export_summary": skipped.summary()}) + "\n"
+
+
+def csv_rows(flights, start_micros=None, end_micros=None):
+    # One row per position, flight metadata repeated on each row, then a
+    # "# skipped_flights=..." comment line if any flight was skipped
+    skipped = Skipped("csv")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_METADATA + POSITION_FIELDS)
+    for flight in flights:
+        track, window = _positions(flight, start_micros, end_micros, skipped)
+        if track is None:
+            continue
+        metadata = [flight.get(name) for name in CSV_METADATA]
+        receivers = track.receivers
+        for i in window:
+            writer.writerow(metadata + [
+                format_micros(track.ts[i]), track.lat[i], track.lon[i], track.altitude_m[i],
+                track.spd_kts[i], track.heading[i], track.vertical_rate[i],
+                receivers[track.receiver_index[i]] if receivers else None,
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+    if skipped.count:
+        yield f"# skipped_flights={skipped.count} skipped_flight_ids={','.join(map(str, skipped.flight_ids))}\n"
+
+
+def geojson(flights, start_micros=None, end_micros=None):
+    # A FeatureCollection with one LineString (Point for a single report) per
+    # flight; skipped flights are listed in members after the features
+    skipped = Skipped("geojson")
+    yield '{"type": "FeatureCollection", "features": ['
+    first = True
+    for flight in flights:
+        track, window = _positions(flight, start_micros, end_micros, skipped)
+        if not window:
+            continue
+        coordinates = [[track.lon[i], track.lat[i], track.altitude_m[i]] for i in window]
+        feature = {
+            "type": "Feature",
+            "geometry": (
+                {"type": "LineString", "coordinates": coordinates} if len(coordinates) > 1
+                else {"type": "Point", "coordinates": coordinates[0]}
+            ),
+            "properties": {
+                **{name: flight.get(name) for name in METADATA},
+                "times": [format_micros(track.ts[i]) for i in window],
+            },
+        }
+        yield ("" if first else ",") + json.dumps(feature, default=str)
+        first = False
+    yield "], " + json.dumps(skipped.summary(), default=str)[1:] + "\n"
+
+
+WRITERS = {"ndjson": ndjson, "csv": csv_rows, "geojson": geojson}
+
+
+def _chunked(chunks, size=CHUNK_BYTES):
+    # Joins small pieces so each write to the socket carries ~64 KiB
+    pending = []
+    pending_bytes = 0
+    for chunk in chunks:
+        data = chunk.encode() if isinstance(chunk, str) else chunk
+        pending.append(data)
+        pending_bytes += len(data)
+        if pending_bytes >= size:
+            yield b"".join(pending)
+            pending, pending_bytes = [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+def _gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(flights, fmt, start=None, end=None, gzip=False):
+    # Bytes of the whole export; start and end are ISO timestamps or None
+    start_micros = to_micros(start) if start else None
+    end_micros = to_micros(end) if end else None
+    chunks = _chunked(WRITERS[fmt](flights, start_micros, end_micros))
+    return _gzipped(chunks) if gzip else chunks
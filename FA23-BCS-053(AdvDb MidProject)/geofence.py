@@ -0,0 +1,271 @@
+import math
+import threading
+import time
+
+
+# Geofences checked on every position report. Fences are circles (centre and
+# radius) or simple polygons in [lon, lat] order, like current_position. Each
+# fence is registered in every cell of a fixed lon/lat grid its bounding box
+# touches, so a lookup reads one cell and runs the exact test only on the
+# handful of fences registered there.
+#
+# Polygons are tested in planar lon/lat and must not cross the antimeridian;
+# circles use great-circle distance and may.
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.32
+CELL_DEGREES = 1.0
+SHAPES = ("circle", "polygon")
+MAX_POLYGON_VERTICES = 1000
+MAX_RADIUS_KM = 2000
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _point(value, what):
+    try:
+        lon, lat = float(value[0]), float(value[1])
+    except (TypeError, ValueError, IndexError, KeyError):
+        raise ValueError(f"{what} must be [lon, lat]")
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError(f"{what} is out of range (lon -180..180, lat -90..90)")
+    return [lon, lat]
+
+
+def parse_fence(data):
+    # Validated fence fields from a request body; raises ValueError
+    if not isinstance(data, dict):
+        raise ValueError("Body must be a JSON object")
+    name = data.get('name')
+    if not name or not isinstance(name, str):
+        raise ValueError("name is required")
+    shape = data.get('type')
+    if shape not in SHAPES:
+        raise ValueError(f"type must be one of {', '.join(SHAPES)}")
+
+    fence = {"name": name, "type": shape, "kind": data.get('kind') or "custom"}
+    if shape == "circle":
+        fence["center"] = _point(data.get('center'), "center")
+        try:
+            radius = float(data.get('radius_km'))
+        except (TypeError, ValueError):
+            raise ValueError("radius_km must be a number")
+        if not 0 < radius <= MAX_RADIUS_KM:
+            raise ValueError(f"radius_km must be between 0 and {MAX_RADIUS_KM}")
+        fence["radius_km"] = radius
+    else:
+        ring = data.get('coordinates')
+        if not isinstance(ring, list) or not 3 <= len(ring) <= MAX_POLYGON_VERTICES + 1:
+            raise ValueError(f"coordinates must be a list of 3 to {MAX_POLYGON_VERTICES} [lon, lat] points")
+        ring = [_point(point, "coordinates entry") for point in ring]
+        if ring[0] == ring[-1]:
+            ring = ring[:-1]
+        if len(ring) < 3:
+            raise ValueError("coordinates must contain at least 3 distinct points")
+        lons = [lon for lon, _ in ring]
+        if max(lons) - min(lons) > 180:
+            raise ValueError("polygons may not cross the antimeridian; split them in two")
+        fence["coordinates"] = ring
+    return fence
+
+
+class Fence:
+    __slots__ = ("id", "name", "kind", "shape", "center", "radius_km", "ring")
+
+    def __init__(self, fence_id, name, kind, shape, center=None, radius_km=None, ring=None):
+        self.id = fence_id
+        self.name = name
+        self.kind = kind
+        self.shape = shape
+        self.center = center
+        self.radius_km = radius_km
+        self.ring = ring
+
+    @classmethod
+    def from_doc(cls, doc):
+        return cls(
+            str(doc["_id"]), doc.get("name"), doc.get("kind"), doc["type"],
+            center=doc.get("center"), radius_km=doc.get("radius_km"), ring=doc.get("coordinates"),
+        )
+
+    def contains(self, lat, lon):
+        if self.shape == "circle":
+            return haversine_km(self.center[1], self.center[0], lat, lon) <= self.radius_km
+
+        # Ray casting on the ring
+        inside = False
+        ring = self.ring
+        j = len(ring) - 1
+        for i in range(len(ring)):
+            xi, yi = ring[i]
+            xj, yj = ring[j]
+            if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+                inside = not inside
+            j = i
+        return inside
+
+    def boxes(self):
+        # Bounding boxes (west, south, east, north), split at the antimeridian
+        if self.shape == "polygon":
+            lons = [lon for lon, _ in self.ring]
+            lats = [lat for _, lat in self.ring]
+            return [(min(lons), min(lats), max(lons), max(lats))]
+
+        lon, lat = self.center
+        dlat = self.radius_km / KM_PER_DEGREE
+        south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+        cos_lat = min(math.cos(math.radians(south)), math.cos(math.radians(north)))
+        if cos_lat <= 0.01 or self.radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+            return [(-180.0, south, 180.0, north)]
+        dlon = self.radius_km / (KM_PER_DEGREE * cos_lat)
+        west, east = lon - dlon, lon + dlon
+        if west < -180:
+            return [(west + 360, south, 180.0, north), (-180.0, south, east, north)]
+        if east > 180:
+            return [(west, south, 180.0, north), (-180.0, south, east - 360, north)]
+        return [(west, south, east, north)]
+
+
+class FenceIndex:
+
+    def __init__(self, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._fences = {}
+        self._cells = {}
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._stale = True
+
+    def __len__(self):
+        return len(self._fences)
+
+    def __contains__(self, fence_id):
+        return fence_id in self._fences
+
+    def _cell(self, lat, lon):
+        return (math.floor(lon / self.cell_degrees), math.floor(lat / self.cell_degrees))
+
+    def _cells_for(self, fence):
+        for west, south, east, north in fence.boxes():
+            x0, y0 = self._cell(south, west)
+            x1, y1 = self._cell(north, east)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    yield (x, y)
+
+    def _add(self, fences, cells, fence):
+        fences[fence.id] = fence
+        for cell in self._cells_for(fence):
+            cells.setdefault(cell, []).append(fence)
+
+    def load(self, docs):
+        # Builds a new index off to the side and swaps it in, so lookups
+        # running meanwhile see either the old or the new set of fences
+        fences, cells = {}, {}
+        for doc in docs:
+            self._add(fences, cells, Fence.from_doc(doc))
+        with self._lock:
+            self._fences, self._cells = fences, cells
+            self._loaded_at = time.monotonic()
+            self._stale = False
+
+    def add(self, fence):
+        with self._lock:
+            fences, cells = dict(self._fences), {key: list(value) for key, value in self._cells.items()}
+            fences.pop(fence.id, None)
+            for cell_fences in cells.values():
+                cell_fences[:] = [f for f in cell_fences if f.id != fence.id]
+            self._add(fences, cells, fence)
+            self._fences, self._cells = fences, cells
+
+    def remove(self, fence_id):
+        with self._lock:
+            fence = self._fences.get(fence_id)
+            if fence is None:
+                return
+            fences = dict(self._fences)
+            del fences[fence_id]
+            cells = dict(self._cells)
+            for cell in set(self._cells_for(fence)):
+                cells[cell] = [f for f in cells.get(cell, []) if f.id != fence_id]
+            self._fences, self._cells = fences, cells
+
+    def get(self, fence_id):
+        return self._fences.get(fence_id)
+
+    def mark_stale(self):
+        self._stale = True
+
+    def is_stale(self, max_age=None):
+        if self._stale or self._loaded_at is None:
+            return True
+        return max_age is not None and time.monotonic() - self._loaded_at > max_age
+
+    def containing(self, lat, lon):
+        # ids of fences that contain the point
+        candidates = self._cells.get(self._cell(lat, lon), ())
+        return {fence.id for fence in candidates if fence.contains(lat, lon)}
+
+
+def transitions(previous, current):
+    # (entered, exited) between two sets of fence ids
+    return current - previous, previous - current
+
+
+def _benchmark(fences=10000, points=100000):
+    import random
+
+    random.seed(7)
+    docs = []
+    for n in range(fences):
+        lat, lon = random.uniform(-60, 70), random.uniform(-180, 180)
+        if n % 2:
+            docs.append({"_id": n, "name": f"circle-{n}", "type": "circle",
+                         "center": [lon, lat], "radius_km": random.uniform(5, 150)})
+        else:
+            size = random.uniform(0.1, 2.0)
+            ring = [[max(-180, min(180, lon + size * math.cos(a))), max(-90, min(90, lat + size * math.sin(a)))]
+                    for a in (i * 2 * math.pi / 8 for i in range(8))]
+            docs.append({"_id": n, "name": f"polygon-{n}", "type": "polygon", "coordinates": ring})
+    positions = [(random.uniform(-60, 70), random.uniform(-180, 180)) for _ in range(points)]
+
+    index = FenceIndex()
+    started = time.perf_counter()
+    index.load(docs)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    hits = 0
+    for lat, lon in positions:
+        hits += len(index.containing(lat, lon))
+    indexed = time.perf_counter() - started
+
+    sample = positions[:200]
+    all_fences = [Fence.from_doc(doc) for doc in docs]
+    started = time.perf_counter()
+    brute_hits = 0
+    for lat, lon in sample:
+        brute_hits += sum(1 for fence in all_fences if fence.contains(lat, lon))
+    brute = (time.perf_counter() - started) / len(sample) * points
+
+    sample_hits = sum(len(index.containing(lat, lon)) for lat, lon in sample)
+
+    print("=" * 60)
+    print(f"🗺️  GEOFENCES: {fences:,} fences, {points:,} positions")
+    print("=" * 60)
+    print(f"   Index build:      {build * 1000:.0f} ms ({len(index._cells):,} cells)")
+    print(f"   Grid lookups:     {indexed * 1000:.0f} ms ({indexed / points * 1e6:.1f} µs/position)")
+    print(f"   Brute force:      {brute * 1000:.0f} ms (estimated from {len(sample)} positions)")
+    print(f"   Speedup:          {brute / indexed:.0f}×")
+    print(f"   Matches:          {hits:,} (sample agrees with brute force: {sample_hits == brute_hits})")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,38 @@
+import multiprocessing
+import os
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Requests spend most of their time waiting on Mongo, so each worker runs a
+# few threads and we keep one worker per core plus one.
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+worker_class = "gthread"
+
+# Every worker builds its own MongoClient after the fork. Preloading would
+# create the client in the master and share it across processes.
+preload_app = False
+
+# One pooled connection per thread plus headroom for monitoring and archival
+os.environ.setdefault("FLIGHTAWARE_MONGO_MAX_POOL_SIZE", str(threads + 2))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Recycle workers periodically so slow leaks cannot build up
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = 500
+
+accesslog = "-"
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    # Runs after in-flight requests have drained during a graceful shutdown
+    try:
+        from app import mongo
+        mongo.cx.close()
+    except Exception as e:
+        server.log.warning(f"Mongo client close failed: {e}")
@@ -0,0 +1,270 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+_registry = {}
+_registry_lock = threading.Lock()
+_request_state = threading.local()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn, **labels):
+        # Evaluated lazily at scrape time, e.g. for queue depth or cache size
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def collect(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            with self._lock:
+                self._values[key] = value
+        yield from super().collect()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {count}"
+
+
+def _get_or_create(cls, name, help_text, labels, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text, labels, **kwargs)
+        return metric
+
+
+def counter(name, help_text, labels=()):
+    return _get_or_create(Counter, name, help_text, labels)
+
+
+def gauge(name, help_text, labels=()):
+    return _get_or_create(Gauge, name, help_text, labels)
+
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    return _get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_LATENCY = histogram(
+    "flightaware_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status"),
+)
+REQUESTS_IN_PROGRESS = gauge(
+    "flightaware_http_requests_in_progress",
+    "Requests currently being handled by this process",
+)
+REQUEST_MONGO_OPS = histogram(
+    "flightaware_http_request_mongo_operations",
+    "Number of Mongo commands issued per request",
+    ("route",),
+    buckets=COUNT_BUCKETS,
+)
+REQUEST_MONGO_SECONDS = histogram(
+    "flightaware_http_request_mongo_seconds",
+    "Time spent waiting on Mongo per request",
+    ("route",),
+)
+MONGO_COMMANDS = counter(
+    "flightaware_mongo_commands_total",
+    "Mongo commands by name and outcome",
+    ("command", "outcome"),
+)
+MONGO_COMMAND_LATENCY = histogram(
+    "flightaware_mongo_command_duration_seconds",
+    "Mongo command latency by name",
+    ("command",),
+)
+STAGE_LATENCY = histogram(
+    "flightaware_stage_duration_seconds",
+    "Time spent in named stages of a handler",
+    ("handler", "stage"),
+)
+CACHE_REQUESTS = counter(
+    "flightaware_cache_requests_total",
+    "In-process cache lookups by cache and result",
+    ("cache", "result"),
+)
+CACHE_ENTRIES = gauge(
+    "flightaware_cache_entries",
+    "Entries held by in-process caches",
+    ("cache",),
+)
+CACHE_BYTES = gauge(
+    "flightaware_cache_bytes",
+    "Bytes held by size-bounded in-process caches",
+    ("cache",),
+)
+QUEUE_DEPTH = gauge(
+    "flightaware_queue_depth",
+    "Items waiting in in-process queues",
+    ("queue",),
+)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "success")
+
+    def failed(self, event):
+        self._record(event, "failure")
+
+    def _record(self, event, outcome):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMANDS.inc(command=event.command_name, outcome=outcome)
+        MONGO_COMMAND_LATENCY.observe(seconds, command=event.command_name)
+
+        # Commands run on the calling thread, so this attributes them to the current request
+        if getattr(_request_state, "active", False):
+            _request_state.mongo_ops += 1
+            _request_state.mongo_seconds += seconds
+
+
+def start_request():
+    _request_state.active = True
+    _request_state.mongo_ops = 0
+    _request_state.mongo_seconds = 0.0
+    _request_state.started = time.perf_counter()
+    REQUESTS_IN_PROGRESS.inc()
+
+
+def finish_request(method, route, status):
+    if not getattr(_request_state, "active", False):
+        return
+    _request_state.active = False
+    REQUESTS_IN_PROGRESS.dec()
+
+    elapsed = time.perf_counter() - _request_state.started
+    REQUEST_LATENCY.observe(elapsed, method=method, route=route, status=status)
+    REQUEST_MONGO_OPS.observe(_request_state.mongo_ops, route=route)
+    REQUEST_MONGO_SECONDS.observe(_request_state.mongo_seconds, route=route)
+
+
+@contextmanager
+def timed(handler, stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, handler=handler, stage=stage)
+
+
+def record_cache(cache_name, hit):
+    CACHE_REQUESTS.inc(cache=cache_name, result="hit" if hit else "miss")
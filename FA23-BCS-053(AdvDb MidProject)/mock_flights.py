@@ -5,6 +5,7 @@ import random
 import math
 
 API_URL = "http://127.0.0.1:5000/api/ingest"
+MAX_RETRIES = 3
 
 AIRPORTS = {
     "LHE": {"lat": 31.5216, "lon": 74.4036, "name": "Allama Iqbal International Airport"},
@@ -177,7 +178,8 @@ class RealisticFlightSimulator:
                 status = "active"
 
 
-            timestamp = (self.start_time + timedelta(minutes=i * 5)).isoformat() + 'Z'
+            # Event time of the report; a resend after a timeout keeps it
+            timestamp = datetime.utcnow().isoformat() + 'Z'
             data = {
                 "flight_id": self.flight_id,
                 "callsign": self.callsign,
@@ -192,11 +194,22 @@ class RealisticFlightSimulator:
                 "source": self.source_code,
                 "destination": self.dest_code,
                 "aircraft_type": self.aircraft_type,
-                "tail_number": self.tail_number
+                "tail_number": self.tail_number,
+                "ts": timestamp,
+                "seq": i
             }
 
             try:
-                response = requests.post(API_URL, json=data, timeout=5)
+                # Resending after a timeout is safe: the server drops reports
+                # whose flight_id + ts it has already stored
+                for attempt in range(MAX_RETRIES):
+                    try:
+                        response = requests.post(API_URL, json=data, timeout=5)
+                        break
+                    except requests.exceptions.Timeout:
+                        if attempt == MAX_RETRIES - 1:
+                            raise
+                        print(f"   ⏳ Timeout, resending update {i + 1}")
 
                 if response.status_code in [200, 201]:
                     phase_emoji = {
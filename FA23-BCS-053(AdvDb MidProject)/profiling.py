@@ -0,0 +1,95 @@
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+
+settings = {
+    "sample_rate": 0.0,
+    "max_profiles": 50,
+    "sort": "cumulative",
+    "limit": 40,
+}
+
+_profiles = OrderedDict()
+_lock = threading.Lock()
+_state = threading.local()
+
+
+def should_sample():
+    rate = settings["sample_rate"]
+    return rate > 0 and random.random() < rate
+
+
+def start(reason):
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread
+        return False
+    _state.profiler = profiler
+    _state.reason = reason
+    _state.started = time.perf_counter()
+    return True
+
+
+def stop(method, path, route, status):
+    profiler = getattr(_state, "profiler", None)
+    if profiler is None:
+        return None
+    profiler.disable()
+    _state.profiler = None
+
+    profile_id = uuid.uuid4().hex[:12]
+    entry = {
+        "profile_id": profile_id,
+        "method": method,
+        "path": path,
+        "route": route,
+        "status": status,
+        "reason": _state.reason,
+        "duration_ms": round((time.perf_counter() - _state.started) * 1000, 2),
+        "captured_at": datetime.utcnow().isoformat() + 'Z',
+        "profiler": profiler,
+    }
+
+    with _lock:
+        _profiles[profile_id] = entry
+        while len(_profiles) > settings["max_profiles"]:
+            _profiles.popitem(last=False)
+
+    return profile_id
+
+
+def summary(entry):
+    return {key: value for key, value in entry.items() if key != "profiler"}
+
+
+def list_profiles():
+    with _lock:
+        return [summary(entry) for entry in reversed(_profiles.values())]
+
+
+def get_profile(profile_id):
+    with _lock:
+        return _profiles.get(profile_id)
+
+
+def render_text(entry, sort=None, limit=None):
+    out = io.StringIO()
+    stats = pstats.Stats(entry["profiler"], stream=out)
+    stats.strip_dirs().sort_stats(sort or settings["sort"]).print_stats(limit or settings["limit"])
+    return out.getvalue()
+
+
+def render_pstats(entry):
+    # Same format as cProfile's dump_stats, loadable with pstats or snakeviz
+    entry["profiler"].create_stats()
+    return marshal.dumps(entry["profiler"].stats)
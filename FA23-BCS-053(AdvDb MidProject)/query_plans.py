@@ -0,0 +1,380 @@
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+import app
+import dedup
+import rollups
+import track_codec
+
+
+# Query-plan regression check. Seeds a scratch database with the same indexes
+# init_indexes creates, then runs explain("executionStats") on every query
+# shape the app issues. A shape fails when it:
+#
+#   * uses a COLLSCAN, unless it is marked as reading the whole collection;
+#   * examines more documents or index keys per returned document than its
+#     limit; or
+#   * examines more keys than the stored baseline, plus TOLERANCE.
+#
+# Run after changing a query or an index, and commit the updated baseline
+# together with the change:
+#
+#   python query_plans.py                      # check against the baseline
+#   python query_plans.py --update-baseline    # accept the current plans
+
+DEFAULT_URI = "mongodb://localhost:27017/flightaware_query_plans"
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plans_baseline.json")
+TOLERANCE = 0.25
+AIRPORTS = ("LHE", "ISB", "KHI", "DXB", "JFK", "LHR", "CDG", "FRA")
+AIRCRAFT_TYPES = ("B737", "A320", "B777", "A380", "B787", "A350")
+
+
+class Shape:
+    # One query as the app sends it. `whole` names why reading every document
+    # is expected; such shapes may COLLSCAN but must return what they read.
+    # Aggregations can have $group pushed into the query plan, in which case
+    # nReturned counts groups, so their ratios are set loosely.
+
+    def __init__(self, name, collection, filter=None, projection=None, sort=None, skip=0, limit=0,
+                 pipeline=None, whole=None, max_docs_ratio=2.0, max_keys_ratio=4.0):
+        self.name = name
+        self.collection = collection
+        self.filter = filter or {}
+        self.projection = projection
+        self.sort = sort
+        self.skip = skip
+        self.limit = limit
+        self.pipeline = pipeline
+        self.whole = whole
+        self.max_docs_ratio = max_docs_ratio
+        self.max_keys_ratio = max_keys_ratio
+
+    def command(self):
+        if self.pipeline is not None:
+            return {"aggregate": self.collection, "pipeline": self.pipeline, "cursor": {}}
+        command = {"find": self.collection, "filter": self.filter}
+        if self.projection:
+            command["projection"] = self.projection
+        if self.sort:
+            command["sort"] = dict(self.sort)
+        if self.skip:
+            command["skip"] = self.skip
+        if self.limit:
+            command["limit"] = self.limit
+        return command
+
+
+def ts(value):
+    return app.format_event_time(value)
+
+
+def seed(db, active=2000, archived=20000, tiered=5000, seed_value=7):
+    random.seed(seed_value)
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+
+    now = datetime.utcnow()
+    db.airports.insert_many([{"code": code, "name": f"{code} airport", "lat": random.uniform(-50, 60),
+                              "lon": random.uniform(-170, 170)} for code in AIRPORTS])
+    db.aircraft.insert_many([{"tail_number": f"AP-{n:04d}", "aircraft_type": random.choice(AIRCRAFT_TYPES),
+                              "airline": random.choice(("PIA", "EK", "BA"))} for n in range(500)])
+
+    def flight(n, prefix, last_seen):
+        source, destination = random.sample(AIRPORTS, 2)
+        first_seen = last_seen - timedelta(minutes=random.randint(30, 600))
+        lat, lon = random.uniform(-50, 60), random.uniform(-170, 170)
+        updates = []
+        for i in range(5):
+            at = first_seen + (last_seen - first_seen) * i / 4
+            updates.append({
+                "lat": lat + i * 0.1, "lon": lon + i * 0.1, "altitude_m": 10000.0, "spd_kts": 450.0,
+                "heading": 90.0, "vertical_rate": 0.0, "ts": ts(at), "receiver_id": "R-SEED-001",
+                "coordinates": [lon + i * 0.1, lat + i * 0.1], "event_key": dedup.event_key({"ts": ts(at)}),
+            })
+        return {
+            "flight_id": f"{prefix}{n:06d}-{last_seen:%Y-%m-%d}",
+            "callsign": f"{prefix}{n % 900 + 100}",
+            "aircraft_type": random.choice(AIRCRAFT_TYPES),
+            "tail_number": f"AP-{n % 500:04d}",
+            "first_seen": ts(first_seen),
+            "last_seen": ts(last_seen),
+            "status": "active",
+            "source_airport": source,
+            "destination_airport": destination,
+            "current_position": updates[-1]["coordinates"],
+            "current_altitude_m": 10000.0,
+            "updates": updates,
+        }
+
+    db.flight_updates.insert_many([
+        flight(n, "ACT", now - timedelta(seconds=random.randint(0, 600))) for n in range(active)
+    ])
+
+    logs = []
+    for n in range(archived):
+        doc = flight(n, "ARC", now - timedelta(hours=random.uniform(1, 24 * 60)))
+        doc.update(status="completed", completed_at=doc["last_seen"], total_distance_km=random.uniform(100, 9000))
+        doc.pop("current_position")
+        doc.pop("current_altitude_m")
+        logs.append(track_codec.compress_flight(doc))
+    db.flight_logs.insert_many(logs)
+    for collection, ops in _rollup_ops(logs).items():
+        db[collection].bulk_write(ops, ordered=False)
+
+    db.flight_log_tier.insert_many([
+        {"flight_id": f"TIER{n:06d}", "callsign": f"TIER{n % 900 + 100}", "tail_number": f"AP-{n % 500:04d}",
+         "completed_at": ts(now - timedelta(days=90 + n % 300)), "path": "seed.arrow", "row": n}
+        for n in range(tiered)
+    ])
+
+    db.geofences.insert_many([
+        {"name": f"fence-{n}", "type": "circle", "kind": "airport" if n % 2 else "custom",
+         "center": [random.uniform(-170, 170), random.uniform(-50, 60)], "radius_km": 20.0}
+        for n in range(200)
+    ])
+    fence_ids = [str(doc["_id"]) for doc in db.geofences.find({}, {"_id": 1})]
+    db.geofence_events.insert_many([
+        {"flight_id": f"ACT{random.randrange(active):06d}", "fence_id": random.choice(fence_ids),
+         "event": random.choice(("enter", "exit")), "ts": ts(now - timedelta(seconds=random.randint(0, 86400)))}
+        for _ in range(20000)
+    ])
+
+    app.init_indexes(db)
+
+
+def _rollup_ops(flights):
+    ops = {}
+    for flight in flights:
+        for collection, op in rollups.rollup_updates(flight):
+            ops.setdefault(collection, []).append(op)
+    return ops
+
+
+def shapes(db):
+    now = datetime.utcnow()
+    sample_active = db.flight_updates.find_one({}, {"flight_id": 1, "callsign": 1})
+    sample_archived = db.flight_logs.find_one({}, {"flight_id": 1})
+    fence_id = db.geofences.find_one({}, {"_id": 1})["_id"]
+    flight_id = sample_active["flight_id"]
+    at = ts(now - timedelta(minutes=5))
+    day_ago = ts(now - timedelta(days=1))
+    week_ago = ts(now - timedelta(days=7))
+    # Near the start of the seeded archive, where nearly every flight ended later
+    old = ts(now - timedelta(days=55))
+    prefix = {"$regex": "^ARC00012"}
+    search = {"$or": [{field: prefix} for field in app.SEARCH_FIELDS]}
+    board = ("destination_airport", "DXB")
+    # A cursor 90% of the way through the archive, where an offset page would
+    # have to skip most of the index
+    deep = next(db.flight_logs.find({}, {"completed_at": 1, "flight_id": 1}).sort(app.ARCHIVED_PAGE_SORT)
+                .skip(db.flight_logs.count_documents({}) * 9 // 10).limit(1))
+    deep_cursor = (deep["completed_at"], deep["flight_id"])
+
+    return [
+        # Single-flight lookups
+        Shape("airport_by_code", "airports", {"code": "LHE"}, {"_id": 0}, limit=1),
+        Shape("aircraft_by_tail", "aircraft", {"tail_number": "AP-0001"}, {"_id": 0}, limit=1),
+        Shape("active_by_id", "flight_updates", {"flight_id": flight_id}, limit=1),
+        Shape("archived_by_id", "flight_logs", {"flight_id": sample_archived["flight_id"]}, limit=1),
+        Shape("tier_pointer_by_id", "flight_log_tier", {"flight_id": "TIER000042"}, limit=1),
+        Shape("ingest_dedup_guard", "flight_updates", dedup.guard_filter(flight_id, dedup.event_key({"ts": at})), limit=1),
+        Shape("fence_states", "flight_updates", {"flight_id": {"$in": [flight_id, "ACT000002-x"]}},
+              {"flight_id": 1, "last_seen": 1, "geofences": 1}),
+
+        # Listings
+        Shape("active_page", "flight_updates", {}, {"_id": 0}, sort=app.ACTIVE_PAGE_SORT, limit=101),
+        Shape("archived_page", "flight_logs", {}, {"_id": 0}, sort=app.ARCHIVED_PAGE_SORT, limit=101),
+        Shape("archived_page_deep", "flight_logs", app.page_after(app.ARCHIVED_PAGE_SORT, deep_cursor), {"_id": 0},
+              sort=app.ARCHIVED_PAGE_SORT, limit=101),
+        # The deepest offset /api/flights still accepts skips MAX_LIST_OFFSET keys
+        Shape("archived_page_max_offset", "flight_logs", {}, {"_id": 0}, sort=app.ARCHIVED_PAGE_SORT,
+              skip=app.MAX_LIST_OFFSET, limit=101, max_docs_ratio=12.0, max_keys_ratio=12.0),
+        Shape("all_flights_first", "flight_logs", app.page_after(app.ARCHIVED_PAGE_SORT, None),
+              app.LISTING_PROJECTION, sort=app.ARCHIVED_PAGE_SORT, limit=app.ALL_FLIGHTS_PAGE_SIZE + 1),
+        Shape("all_flights_deep", "flight_logs", app.page_after(app.ARCHIVED_PAGE_SORT, deep_cursor),
+              app.LISTING_PROJECTION, sort=app.ARCHIVED_PAGE_SORT, limit=app.ALL_FLIGHTS_PAGE_SIZE + 1),
+        Shape("active_all", "flight_updates", {}, {"_id": 0}, whole="/api/flights/active returns every active flight"),
+        Shape("airports_all", "airports", {}, {"_id": 0}, whole="/api/airports lists every airport"),
+        Shape("aircraft_all", "aircraft", {}, {"_id": 0}, whole="/api/aircraft lists every aircraft"),
+        Shape("statistics_archived", "flight_logs", {}, {"_id": 0, "first_seen": 1, "last_seen": 1, "total_distance_km": 1},
+              whole="/api/statistics averages over every archived flight"),
+
+        # Geospatial and time windows
+        Shape("nearby", "flight_updates", app.nearby_query(31.5, 74.4, 2000), {"_id": 0},
+              max_docs_ratio=3.0, max_keys_ratio=50.0),
+        Shape("viewport", "flight_updates", app.viewport_query(20, 50, 40, 80), max_docs_ratio=3.0, max_keys_ratio=50.0),
+        Shape("viewport_antimeridian", "flight_updates", app.viewport_query(-20, 170, 20, -170),
+              max_docs_ratio=3.0, max_keys_ratio=50.0),
+        Shape("conflict_reload", "flight_updates", {"last_seen": {"$gte": at}, "current_position": {"$exists": True}},
+              {"_id": 0, "flight_id": 1, "current_position": 1, "current_altitude_m": 1, "last_seen": 1}),
+        Shape("snapshot_archived", "flight_logs", app.airborne_query(day_ago, day_ago),
+              {**app.SNAPSHOT_PROJECTION, "track": 1}, limit=app.MAX_SNAPSHOT_FLIGHTS + 1, max_keys_ratio=50.0),
+        Shape("snapshot_archived_old", "flight_logs", app.airborne_query(old, old),
+              {**app.SNAPSHOT_PROJECTION, "track": 1}, limit=app.MAX_SNAPSHOT_FLIGHTS + 1, max_keys_ratio=50.0),
+        Shape("snapshot_active", "flight_updates", pipeline=[
+            {"$match": app.airborne_query(at, at)}, {"$limit": app.MAX_SNAPSHOT_FLIGHTS + 1},
+            {"$project": app.SNAPSHOT_PROJECTION},
+        ], max_keys_ratio=20.0),
+        Shape("tier_candidates", "flight_logs", {"completed_at": {"$lt": week_ago}}, sort=[("completed_at", 1)], limit=1000),
+
+        # Boards, search, export
+        Shape("board_in_progress", "flight_updates", {board[0]: board[1], "status": {"$in": app.BOARD_STATUSES}},
+              app.BOARD_FIELDS, sort=[("last_seen", -1)], limit=50),
+        Shape("board_completed", "flight_logs", {board[0]: board[1], "status": "completed", "completed_at": {"$gte": day_ago}},
+              app.BOARD_FIELDS, sort=[("completed_at", -1)], limit=50),
+        *[Shape(f"search_{collection}", collection, search, app.SEARCH_PROJECTION, limit=10)
+          for collection, _ in app.SEARCH_SOURCES],
+        # The $or branches use the board indexes, which bound the airport but not the window
+        Shape("export_airport_window", "flight_logs", app.export_query(week_ago, day_ago, "LHE", None), {"_id": 0},
+              max_keys_ratio=12.0, max_docs_ratio=12.0),
+        Shape("export_aircraft_type", "flight_logs", app.export_query(week_ago, None, None, "A380"), {"_id": 0}),
+
+        # Geofences
+        Shape("geofences_reload", "geofences", {}, whole="every worker indexes all fences"),
+        Shape("geofences_by_name", "geofences", {}, sort=[("name", 1)]),
+        Shape("geofence_events_latest", "geofence_events", {}, {"_id": 0}, sort=[("ts", -1)], limit=100),
+        Shape("geofence_events_by_flight", "geofence_events", {"flight_id": flight_id}, {"_id": 0}, sort=[("ts", -1)], limit=100),
+        Shape("geofence_events_by_fence", "geofence_events", {"fence_id": str(fence_id)}, {"_id": 0}, sort=[("ts", -1)], limit=100),
+
+        # Rollups
+        Shape("route_stats", rollups.GRANULARITIES["daily"][0], pipeline=rollups.route_pipeline(
+            {"source": "LHE", "destination": "DXB", "from": week_ago}, "daily"), max_keys_ratio=20.0),
+        Shape("route_stats_aircraft", rollups.GRANULARITIES["daily"][0], pipeline=rollups.route_pipeline(
+            {"aircraft_type": "A380", "from": week_ago}, "daily"), max_keys_ratio=50.0, max_docs_ratio=50.0),
+        Shape("airport_stats", rollups.GRANULARITIES["hourly"][0], pipeline=rollups.airport_pipeline(
+            {"from": day_ago}, "hourly"), max_keys_ratio=50.0, max_docs_ratio=50.0),
+    ]
+
+
+def _find(node, key):
+    # First value stored under `key` anywhere in a nested explain document
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        node = list(node.values())
+    if isinstance(node, list):
+        for value in node:
+            found = _find(value, key)
+            if found is not None:
+                return found
+    return None
+
+
+def _stages(plan):
+    stages = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            stages.append(node["stage"])
+        for key in ("inputStage", "queryPlan", "thenStage", "elseStage", "outerStage", "innerStage"):
+            if key in node:
+                stack.append(node[key])
+        stack.extend(node.get("inputStages", []))
+    return stages
+
+
+def explain(db, shape):
+    result = db.command({"explain": shape.command(), "verbosity": "executionStats"})
+    stats = _find(result, "executionStats") or {}
+    return {
+        "stages": sorted(set(_stages(_find(result, "winningPlan") or {}))),
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "docs_examined": stats.get("totalDocsExamined", 0),
+        "returned": stats.get("nReturned", 0),
+    }
+
+
+def check(shape, plan, baseline):
+    problems = []
+    returned = max(plan["returned"], 1)
+
+    if "COLLSCAN" in plan["stages"]:
+        if not shape.whole:
+            problems.append("COLLSCAN")
+        elif plan["docs_examined"] > returned:
+            problems.append(f"COLLSCAN reads {plan['docs_examined']} docs to return {plan['returned']}")
+    else:
+        if plan["docs_examined"] / returned > shape.max_docs_ratio:
+            problems.append(f"docs examined/returned {plan['docs_examined'] / returned:.1f} > {shape.max_docs_ratio}")
+        if plan["keys_examined"] / returned > shape.max_keys_ratio:
+            problems.append(f"keys examined/returned {plan['keys_examined'] / returned:.1f} > {shape.max_keys_ratio}")
+
+    if baseline:
+        allowed = baseline["keys_examined"] * (1 + TOLERANCE) + 10
+        if plan["keys_examined"] > allowed:
+            problems.append(f"keys examined {plan['keys_examined']} > baseline {baseline['keys_examined']}")
+        if "COLLSCAN" in plan["stages"] and "COLLSCAN" not in baseline["stages"]:
+            problems.append("new COLLSCAN since baseline")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain every app query shape and check for plan regressions")
+    parser.add_argument("--uri", default=DEFAULT_URI, help="scratch database; it is dropped and reseeded")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data from a previous run")
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db = client.get_default_database()
+    if db.name == "flightaware_db":
+        parser.error("refusing to reseed the application database; point --uri at a scratch database")
+
+    if not args.no_seed:
+        print(f"🌱 Seeding {db.name}...")
+        seed(db)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif not args.update_baseline:
+        # Without a baseline the keys-examined and new-COLLSCAN checks cannot run
+        print(f"❌ No baseline at {args.baseline}; run with --update-baseline and commit it")
+        sys.exit(2)
+
+    results = {}
+    failures = 0
+    print("=" * 78)
+    print(f"{'shape':<28} {'plan':<24} {'keys':>7} {'docs':>7} {'ret':>6}")
+    print("=" * 78)
+    for shape in shapes(db):
+        plan = explain(db, shape)
+        results[shape.name] = plan
+        if args.update_baseline:
+            problems = check(shape, plan, None)
+        elif shape.name not in baseline:
+            problems = check(shape, plan, None) + ["no baseline entry; run --update-baseline"]
+        else:
+            problems = check(shape, plan, baseline[shape.name])
+        failures += bool(problems)
+        mark = "❌" if problems else "✅"
+        stages = ",".join(stage for stage in plan["stages"] if stage not in ("FETCH", "PROJECTION_SIMPLE", "LIMIT"))
+        print(f"{mark} {shape.name:<26} {stages[:24]:<24} {plan['keys_examined']:>7} "
+              f"{plan['docs_examined']:>7} {plan['returned']:>6}")
+        for problem in problems:
+            print(f"     {problem}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n📝 Baseline written to {args.baseline}")
+
+    print(f"\n{len(results) - failures}/{len(results)} query shapes pass")
+    client.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
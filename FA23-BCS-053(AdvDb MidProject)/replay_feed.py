@@ -0,0 +1,210 @@
+import argparse
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+
+import requests
+
+import capture
+
+
+# Replays a capture written with FLIGHTAWARE_CAPTURE_PATH against a server,
+# merging the per-worker files back into arrival order, compressed in time by --speed. Reports are split into lanes by a hash of
+# their flight_id; each lane sends its reports in capture order. Per-flight
+# order is therefore kept, and the same capture and options always give the
+# same requests in the same order.
+
+TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def load(paths, limit=None):
+    # [(offset seconds from the first record, report)] in capture order
+    reports = []
+    malformed = 0
+    first_at = None
+    for at, kind, payload in capture.read_all(paths):
+        if first_at is None:
+            first_at = at
+        try:
+            batch = capture.reports(kind, payload)
+        except ValueError:
+            malformed += 1
+            continue
+        reports.extend((at - first_at, report) for report in batch)
+        if limit and len(reports) >= limit:
+            return reports[:limit], malformed
+    return reports, malformed
+
+
+def event_time(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def first_event_time(reports):
+    for _, report in reports:
+        try:
+            return event_time(report['ts'])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+    return None
+
+
+def rewrite(report, id_suffix, first_ts, replay_start, speed):
+    # Copies a report with its flight_id suffixed and its event time moved to
+    # the replay clock, compressed by the same speed as the schedule
+    report = dict(report)
+    if id_suffix and isinstance(report.get('flight_id'), str):
+        report['flight_id'] += id_suffix
+    if first_ts is not None and report.get('ts') is not None:
+        try:
+            shifted = replay_start + (event_time(report['ts']) - first_ts) / speed
+            report['ts'] = shifted.strftime(TS_FORMAT)
+        except (TypeError, ValueError, AttributeError):
+            pass
+    return report
+
+
+def plan(reports, lanes, mode, batch_size, batch_window):
+    # Per lane: [(due offset, [reports])]. A batch closes at batch_size reports
+    # or once it would span more than batch_window capture seconds, and is due
+    # when its last report arrived
+    schedule = [[] for _ in range(lanes)]
+    open_batches = [None] * lanes
+    for offset, report in reports:
+        lane = zlib.crc32(str(report.get('flight_id')).encode()) % lanes
+        if mode == "single":
+            schedule[lane].append((offset, [report]))
+            continue
+        current = open_batches[lane]
+        if current is not None and (len(current[2]) >= batch_size or offset - current[0] > batch_window):
+            schedule[lane].append((current[1], current[2]))
+            current = None
+        if current is None:
+            current = open_batches[lane] = [offset, offset, []]
+        current[1] = offset
+        current[2].append(report)
+    for lane, current in enumerate(open_batches):
+        if current is not None:
+            schedule[lane].append((current[1], current[2]))
+    return schedule
+
+
+def run(base_url, paths, speed, mode, lanes, batch_size, batch_window, id_suffix, shift_time, limit, timeout):
+    reports, malformed = load(paths, limit)
+    if not reports:
+        print(f"❌ No reports in {' '.join(paths)}")
+        return
+
+    schedule = plan(reports, lanes, mode, batch_size, batch_window)
+    url = f"{base_url}/api/ingest" if mode == "single" else f"{base_url}/api/flights/batch-ingest"
+    first_ts = first_event_time(reports) if shift_time else None
+
+    latencies = []
+    lags = []
+    statuses = Counter()
+    sent_reports = [0]
+    accepted_reports = [0]
+    lock = threading.Lock()
+
+    replay_start = datetime.utcnow()
+    started = time.perf_counter()
+
+    def lane_worker(items):
+        session = requests.Session()
+        for due, batch in items:
+            due_at = started + due / speed
+            delay = due_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lag = time.perf_counter() - due_at
+
+            payload = [rewrite(report, id_suffix, first_ts, replay_start, speed) for report in batch]
+            body = payload[0] if mode == "single" else {"updates": payload}
+            sent = time.perf_counter()
+            try:
+                status = session.post(url, data=json.dumps(body), timeout=timeout,
+                                      headers={"Content-Type": "application/json"}).status_code
+            except requests.exceptions.RequestException:
+                status = "error"
+            elapsed = time.perf_counter() - sent
+
+            with lock:
+                latencies.append(elapsed)
+                lags.append(max(0.0, lag))
+                statuses[status] += 1
+                sent_reports[0] += len(batch)
+                if status != "error" and status < 400:
+                    accepted_reports[0] += len(batch)
+
+    threads = [threading.Thread(target=lane_worker, args=(items,), daemon=True) for items in schedule if items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    span = reports[-1][0]
+    target = len(reports) / (span / speed) if span > 0 else float("inf")
+
+    print("=" * 60)
+    print(f"🔁 REPLAY {' '.join(paths)} → {url}")
+    print(f"   {speed:g}× speed, {mode} mode, {len(threads)} lanes"
+          + (f", batches ≤{batch_size}" if mode == "batch" else ""))
+    print("=" * 60)
+    print(f"   Reports:     {sent_reports[0]:,} in {len(latencies):,} requests ({malformed} malformed records skipped)")
+    print(f"   Capture:     {span:.1f}s → replayed in {wall:.1f}s")
+    print(f"   Rate:        {accepted_reports[0] / wall:,.1f} reports/s accepted, {target:,.1f} reports/s scheduled")
+    print(f"   Latency:     p50={percentile(latencies, 50) * 1000:.1f}ms p95={percentile(latencies, 95) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"   Behind plan: p50={percentile(lags, 50) * 1000:.1f}ms p99={percentile(lags, 99) * 1000:.1f}ms")
+    print(f"   Status:      {', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str))}")
+    if statuses[429]:
+        print(f"   ⚠️ {statuses[429]:,} requests were throttled (429) and their reports not stored; "
+              "see DEPLOYMENT.md to lift the limits for a replay")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured ingest feed faster than real time")
+    parser.add_argument("capture_paths", nargs="+", help="the per-worker capture files, e.g. ingest.cap.*")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--speed", type=float, default=1.0, help="1-100× real time")
+    parser.add_argument("--mode", choices=("single", "batch"), default="single")
+    parser.add_argument("--lanes", type=int, default=8, help="concurrent senders")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--batch-window", type=float, default=1.0,
+                        help="capture seconds a batch may span before it is sent")
+    parser.add_argument("--id-suffix", default="",
+                        help="appended to every flight_id; use a new one per run so reports are not deduplicated")
+    parser.add_argument("--keep-time", action="store_true",
+                        help="send the captured ts unchanged instead of moving it to the replay clock")
+    parser.add_argument("--limit", type=int, help="replay only the first N reports")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if not 1 <= args.speed <= 100:
+        parser.error("--speed must be between 1 and 100")
+    if args.lanes < 1 or args.batch_size < 1:
+        parser.error("--lanes and --batch-size must be positive")
+
+    run(args.url.rstrip("/"), args.capture_paths, args.speed, args.mode, args.lanes, args.batch_size,
+        args.batch_window, args.id_suffix, not args.keep_time, args.limit, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+
+# Route/airport traffic rollups keyed by departure bucket, route and aircraft
+# type. They are bumped with $inc whenever a flight is archived and can be
+# rebuilt from flight_logs (plus the cold tier) with rebuild().
+
+GRANULARITIES = {
+    "hourly": ("route_rollups_hourly", 13),  # "2025-01-01T12"
+    "daily": ("route_rollups_daily", 10),    # "2025-01-01"
+}
+
+
+def duration_hours(flight):
+    try:
+        first = datetime.fromisoformat(flight['first_seen'].replace('Z', '+00:00'))
+        last = datetime.fromisoformat(flight['last_seen'].replace('Z', '+00:00'))
+        return (last - first).total_seconds() / 3600
+    except Exception:
+        return None
+
+
+def _key(flight, prefix_length):
+    return {
+        "bucket": (flight.get('first_seen') or "")[:prefix_length],
+        "source_airport": flight.get('source_airport'),
+        "destination_airport": flight.get('destination_airport'),
+        "aircraft_type": flight.get('aircraft_type'),
+    }
+
+
+def rollup_updates(flight):
+    # [(collection_name, UpdateOne)] for one archived flight
+    duration = duration_hours(flight)
+    increments = {
+        "flights": 1,
+        "distance_sum_km": flight.get('total_distance_km') or 0,
+        "duration_sum_hours": duration or 0,
+        "duration_count": 1 if duration is not None else 0,
+    }
+
+    ops = []
+    for collection, prefix_length in GRANULARITIES.values():
+        key = _key(flight, prefix_length)
+        ops.append((collection, UpdateOne(
+            {"_id": key},
+            {"$inc": increments, "$setOnInsert": key},
+            upsert=True
+        )))
+    return ops
+
+
+def record_flight(db, flight):
+    for collection, op in rollup_updates(flight):
+        db[collection].bulk_write([op])
+
+
+def _pipeline(collection, prefix_length):
+    def parse(field):
+        return {"$dateFromString": {
+            "dateString": {"$substrCP": [field, 0, 19]},
+            "format": "%Y-%m-%dT%H:%M:%S",
+            "onError": None,
+            "onNull": None,
+        }}
+
+    return [
+        {"$match": {"first_seen": {"$type": "string"}}},
+        {"$project": {
+            "bucket": {"$substrCP": ["$first_seen", 0, prefix_length]},
+            "source_airport": 1,
+            "destination_airport": 1,
+            "aircraft_type": 1,
+            "distance": {"$ifNull": ["$total_distance_km", 0]},
+            "duration": {"$divide": [{"$subtract": [parse("$last_seen"), parse("$first_seen")]}, 3600000]},
+        }},
+        {"$group": {
+            "_id": {
+                "bucket": "$bucket",
+                "source_airport": "$source_airport",
+                "destination_airport": "$destination_airport",
+                "aircraft_type": "$aircraft_type",
+            },
+            "flights": {"$sum": 1},
+            "distance_sum_km": {"$sum": "$distance"},
+            "duration_sum_hours": {"$sum": {"$ifNull": ["$duration", 0]}},
+            "duration_count": {"$sum": {"$cond": [{"$eq": [{"$ifNull": ["$duration", None]}, None]}, 0, 1]}},
+        }},
+        {"$set": {
+            "bucket": "$_id.bucket",
+            "source_airport": "$_id.source_airport",
+            "destination_airport": "$_id.destination_airport",
+            "aircraft_type": "$_id.aircraft_type",
+        }},
+        {"$out": collection},
+    ]
+
+
+def rebuild(db, tier_tables=()):
+    # $out swaps each rollup collection atomically and keeps its indexes
+    for collection, prefix_length in GRANULARITIES.values():
+        list(db.flight_logs.aggregate(_pipeline(collection, prefix_length), allowDiskUse=True))
+
+    # Flights already moved to the cold tier are folded back in from their columns
+    tiered = 0
+    for table in tier_tables:
+        ops = {collection: [] for collection, _ in GRANULARITIES.values()}
+        for row in table.to_pylist():
+            for collection, op in rollup_updates(row):
+                ops[collection].append(op)
+            tiered += 1
+        for collection, batch in ops.items():
+            if batch:
+                db[collection].bulk_write(batch, ordered=False)
+    return tiered
+
+
+def _range_match(args, granularity):
+    match = {}
+    for field, param in (("source_airport", "source"), ("destination_airport", "destination"),
+                         ("aircraft_type", "aircraft_type")):
+        value = args.get(param)
+        if value:
+            match[field] = value.upper() if field != "aircraft_type" else value
+
+    _, prefix_length = GRANULARITIES[granularity]
+    bucket = {}
+    if args.get('from'):
+        bucket["$gte"] = args.get('from')[:prefix_length]
+    if args.get('to'):
+        bucket["$lte"] = args.get('to')[:prefix_length]
+    if bucket:
+        match["bucket"] = bucket
+    return match
+
+
+def _averages(doc):
+    flights = doc.get("flights") or 0
+    count = doc.pop("duration_count", 0) or 0
+    doc["average_duration_hours"] = round(doc.pop("duration_sum_hours", 0) / count, 2) if count else 0
+    doc["average_distance_km"] = round(doc.pop("distance_sum_km", 0) / flights, 2) if flights else 0
+    return doc
+
+
+def route_pipeline(args, granularity="daily", per_bucket=False, limit=100):
+    group_id = {"source_airport": "$source_airport", "destination_airport": "$destination_airport"}
+    if args.get('aircraft_type'):
+        group_id["aircraft_type"] = "$aircraft_type"
+    if per_bucket:
+        group_id["bucket"] = "$bucket"
+
+    return [
+        {"$match": _range_match(args, granularity)},
+        {"$group": {
+            "_id": group_id,
+            "flights": {"$sum": "$flights"},
+            "distance_sum_km": {"$sum": "$distance_sum_km"},
+            "duration_sum_hours": {"$sum": "$duration_sum_hours"},
+            "duration_count": {"$sum": "$duration_count"},
+        }},
+        {"$sort": {"_id.bucket": 1, "flights": -1} if per_bucket else {"flights": -1}},
+        {"$limit": limit},
+    ]
+
+
+def route_stats(db, args, granularity="daily", per_bucket=False, limit=100):
+    collection, _ = GRANULARITIES[granularity]
+    routes = []
+    for doc in db[collection].aggregate(route_pipeline(args, granularity, per_bucket, limit)):
+        key = doc.pop("_id")
+        routes.append(_averages({**key, **doc}))
+    return routes
+
+
+def airport_pipeline(args, granularity="daily", limit=20):
+    return [
+        {"$match": _range_match({"from": args.get('from'), "to": args.get('to')}, granularity)},
+        {"$project": {"legs": [
+            {"airport": "$source_airport", "departures": "$flights", "arrivals": {"$literal": 0}},
+            {"airport": "$destination_airport", "departures": {"$literal": 0}, "arrivals": "$flights"},
+        ]}},
+        {"$unwind": "$legs"},
+        {"$group": {
+            "_id": "$legs.airport",
+            "departures": {"$sum": "$legs.departures"},
+            "arrivals": {"$sum": "$legs.arrivals"},
+        }},
+        {"$set": {"total": {"$add": ["$departures", "$arrivals"]}}},
+        {"$sort": {"total": -1}},
+        {"$limit": limit},
+    ]
+
+
+def airport_stats(db, args, granularity="daily", limit=20):
+    collection, _ = GRANULARITIES[granularity]
+    return [
+        {"airport": doc["_id"], "departures": doc["departures"], "arrivals": doc["arrivals"], "total": doc["total"]}
+        for doc in db[collection].aggregate(airport_pipeline(args, granularity, limit))
+    ]
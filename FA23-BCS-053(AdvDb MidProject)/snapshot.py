@@ -0,0 +1,68 @@
+from bisect import bisect_left
+
+from track import Track
+
+
+# Fleet positions at an arbitrary instant. Tracks are sorted by event time,
+# so each flight needs one bisect and a linear interpolation between the two
+# reports around the requested time.
+
+METADATA = ("flight_id", "callsign", "aircraft_type", "source_airport", "destination_airport")
+
+
+def _lerp_angle(a, b, fraction, span):
+    # Shortest way round, for longitudes (span 360 centred on 0) and headings
+    delta = (b - a + span / 2) % span - span / 2
+    return a + fraction * delta
+
+
+def position_at(track, at):
+    # Interpolated position at `at` (epoch micros), None outside the track
+    ts_micros = track.ts
+    if not ts_micros or at < ts_micros[0] or at > ts_micros[-1]:
+        return None
+
+    i = bisect_left(ts_micros, at)
+    if ts_micros[i] == at:
+        a = b = i
+        fraction = 0.0
+    else:
+        a, b = i - 1, i
+        fraction = (at - ts_micros[a]) / (ts_micros[b] - ts_micros[a])
+
+    lat, alt, spd = track.lat, track.altitude_m, track.spd_kts
+    lon = _lerp_angle(track.lon[a], track.lon[b], fraction, 360)
+    return {
+        "lat": round(lat[a] + fraction * (lat[b] - lat[a]), 6),
+        "lon": round((lon + 180) % 360 - 180, 6),
+        "altitude_m": round(alt[a] + fraction * (alt[b] - alt[a]), 1),
+        "spd_kts": round(spd[a] + fraction * (spd[b] - spd[a]), 1),
+        "heading": round(_lerp_angle(track.heading[a], track.heading[b], fraction, 360) % 360, 1),
+        "interpolated": a != b,
+    }
+
+
+def flight_position(flight, state, at):
+    position = position_at(Track.from_flight(flight), at)
+    if position is None:
+        return None
+    return {**{name: flight.get(name) for name in METADATA}, "state": state, **position}
+
+
+def prepare(flights):
+    # [(metadata, state, track)] decoded once, for replays
+    prepared = []
+    for flight, state in flights:
+        track = Track.from_flight(flight)
+        if len(track):
+            prepared.append(({name: flight.get(name) for name in METADATA}, state, track))
+    return prepared
+
+
+def frame(prepared, at):
+    positions = []
+    for metadata, state, track in prepared:
+        position = position_at(track, at)
+        if position is not None:
+            positions.append({**metadata, "state": state, **position})
+    return positions
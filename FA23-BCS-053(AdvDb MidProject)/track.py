@@ -0,0 +1,212 @@
+import math
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+import track_codec
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# In-memory track as parallel typed columns instead of one dict per point.
+# Event times are epoch microseconds in an int64 array and the numeric fields
+# are float64 arrays, so a point costs 56 bytes plus a small receiver index
+# rather than a nine-key dict with boxed floats and a timestamp string.
+# Columns are plain `array` buffers; NumPy reads them without copying when it
+# is installed.
+
+EARTH_RADIUS_KM = 6371
+TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+FIELDS = tuple(field for field, _ in track_codec.COLUMNS)
+
+
+def to_micros(ts):
+    # ISO string or naive UTC datetime -> epoch microseconds
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace('Z', '+00:00')).replace(tzinfo=None)
+    return (ts - track_codec.EPOCH) // timedelta(microseconds=1)
+
+
+def format_micros(micros):
+    return (track_codec.EPOCH + timedelta(microseconds=micros)).strftime(TS_FORMAT)
+
+
+def path_distance_km(lats, lons):
+    # Sum of great-circle legs along the points, in order
+    if len(lats) < 2:
+        return 0.0
+    if np is not None:
+        lat = np.radians(np.asarray(lats, dtype=np.float64))
+        lon = np.radians(np.asarray(lons, dtype=np.float64))
+        a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+        return float(np.sum(2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)))) * EARTH_RADIUS_KM
+
+    total = 0.0
+    prev_lat, prev_lon = math.radians(lats[0]), math.radians(lons[0])
+    prev_cos = math.cos(prev_lat)
+    for i in range(1, len(lats)):
+        lat, lon = math.radians(lats[i]), math.radians(lons[i])
+        cos_lat = math.cos(lat)
+        a = math.sin((lat - prev_lat) / 2) ** 2 + prev_cos * cos_lat * math.sin((lon - prev_lon) / 2) ** 2
+        total += 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        prev_lat, prev_lon, prev_cos = lat, lon, cos_lat
+    return total * EARTH_RADIUS_KM
+
+
+class Track:
+    __slots__ = ("ts", "lat", "lon", "altitude_m", "spd_kts", "heading", "vertical_rate",
+                 "receivers", "receiver_index")
+
+    def __init__(self, ts=(), fields=None, receiver_ids=()):
+        fields = fields or {}
+        self.ts = array("q", ts)
+        for field in FIELDS:
+            setattr(self, field, array("d", fields.get(field, ())))
+        # Receivers are dictionary-encoded, as in the stored codec
+        self.receivers = []
+        self.receiver_index = array("i")
+        index = {}
+        for receiver in receiver_ids:
+            if receiver not in index:
+                index[receiver] = len(self.receivers)
+                self.receivers.append(receiver)
+            self.receiver_index.append(index[receiver])
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def from_updates(cls, updates):
+        # Raises ValueError when a point has a missing ts or non-numeric field
+        try:
+            return cls(
+                [to_micros(update['ts']) for update in updates],
+                {field: [float(update.get(field) or 0) for update in updates] for field in FIELDS},
+                [update.get('receiver_id') for update in updates],
+            )
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Track point cannot be represented: {e}")
+
+    @classmethod
+    def from_codec(cls, encoded):
+        if encoded.get("encoding") != track_codec.ENCODING:
+            raise ValueError(f"Unsupported track encoding: {encoded.get('encoding')}")
+        ts_micros, fields, receiver_ids = track_codec.decode_columns(encoded)
+        return cls(ts_micros, fields, receiver_ids)
+
+    @classmethod
+    def from_flight(cls, flight):
+        # Encoded archived track if present, otherwise the verbose updates
+        if flight.get('track'):
+            return cls.from_codec(flight['track'])
+        return cls.from_updates(flight.get('updates') or [])
+
+    def to_codec(self):
+        return track_codec.encode_columns(
+            self.ts, {field: getattr(self, field) for field in FIELDS}, self.receiver_ids()
+        )
+
+    def receiver_ids(self):
+        receivers = self.receivers
+        return [receivers[i] for i in self.receiver_index]
+
+    def point(self, i):
+        # One point in the stored update shape
+        lat, lon = self.lat[i], self.lon[i]
+        return {
+            "lat": lat,
+            "lon": lon,
+            "altitude_m": self.altitude_m[i],
+            "spd_kts": self.spd_kts[i],
+            "heading": self.heading[i],
+            "vertical_rate": self.vertical_rate[i],
+            "ts": format_micros(self.ts[i]),
+            "receiver_id": self.receivers[self.receiver_index[i]] if self.receivers else None,
+            "coordinates": [lon, lat],
+        }
+
+    def to_updates(self):
+        return [self.point(i) for i in range(len(self.ts))]
+
+    def nearest(self, ts_micros):
+        # Index of the point closest in time; the columns are sorted by ts
+        ts = self.ts
+        i = bisect_left(ts, ts_micros)
+        if i == 0:
+            return 0
+        if i == len(ts):
+            return i - 1
+        return i if ts[i] - ts_micros < ts_micros - ts[i - 1] else i - 1
+
+    def distance_km(self):
+        return path_distance_km(self.lat, self.lon)
+
+    def nbytes(self):
+        columns = (self.ts, self.receiver_index) + tuple(getattr(self, field) for field in FIELDS)
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+def _benchmark(flights=200, points=600):
+    import random
+    import sys
+    import time
+
+    def deep_size(update):
+        return sys.getsizeof(update) + sum(
+            sys.getsizeof(value) + (sum(sys.getsizeof(v) for v in value) if isinstance(value, list) else 0)
+            for value in update.values()
+        )
+
+    random.seed(5)
+    tracks = track_codec.sample_tracks(flights, points)
+
+    total = flights * points
+    dict_bytes = sum(sys.getsizeof(updates) + sum(deep_size(u) for u in updates) for updates in tracks)
+
+    started = time.perf_counter()
+    columnar = [Track.from_updates(updates) for updates in tracks]
+    convert = time.perf_counter() - started
+    track_bytes = sum(t.nbytes() for t in columnar)
+
+    def dict_distance(updates):
+        # The per-point haversine loop archival used before
+        total = 0.0
+        for i in range(1, len(updates)):
+            prev, curr = updates[i - 1], updates[i]
+            lat1, lat2 = math.radians(prev['lat']), math.radians(curr['lat'])
+            a = (math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2)
+                 * math.sin(math.radians(curr['lon'] - prev['lon']) / 2) ** 2)
+            total += EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        return total
+
+    started = time.perf_counter()
+    dict_total = sum(dict_distance(updates) for updates in tracks)
+    dicts = time.perf_counter() - started
+
+    started = time.perf_counter()
+    track_total = sum(t.distance_km() for t in columnar)
+    arrays = time.perf_counter() - started
+
+    probes = [columnar[0].ts[0] + random.randint(0, 10 * points) * 1_000_000 for _ in range(1000)]
+    started = time.perf_counter()
+    for t in columnar:
+        for probe in probes:
+            t.nearest(probe)
+    lookups = (time.perf_counter() - started) / (flights * len(probes))
+
+    print("=" * 60)
+    print(f"🧵 TRACK COLUMNS: {flights} flights × {points} points ({'numpy' if np is not None else 'pure python'})")
+    print("=" * 60)
+    print(f"   Dict per point:  {dict_bytes / total:7.0f} B/point")
+    print(f"   Track columns:   {track_bytes / total:7.0f} B/point ({dict_bytes / track_bytes:.0f}× smaller)")
+    print(f"   Convert:         {convert / total * 1e6:7.2f} µs/point (from updates)")
+    print(f"   Distance, dicts: {dicts * 1000:7.1f} ms")
+    print(f"   Distance, Track: {arrays * 1000:7.1f} ms (same result: {abs(dict_total - track_total) < 1e-6})")
+    print(f"   Nearest ts:      {lookups * 1e6:7.2f} µs/lookup")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,228 @@
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from bson import Binary
+
+
+# Columnar encoding for archived tracks. Each numeric field is quantised to an
+# integer, delta-encoded against the previous point and stored as a packed
+# little-endian array; all columns are then zlib-compressed into one binary
+# field. Receiver ids are dictionary-encoded. The redundant `coordinates`
+# copy is rebuilt from lat/lon on decode.
+
+ENCODING = "delta-zlib-v1"
+EPOCH = datetime(1970, 1, 1)
+
+# field, quantisation scale
+COLUMNS = (
+    ("lat", 1e6),
+    ("lon", 1e6),
+    ("altitude_m", 10),
+    ("spd_kts", 10),
+    ("heading", 10),
+    ("vertical_rate", 10),
+)
+
+
+def _to_little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _parse_ts(ts):
+    return datetime.fromisoformat(ts.rstrip('Z'))
+
+
+def _format_ts(micros):
+    # Same fixed-width form ingest stores, so decoded tracks sort as strings
+    return (EPOCH + timedelta(microseconds=micros)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _deltas(values):
+    previous = 0
+    out = array("q")
+    for value in values:
+        out.append(value - previous)
+        previous = value
+    return out
+
+
+def encode_columns(ts_micros, fields, receiver_ids):
+    # Same payload as encode_updates, from columns that are already parsed.
+    # Raises OverflowError (inf, or too large for int64 once quantised) or
+    # ValueError (NaN) for values the columns cannot hold
+    receivers = []
+    receiver_index = {}
+    receiver_column = array("q")
+    for receiver in receiver_ids:
+        if receiver not in receiver_index:
+            receiver_index[receiver] = len(receivers)
+            receivers.append(receiver)
+        receiver_column.append(receiver_index[receiver])
+
+    columns = [_deltas(ts_micros)]
+    for field, scale in COLUMNS:
+        columns.append(_deltas(round(value * scale) for value in fields[field]))
+    columns.append(receiver_column)
+
+    payload = b"".join(_to_little_endian(column).tobytes() for column in columns)
+    return {
+        "encoding": ENCODING,
+        "count": len(ts_micros),
+        "receivers": receivers,
+        "data": Binary(zlib.compress(payload, 6)),
+    }
+
+
+def encode_updates(updates):
+    # Returns None when a point cannot be represented (non-numeric, NaN,
+    # infinite or out-of-range fields)
+    try:
+        ts_micros = [
+            (_parse_ts(update['ts']) - EPOCH) // timedelta(microseconds=1)
+            for update in updates
+        ]
+        fields = {
+            field: [float(update.get(field) or 0) for update in updates]
+            for field, _ in COLUMNS
+        }
+        receiver_ids = [update.get('receiver_id') for update in updates]
+        return encode_columns(ts_micros, fields, receiver_ids)
+    except (KeyError, TypeError, ValueError, AttributeError, OverflowError):
+        return None
+
+
+def decode_columns(track):
+    # Returns (ts_micros, {field: values}, receiver_ids) as plain lists
+    count = track["count"]
+    payload = zlib.decompress(bytes(track["data"]))
+    width = count * 8
+
+    def column(position):
+        values = array("q")
+        values.frombytes(payload[position * width:(position + 1) * width])
+        return _to_little_endian(values)
+
+    ts_micros = list(accumulate(column(0)))
+    fields = {}
+    for position, (field, scale) in enumerate(COLUMNS, start=1):
+        fields[field] = [value / scale for value in accumulate(column(position))]
+    receivers = track["receivers"]
+    receiver_ids = [receivers[i] for i in column(len(COLUMNS) + 1)]
+    return ts_micros, fields, receiver_ids
+
+
+def decode_updates(track):
+    if track.get("encoding") != ENCODING:
+        raise ValueError(f"Unsupported track encoding: {track.get('encoding')}")
+
+    ts_micros, fields, receiver_ids = decode_columns(track)
+    lats, lons = fields["lat"], fields["lon"]
+    return [
+        {
+            "lat": lats[i],
+            "lon": lons[i],
+            "altitude_m": fields["altitude_m"][i],
+            "spd_kts": fields["spd_kts"][i],
+            "heading": fields["heading"][i],
+            "vertical_rate": fields["vertical_rate"][i],
+            "ts": _format_ts(ts_micros[i]),
+            "receiver_id": receiver_ids[i],
+            "coordinates": [lons[i], lats[i]],
+        }
+        for i in range(track["count"])
+    ]
+
+
+def compress_flight(flight):
+    updates = flight.get('updates')
+    if not updates:
+        return flight
+    track = encode_updates(updates)
+    if track is not None:
+        flight['track'] = track
+        del flight['updates']
+    return flight
+
+
+def expand_flight(flight):
+    if flight and 'track' in flight:
+        flight['updates'] = decode_updates(flight.pop('track'))
+    return flight
+
+
+def sample_tracks(flights, points):
+    # Synthetic cruise tracks in the stored update shape, one list per flight,
+    # for the benchmarks here and in track.py
+    import random
+
+    tracks = []
+    for n in range(flights):
+        start = datetime(2025, 1, 1) + timedelta(minutes=n)
+        lat, lon = 31.5 + random.uniform(-1, 1), 74.4 + random.uniform(-1, 1)
+        updates = []
+        for i in range(points):
+            lat += random.uniform(-0.01, 0.03)
+            lon += random.uniform(-0.05, 0.01)
+            updates.append({
+                "lat": round(lat, 4), "lon": round(lon, 4),
+                "altitude_m": float(random.randint(9000, 11000)),
+                "spd_kts": float(random.randint(430, 480)),
+                "heading": round(random.uniform(250, 270), 1),
+                "vertical_rate": float(random.randint(-50, 50)),
+                "ts": _format_ts((start + timedelta(seconds=10 * i) - EPOCH) // timedelta(microseconds=1)),
+                "receiver_id": f"R-LHE-{random.randint(1, 5):03d}",
+                "coordinates": [round(lon, 4), round(lat, 4)],
+            })
+        tracks.append(updates)
+    return tracks
+
+
+def _benchmark(flights=200, points=600):
+    import time
+
+    import bson
+
+    docs = [
+        {"flight_id": f"BENCH{n}-2025-01-01", "status": "completed", "updates": updates}
+        for n, updates in enumerate(sample_tracks(flights, points))
+    ]
+
+    verbose = [bson.encode(doc) for doc in docs]
+    compact = [bson.encode(compress_flight(dict(doc))) for doc in docs]
+
+    started = time.perf_counter()
+    for raw in verbose:
+        bson.decode(raw)
+    verbose_read = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for raw in compact:
+        expand_flight(bson.decode(raw))
+    compact_read = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for raw in compact:
+        decode_columns(bson.decode(raw)["track"])
+    columnar_read = time.perf_counter() - started
+
+    verbose_bytes = sum(len(raw) for raw in verbose)
+    compact_bytes = sum(len(raw) for raw in compact)
+
+    print("=" * 60)
+    print(f"📦 TRACK ENCODING: {flights} flights × {points} points")
+    print("=" * 60)
+    print(f"   Verbose BSON:  {verbose_bytes / 1024:,.0f} KiB ({verbose_bytes / (flights * points):.1f} B/point)")
+    print(f"   {ENCODING}: {compact_bytes / 1024:,.0f} KiB ({compact_bytes / (flights * points):.1f} B/point)")
+    print(f"   Reduction:     {(1 - compact_bytes / verbose_bytes) * 100:.1f}%")
+    print(f"   Read verbose:  {verbose_read * 1000:.1f} ms")
+    print(f"   Read + expand: {compact_read * 1000:.1f} ms (dicts, same shape as verbose)")
+    print(f"   Read columns:  {columnar_read * 1000:.1f} ms (no per-point dicts)")
+
+
+if __name__ == "__main__":
+    _benchmark()
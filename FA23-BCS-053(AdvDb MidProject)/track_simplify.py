@@ -0,0 +1,115 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DEFAULT_MAX_POINTS = 2000
+
+
+def tolerance_for_zoom(zoom, pixels=1.0):
+    # Degrees covered by `pixels` screen pixels on a 256px web-mercator tile
+    zoom = max(0, min(22, int(zoom)))
+    return pixels * 360.0 / (256 * 2 ** zoom)
+
+
+def _project(lats, lons):
+    # Equirectangular projection around the track's mean latitude, in degrees
+    scale = math.cos(math.radians(sum(lats) / len(lats)))
+    return [lon * scale for lon in lons], list(lats)
+
+
+def _douglas_peucker_numpy(xs, ys, tolerance):
+    x = np.asarray(xs, dtype=np.float64)
+    y = np.asarray(ys, dtype=np.float64)
+    keep = np.zeros(len(x), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(x) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        dx = x[end] - x[start]
+        dy = y[end] - y[start]
+        px = x[start + 1:end] - x[start]
+        py = y[start + 1:end] - y[start]
+        length = math.hypot(dx, dy)
+
+        # Perpendicular distance of every interior point to the chord at once
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / length
+
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return np.flatnonzero(keep).tolist()
+
+
+def _douglas_peucker_python(xs, ys, tolerance):
+    keep = [False] * len(xs)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(xs) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        dx = xs[end] - xs[start]
+        dy = ys[end] - ys[start]
+        length = math.hypot(dx, dy)
+
+        best_index, best_distance = start, -1.0
+        for i in range(start + 1, end):
+            px = xs[i] - xs[start]
+            py = ys[i] - ys[start]
+            distance = math.hypot(px, py) if length == 0 else abs(px * dy - py * dx) / length
+            if distance > best_distance:
+                best_index, best_distance = i, distance
+
+        if best_distance > tolerance:
+            keep[best_index] = True
+            stack.append((start, best_index))
+            stack.append((best_index, end))
+
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+def simplify_indices(lats, lons, tolerance, max_points=DEFAULT_MAX_POINTS):
+    count = len(lats)
+    if count <= 2:
+        return list(range(count))
+
+    xs, ys = _project(lats, lons)
+    if tolerance > 0:
+        if np is not None:
+            indices = _douglas_peucker_numpy(xs, ys, tolerance)
+        else:
+            indices = _douglas_peucker_python(xs, ys, tolerance)
+    else:
+        indices = list(range(count))
+
+    # Hard cap so payloads stay bounded even for a tiny tolerance
+    if max_points and len(indices) > max_points:
+        step = (len(indices) - 1) / (max_points - 1)
+        indices = [indices[round(i * step)] for i in range(max_points)]
+
+    return indices
+
+
+def simplify_updates(updates, tolerance, max_points=DEFAULT_MAX_POINTS):
+    if len(updates) <= 2:
+        return list(updates)
+    lats = [u['lat'] for u in updates]
+    lons = [u['lon'] for u in updates]
+    return [updates[i] for i in simplify_indices(lats, lons, tolerance, max_points)]
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Compact receiver framing, one MessagePack array per frame:
+#
+#   [0, idx, flight_id, callsign, aircraft_type, tail_number, source, destination]
+#       binds a small integer idx to a flight's static metadata for the session
+#   [1, idx, lat, lon, altitude_m, spd_kts, heading, vertical_rate(, status(, seq(, ts)))]
+#       one position report for the flight bound to idx; seq makes resends
+#       idempotent, ts is the event time in epoch seconds
+#
+# Metadata is remembered per X-Session-Id, so a receiver sends it once and then
+# streams positions only. The table lives in each worker's memory; a position
+# for an idx the worker does not know is reported back so the receiver can
+# resend the metadata frame.
+
+FRAME_METADATA = 0
+FRAME_POSITION = 1
+
+CONTENT_TYPES = ("application/msgpack", "application/x-msgpack")
+
+MAX_SESSIONS = 10000
+SESSION_TTL_SECONDS = 6 * 3600
+
+_sessions = OrderedDict()
+_lock = threading.Lock()
+
+
+def available():
+    return msgpack is not None
+
+
+def session_flights(session_id):
+    now = time.monotonic()
+    with _lock:
+        entry = _sessions.get(session_id)
+        if entry is None or now - entry[0] > SESSION_TTL_SECONDS:
+            entry = (now, {})
+        _sessions[session_id] = (now, entry[1])
+        _sessions.move_to_end(session_id)
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+        return entry[1]
+
+
+def session_count():
+    with _lock:
+        return len(_sessions)
+
+
+def _frames(unpacker):
+    # An undecodable stream raises ValueError, which ingest answers with 400;
+    # BufferFull and OutOfData are not ValueErrors themselves
+    while True:
+        try:
+            yield next(unpacker)
+        except StopIteration:
+            return
+        except msgpack.exceptions.UnpackException as e:
+            raise ValueError(str(e) or type(e).__name__) from e
+
+
+def decode_frames(stream, flights, receiver_id="UNKNOWN"):
+    # Yields (report, error) pairs; exactly one of them is set
+    unpacker = msgpack.Unpacker(stream, raw=False, use_list=True, max_buffer_size=1 << 20)
+
+    for frame in _frames(unpacker):
+        if not isinstance(frame, list) or len(frame) < 2:
+            yield None, {"error": "Malformed frame"}
+            continue
+
+        kind, idx = frame[0], frame[1]
+        # idx keys the session table, so it must be hashable; it is not echoed
+        # back, as bin values cannot go into the JSON response
+        if not isinstance(idx, int) or isinstance(idx, bool):
+            yield None, {"error": "Flight index must be an integer"}
+            continue
+
+        if kind == FRAME_METADATA:
+            if len(frame) < 8:
+                yield None, {"index": idx, "error": "Metadata frame needs 8 fields"}
+                continue
+            if not isinstance(frame[2], str) or not frame[2]:
+                yield None, {"index": idx, "error": "flight_id must be a non-empty string"}
+                continue
+            flights[idx] = {
+                "flight_id": frame[2],
+                "callsign": frame[3],
+                "aircraft_type": frame[4],
+                "tail_number": frame[5],
+                "source": frame[6],
+                "destination": frame[7],
+            }
+
+        elif kind == FRAME_POSITION:
+            meta = flights.get(idx)
+            if meta is None:
+                yield None, {"index": idx, "error": "Unknown flight index, resend metadata"}
+                continue
+            if len(frame) < 8:
+                yield None, {"index": idx, "flight_id": meta["flight_id"], "error": "Position frame needs 8 fields"}
+                continue
+
+            report = dict(meta)
+            report.update({
+                "lat": frame[2],
+                "lon": frame[3],
+                "altitude_m": frame[4],
+                "spd_kts": frame[5],
+                "heading": frame[6],
+                "vertical_rate": frame[7],
+                "receiver_id": receiver_id,
+            })
+            if len(frame) > 8 and frame[8]:
+                report["status"] = frame[8]
+            if len(frame) > 9 and frame[9] is not None:
+                report["seq"] = frame[9]
+            if len(frame) > 10 and frame[10] is not None:
+                report["ts"] = frame[10]
+            yield report, None
+
+        else:
+            yield None, {"index": idx, "error": f"Unknown frame type {kind}"}
+
+
+def encode_metadata(idx, flight_id, callsign, aircraft_type, tail_number, source, destination):
+    return msgpack.packb([FRAME_METADATA, idx, flight_id, callsign, aircraft_type, tail_number, source, destination])
+
+
+def encode_position(idx, lat, lon, altitude_m, spd_kts, heading, vertical_rate, status=None, seq=None, ts=None):
+    frame = [FRAME_POSITION, idx, lat, lon, altitude_m, spd_kts, heading, vertical_rate, status, seq, ts]
+    # Trailing optional fields are dropped when unset
+    while len(frame) > 8 and frame[-1] is None:
+        frame.pop()
+    return msgpack.packb(frame)